@@ -1,15 +1,36 @@
 from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
-import json
 from fastapi.responses import HTMLResponse
-from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 
 from services.analysis_service import AnalysisService
+from services.currency_service import CurrencyService
+from utils.arrow_ipc import PYARROW_AVAILABLE, arrow_response
+from utils.cache import TTLCache, dir_signature
+from utils.html_templates import figure_page_response, consolidated_page_response
+from utils.serialization import ORJSONResponse
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 svc = AnalysisService()
 
+# 分析結果のキャッシュ（元データ/換算済みデータの更新で自動的に無効化）
+_result_cache = TTLCache(maxsize=128, ttl=3600)
+_DATA_DIRS = (svc.data_dir, CurrencyService().analysis_dir)
+
+def _cached_call(func, tickers: Optional[List[str]], **params):
+    """(サービス関数, ティッカー列, パラメータ, データ状態) をキーに結果をキャッシュ
+
+    結果の列順はティッカーの指定順に従うため、キーも指定順のまま保持する。
+    """
+    key = (
+        func.__name__,
+        tuple(tickers) if tickers else None,
+        tuple(sorted(params.items())),
+        dir_signature(*_DATA_DIRS),
+    )
+    return _result_cache.get_or_compute(key, lambda: func(tickers, **params))
+
 # Pydanticモデル
 class AnalysisRequest(BaseModel):
     tickers: Optional[List[str]] = None
@@ -29,183 +50,100 @@ class CorrelationRequest(BaseModel):
 async def post_summary(request: AnalysisRequest):
     """統計サマリー分析（POST）"""
     try:
-        result = svc.get_summary(
+        result = await run_in_threadpool(
+            _cached_call,
+            svc.get_summary,
             request.tickers, 
             risk_free_rate=request.risk_free_rate, 
             periods_per_year=request.periods_per_year, 
             method=request.method,
             currency=request.currency
         )
-        table_safe = json.loads(json.dumps(result["table"], default=str))
-        return jsonable_encoder({"summary": result["summary"], "table": table_safe})
+        return ORJSONResponse({"summary": result["summary"], "table": result["table"]})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/summary/html", response_class=HTMLResponse)
 async def post_summary_html(request: AnalysisRequest):
     """統計サマリー分析HTML（POST）"""
-    result = svc.get_summary(
+    result = await run_in_threadpool(
+        _cached_call,
+        svc.get_summary,
         request.tickers, 
         risk_free_rate=request.risk_free_rate, 
         periods_per_year=request.periods_per_year, 
         method=request.method,
         currency=request.currency
     )
-    fig_json = json.dumps(result["table"], default=str)
-    html = f"""
-    <!doctype html>
-    <html lang=\"ja\">
-      <head>
-        <meta charset=\"utf-8\" />
-        <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-        <title>統計量サマリ</title>
-        <script src=\"https://cdn.plot.ly/plotly-2.30.0.min.js\"></script>
-        <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-      </head>
-      <body>
-        <div id=\"chart\"></div>
-        <script>
-          const fig = {fig_json};
-          Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-        </script>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    return figure_page_response(result["table"], "統計量サマリ")
 
 @router.post("/correlation")
 async def post_correlation(request: CorrelationRequest):
     """相関分析（POST）"""
     try:
-        result = svc.get_correlation(
+        result = await run_in_threadpool(
+            _cached_call,
+            svc.get_correlation,
             request.tickers, 
             method=request.method,
             currency=request.currency
         )
-        heatmap_safe = json.loads(json.dumps(result["heatmap"], default=str))
-        return jsonable_encoder({"matrix": result["matrix"], "heatmap": heatmap_safe})
+        return ORJSONResponse({"matrix": result["matrix"], "heatmap": result["heatmap"]})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/correlation/html", response_class=HTMLResponse)
 async def post_correlation_html(request: CorrelationRequest):
     """相関分析HTML（POST）"""
-    result = svc.get_correlation(
+    result = await run_in_threadpool(
+        _cached_call,
+        svc.get_correlation,
         request.tickers, 
         method=request.method,
         currency=request.currency
     )
-    fig_json = json.dumps(result["heatmap"], default=str)
-    html = f"""
-    <!doctype html>
-    <html lang=\"ja\">
-      <head>
-        <meta charset=\"utf-8\" />
-        <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-        <title>相関ヒートマップ</title>
-        <script src=\"https://cdn.plot.ly/plotly-2.30.0.min.js\"></script>
-        <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-      </head>
-      <body>
-        <div id=\"chart\"></div>
-        <script>
-          const fig = {fig_json};
-          Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-        </script>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    return figure_page_response(result["heatmap"], "相関ヒートマップ")
 
 @router.post("/consolidated-correlation")
 async def post_consolidated_correlation(request: CorrelationRequest):
     """統合相関分析（POST）"""
     try:
-        result = svc.get_consolidated_correlation(
+        result = await run_in_threadpool(
+            _cached_call,
+            svc.get_consolidated_correlation,
             request.tickers, 
             method=request.method,
             correlation_threshold=request.correlation_threshold,
             consolidation_method=request.consolidation_method,
             currency=request.currency
         )
-        original_heatmap_safe = json.loads(json.dumps(result["original_heatmap"], default=str))
-        consolidated_heatmap_safe = json.loads(json.dumps(result["consolidated_heatmap"], default=str))
-        return jsonable_encoder({
+        return ORJSONResponse({
             "original_matrix": result["original_matrix"],
             "consolidated_matrix": result["consolidated_matrix"],
             "groups": result["groups"],
-            "original_heatmap": original_heatmap_safe,
-            "consolidated_heatmap": consolidated_heatmap_safe,
+            "original_heatmap": result["original_heatmap"],
+            "consolidated_heatmap": result["consolidated_heatmap"],
             "consolidation_info": result["consolidation_info"]
         })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/consolidated-correlation/html", response_class=HTMLResponse)
 async def post_consolidated_correlation_html(request: CorrelationRequest):
     """統合相関分析HTML（POST）"""
-    result = svc.get_consolidated_correlation(
+    result = await run_in_threadpool(
+        _cached_call,
+        svc.get_consolidated_correlation,
         request.tickers, 
         method=request.method,
         correlation_threshold=request.correlation_threshold,
         consolidation_method=request.consolidation_method,
         currency=request.currency
     )
-    
     # 統合前後のヒートマップを並べて表示
-    original_fig_json = json.dumps(result["original_heatmap"], default=str)
-    consolidated_fig_json = json.dumps(result["consolidated_heatmap"], default=str)
-    
-    # グループ情報を表示用に整形
-    groups_info = ""
-    for i, group in enumerate(result["groups"], 1):
-        if len(group) <= 3:
-            groups_info += f"<p><strong>グループ{i}:</strong> {' + '.join(group)}</p>"
-        else:
-            groups_info += f"<p><strong>グループ{i}:</strong> {group[0]} + {len(group)-1}個の資産</p>"
-    
-    html = f"""
-    <!doctype html>
-    <html lang="ja">
-      <head>
-        <meta charset="utf-8" />
-        <meta name="viewport" content="width=device-width, initial-scale=1" />
-        <title>統合相関分析</title>
-        <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
-        <style>
-          html, body {{ height: 100%; margin: 0; }}
-          .container {{ display: flex; height: 100vh; }}
-          .chart {{ flex: 1; }}
-          .info {{ width: 300px; padding: 20px; background: #f5f5f5; overflow-y: auto; }}
-          .info h3 {{ margin-top: 0; }}
-        </style>
-      </head>
-      <body>
-        <div class="container">
-          <div class="chart">
-            <div id="original-chart" style="height: 50%;"></div>
-            <div id="consolidated-chart" style="height: 50%;"></div>
-          </div>
-          <div class="info">
-            <h3>統合情報</h3>
-            <p><strong>閾値:</strong> {request.correlation_threshold}</p>
-            <p><strong>統合方法:</strong> {request.consolidation_method}</p>
-            <p><strong>元の資産数:</strong> {result["consolidation_info"]["original_assets"]}</p>
-            <p><strong>統合後資産数:</strong> {result["consolidation_info"]["consolidated_assets"]}</p>
-            <h3>相関グループ</h3>
-            {groups_info}
-          </div>
-        </div>
-        <script>
-          const originalFig = {original_fig_json};
-          const consolidatedFig = {consolidated_fig_json};
-          Plotly.newPlot('original-chart', originalFig.data, originalFig.layout, {{responsive: true, displaylogo: false}});
-          Plotly.newPlot('consolidated-chart', consolidatedFig.data, consolidatedFig.layout, {{responsive: true, displaylogo: false}});
-        </script>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    return consolidated_page_response(result, request.correlation_threshold, request.consolidation_method)
 
 @router.get("/summary")
 async def get_summary(
@@ -216,15 +154,16 @@ async def get_summary(
     currency: str = Query("USD", description="通貨: USD または JPY")
 ):
     try:
-        result = svc.get_summary(
+        result = await run_in_threadpool(
+            _cached_call,
+            svc.get_summary,
             tickers, 
             risk_free_rate=risk_free_rate, 
             periods_per_year=periods_per_year, 
             method=method,
             currency=currency
         )
-        table_safe = json.loads(json.dumps(result["table"], default=str))
-        return jsonable_encoder({"summary": result["summary"], "table": table_safe})
+        return ORJSONResponse({"summary": result["summary"], "table": result["table"]})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -236,49 +175,40 @@ async def get_summary_html(
     method: str = Query("simple"),
     currency: str = Query("USD")
 ):
-    result = svc.get_summary(
+    result = await run_in_threadpool(
+        _cached_call,
+        svc.get_summary,
         tickers, 
         risk_free_rate=risk_free_rate, 
         periods_per_year=periods_per_year, 
         method=method,
         currency=currency
     )
-    fig_json = json.dumps(result["table"], default=str)
-    html = f"""
-    <!doctype html>
-    <html lang=\"ja\">
-      <head>
-        <meta charset=\"utf-8\" />
-        <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-        <title>統計量サマリ</title>
-        <script src=\"https://cdn.plot.ly/plotly-2.30.0.min.js\"></script>
-        <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-      </head>
-      <body>
-        <div id=\"chart\"></div>
-        <script>
-          const fig = {fig_json};
-          Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-        </script>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    return figure_page_response(result["table"], "統計量サマリ")
 
 @router.get("/correlation")
 async def get_correlation(
     tickers: Optional[List[str]] = Query(None),
     method: str = Query("simple"),
-    currency: str = Query("USD")
+    currency: str = Query("USD"),
+    format: str = Query("json", description="レスポンス形式: json または arrow（ヒートマップ行列を Arrow IPC で返す）")
 ):
     try:
-        result = svc.get_correlation(
+        if format == "arrow" and not PYARROW_AVAILABLE:
+            raise HTTPException(status_code=501, detail="pyarrow がインストールされていないため arrow 形式は利用できません")
+        result = await run_in_threadpool(
+            _cached_call,
+            svc.get_correlation,
             tickers, 
             method=method,
             currency=currency
         )
-        heatmap_safe = json.loads(json.dumps(result["heatmap"], default=str))
-        return jsonable_encoder({"matrix": result["matrix"], "heatmap": heatmap_safe})
+        if format == "arrow":
+            # matrix はヒートマップの z/x/y から復元できるため省略
+            return await run_in_threadpool(arrow_response, {"heatmap": result["heatmap"]})
+        return ORJSONResponse({"matrix": result["matrix"], "heatmap": result["heatmap"]})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -288,32 +218,14 @@ async def get_correlation_html(
     method: str = Query("simple"),
     currency: str = Query("USD")
 ):
-    result = svc.get_correlation(
+    result = await run_in_threadpool(
+        _cached_call,
+        svc.get_correlation,
         tickers, 
         method=method,
         currency=currency
     )
-    fig_json = json.dumps(result["heatmap"], default=str)
-    html = f"""
-    <!doctype html>
-    <html lang=\"ja\">
-      <head>
-        <meta charset=\"utf-8\" />
-        <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-        <title>相関ヒートマップ</title>
-        <script src=\"https://cdn.plot.ly/plotly-2.30.0.min.js\"></script>
-        <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-      </head>
-      <body>
-        <div id=\"chart\"></div>
-        <script>
-          const fig = {fig_json};
-          Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-        </script>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    return figure_page_response(result["heatmap"], "相関ヒートマップ")
 
 @router.get("/consolidated-correlation")
 async def get_consolidated_correlation(
@@ -321,26 +233,37 @@ async def get_consolidated_correlation(
     method: str = Query("simple", description="リターン計算: simple または log"),
     correlation_threshold: float = Query(0.9, description="相関統合の閾値 (0.9=90%)"),
     consolidation_method: str = Query("mean", description="統合方法: mean, median, first"),
-    currency: str = Query("USD", description="通貨: USD または JPY")
+    currency: str = Query("USD", description="通貨: USD または JPY"),
+    format: str = Query("json", description="レスポンス形式: json または arrow（ヒートマップ行列を Arrow IPC で返す）")
 ):
     try:
-        result = svc.get_consolidated_correlation(
+        if format == "arrow" and not PYARROW_AVAILABLE:
+            raise HTTPException(status_code=501, detail="pyarrow がインストールされていないため arrow 形式は利用できません")
+        result = await run_in_threadpool(
+            _cached_call,
+            svc.get_consolidated_correlation,
             tickers, 
             method=method,
             correlation_threshold=correlation_threshold,
             consolidation_method=consolidation_method,
             currency=currency
         )
-        original_heatmap_safe = json.loads(json.dumps(result["original_heatmap"], default=str))
-        consolidated_heatmap_safe = json.loads(json.dumps(result["consolidated_heatmap"], default=str))
-        return jsonable_encoder({
+        if format == "arrow":
+            return await run_in_threadpool(
+                arrow_response,
+                {"original_heatmap": result["original_heatmap"], "consolidated_heatmap": result["consolidated_heatmap"]},
+                {"groups": result["groups"], "consolidation_info": result["consolidation_info"]},
+            )
+        return ORJSONResponse({
             "original_matrix": result["original_matrix"],
             "consolidated_matrix": result["consolidated_matrix"],
             "groups": result["groups"],
-            "original_heatmap": original_heatmap_safe,
-            "consolidated_heatmap": consolidated_heatmap_safe,
+            "original_heatmap": result["original_heatmap"],
+            "consolidated_heatmap": result["consolidated_heatmap"],
             "consolidation_info": result["consolidation_info"]
         })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -352,65 +275,14 @@ async def get_consolidated_correlation_html(
     consolidation_method: str = Query("mean"),
     currency: str = Query("USD", description="通貨: USD または JPY")
 ):
-    result = svc.get_consolidated_correlation(
+    result = await run_in_threadpool(
+        _cached_call,
+        svc.get_consolidated_correlation,
         tickers, 
         method=method,
         correlation_threshold=correlation_threshold,
         consolidation_method=consolidation_method,
         currency=currency
     )
-    
     # 統合前後のヒートマップを並べて表示
-    original_fig_json = json.dumps(result["original_heatmap"], default=str)
-    consolidated_fig_json = json.dumps(result["consolidated_heatmap"], default=str)
-    
-    # グループ情報を表示用に整形
-    groups_info = ""
-    for i, group in enumerate(result["groups"], 1):
-        if len(group) <= 3:
-            groups_info += f"<p><strong>グループ{i}:</strong> {' + '.join(group)}</p>"
-        else:
-            groups_info += f"<p><strong>グループ{i}:</strong> {group[0]} + {len(group)-1}個の資産</p>"
-    
-    html = f"""
-    <!doctype html>
-    <html lang="ja">
-      <head>
-        <meta charset="utf-8" />
-        <meta name="viewport" content="width=device-width, initial-scale=1" />
-        <title>統合相関分析</title>
-        <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
-        <style>
-          html, body {{ height: 100%; margin: 0; }}
-          .container {{ display: flex; height: 100vh; }}
-          .chart {{ flex: 1; }}
-          .info {{ width: 300px; padding: 20px; background: #f5f5f5; overflow-y: auto; }}
-          .info h3 {{ margin-top: 0; }}
-        </style>
-      </head>
-      <body>
-        <div class="container">
-          <div class="chart">
-            <div id="original-chart" style="height: 50%;"></div>
-            <div id="consolidated-chart" style="height: 50%;"></div>
-          </div>
-          <div class="info">
-            <h3>統合情報</h3>
-            <p><strong>閾値:</strong> {correlation_threshold}</p>
-            <p><strong>統合方法:</strong> {consolidation_method}</p>
-            <p><strong>元の資産数:</strong> {result["consolidation_info"]["original_assets"]}</p>
-            <p><strong>統合後資産数:</strong> {result["consolidation_info"]["consolidated_assets"]}</p>
-            <h3>相関グループ</h3>
-            {groups_info}
-          </div>
-        </div>
-        <script>
-          const originalFig = {original_fig_json};
-          const consolidatedFig = {consolidated_fig_json};
-          Plotly.newPlot('original-chart', originalFig.data, originalFig.layout, {{responsive: true, displaylogo: false}});
-          Plotly.newPlot('consolidated-chart', consolidatedFig.data, consolidatedFig.layout, {{responsive: true, displaylogo: false}});
-        </script>
-      </body>
-    </html>
-    """
-    return HTMLResponse(content=html)
+    return consolidated_page_response(result, correlation_threshold, consolidation_method)
@@ -1,19 +1,103 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Query, Depends, Path
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import Request
+from typing import Any, Dict, Optional, List
+from typing_extensions import Annotated
+from pydantic import BaseModel, Field
 from services.chart_service import ChartService
+from services.currency_service import CurrencyService
+import asyncio
 import os
-import json
+import re
 from fastapi.responses import HTMLResponse
-from fastapi.encoders import jsonable_encoder
+from utils.arrow_ipc import PYARROW_AVAILABLE, arrow_response
+from utils.cache import TTLCache, dir_signature
+from utils.html_templates import figure_page_response, render_figure_page
+from utils.serialization import ORJSONResponse
 
 router = APIRouter(prefix="/chart", tags=["chart"])
 chart_service = ChartService()
 
+# チャート生成結果のキャッシュ（元データ/換算済みデータの更新で自動的に無効化）
+_chart_cache = TTLCache(maxsize=256, ttl=3600)
+_currency_paths = CurrencyService()
+_CHART_DATA_DIRS = (_currency_paths.data_dir, _currency_paths.analysis_dir)
+
+def _get_chart_data(filename: str, with_indicators: bool = False, **kwargs) -> Dict[str, Any]:
+    """chart_service.get_chart_data を (ファイル名, 引数, データ状態) をキーにキャッシュして呼ぶ"""
+    frozen = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in kwargs.items()))
+    key = (filename, with_indicators, frozen, dir_signature(*_CHART_DATA_DIRS))
+    result = _chart_cache.get(key)
+    if result is None:
+        result = chart_service.get_chart_data(filename, with_indicators, **kwargs)
+        # 失敗結果はキャッシュしない
+        if result.get("success"):
+            _chart_cache.set(key, result)
+    return result
+
+_CSV_FILENAME_PATTERN = r"^[\w\-.]+\.csv$"
+_CSV_FILENAME_RE = re.compile(_CSV_FILENAME_PATTERN)
+
+# CSV ファイル名のパスパラメータ（不正な名前はハンドラ到達前に 422 で弾かれる。パス区切り等も拒否）
+CsvFilename = Annotated[str, Path(pattern=_CSV_FILENAME_PATTERN, description="CSVファイル名（例: SPY.csv）")]
+
 _indicator_desc = "with_indicators=true でデフォルト全有効。個別制御も可能。"
 
+class IndicatorOptions(BaseModel):
+    """チャートの個別インジケータ指定（3 つのチャートエンドポイントで共有。GET では indicator_options で組み立てる）"""
+    show_ma: Optional[bool] = None
+    ma_windows: Optional[List[int]] = None
+    show_bb: Optional[bool] = None
+    bb_window: int = Field(20, ge=1)
+    bb_std: float = 2.0
+    show_rsi: Optional[bool] = None
+    rsi_period: int = Field(14, ge=1)
+    show_macd: Optional[bool] = None
+    macd_fast: int = Field(12, ge=1)
+    macd_slow: int = Field(26, ge=1)
+    macd_signal: int = Field(9, ge=1)
+    show_vwap: Optional[bool] = None
+    show_mdd: Optional[bool] = None
+
+def indicator_options(
+    show_ma: Optional[bool] = Query(None, description=_indicator_desc),
+    ma_windows: Optional[List[int]] = Query(None, description="移動平均の窓長(複数可)"),
+    show_bb: Optional[bool] = Query(None, description="ボリンジャーバンド"),
+    bb_window: int = Query(20, ge=1, description="BBの窓長"),
+    bb_std: float = Query(2.0, description="BBの標準偏差倍率"),
+    show_rsi: Optional[bool] = Query(None, description="RSIを表示"),
+    rsi_period: int = Query(14, ge=1, description="RSIの期間"),
+    show_macd: Optional[bool] = Query(None, description="MACDを表示"),
+    macd_fast: int = Query(12, ge=1, description="MACD fast"),
+    macd_slow: int = Query(26, ge=1, description="MACD slow"),
+    macd_signal: int = Query(9, ge=1, description="MACD signal"),
+    show_vwap: Optional[bool] = Query(None, description="VWAPを表示"),
+    show_mdd: Optional[bool] = Query(None, description="最大ドローダウン区間をハイライト"),
+) -> IndicatorOptions:
+    """クエリパラメータから IndicatorOptions を組み立てる依存関数
+
+    BaseModel を直接 Depends() に渡すと List 型の ma_windows がリクエストボディ扱いになるため、
+    パラメータは関数の引数として宣言する。
+    """
+    return IndicatorOptions(
+        show_ma=show_ma,
+        ma_windows=ma_windows,
+        show_bb=show_bb,
+        bb_window=bb_window,
+        bb_std=bb_std,
+        show_rsi=show_rsi,
+        rsi_period=rsi_period,
+        show_macd=show_macd,
+        macd_fast=macd_fast,
+        macd_slow=macd_slow,
+        macd_signal=macd_signal,
+        show_vwap=show_vwap,
+        show_mdd=show_mdd,
+    )
+
 @router.get("/candlestick/{filename}")
 async def get_candlestick_chart(
-    filename: str,
+    filename: CsvFilename,
     with_indicators: bool = Query(False, description="代表的指標を一括有効化"),
     currency: str = Query("USD", description="通貨: USD または JPY"),
     # 注釈/軸
@@ -22,35 +106,16 @@ async def get_candlestick_chart(
     axis_tick: str = Query("auto", description="x軸ティック: auto/day/week/month/quarter/year/array"),
     axis_tick_format: Optional[str] = Query(None, description="tickラベルのフォーマット (例: %Y-%m-%d)"),
     axis_tick_dates: Optional[List[str]] = Query(None, description="axis_tick=array の場合の手動ティック日付群"),
-    # 個別インジケータ
-    show_ma: Optional[bool] = Query(None, description=_indicator_desc),
-    ma_windows: Optional[List[int]] = Query(None, description="移動平均の窓長(複数可)"),
-    show_bb: Optional[bool] = Query(None, description="ボリンジャーバンド"),
-    bb_window: int = Query(20, description="BBの窓長"),
-    bb_std: float = Query(2.0, description="BBの標準偏差倍率"),
-    show_rsi: Optional[bool] = Query(None, description="RSIを表示"),
-    rsi_period: int = Query(14, description="RSIの期間"),
-    show_macd: Optional[bool] = Query(None, description="MACDを表示"),
-    macd_fast: int = Query(12, description="MACD fast"),
-    macd_slow: int = Query(26, description="MACD slow"),
-    macd_signal: int = Query(9, description="MACD signal"),
-    show_vwap: Optional[bool] = Query(None, description="VWAPを表示"),
-    show_mdd: Optional[bool] = Query(None, description="最大ドローダウン区間をハイライト")
+    opts: IndicatorOptions = Depends(indicator_options),
+    format: str = Query("json", description="レスポンス形式: json または arrow（トレースの数値配列を Arrow IPC で返す）")
 ):
     try:
-        if not filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="ファイルはCSV形式である必要があります")
-        options = {
-            "show_ma": show_ma, "ma_windows": ma_windows,
-            "show_bb": show_bb, "bb_window": bb_window, "bb_std": bb_std,
-            "show_rsi": show_rsi, "rsi_period": rsi_period,
-            "show_macd": show_macd, "macd_fast": macd_fast, "macd_slow": macd_slow, "macd_signal": macd_signal,
-            "show_vwap": show_vwap,
-            "show_mdd": show_mdd,
-        }
+        if format == "arrow" and not PYARROW_AVAILABLE:
+            raise HTTPException(status_code=501, detail="pyarrow がインストールされていないため arrow 形式は利用できません")
         # None は渡さない（デフォルトに任せる）
-        options = {k: v for k, v in options.items() if v is not None}
-        result = chart_service.get_chart_data(
+        options = opts.model_dump(exclude_none=True)
+        result = await run_in_threadpool(
+            _get_chart_data,
             filename,
             with_indicators,
             currency=currency,
@@ -63,17 +128,57 @@ async def get_candlestick_chart(
         )
         if not result["success"]:
             raise HTTPException(status_code=404, detail=result["error"])
-        safe_data = json.loads(json.dumps(result["data"], default=str))
-        safe_result = {**{k: v for k, v in result.items() if k != "data"}, "data": safe_data}
-        return jsonable_encoder(safe_result)
+        if format == "arrow":
+            meta = {k: v for k, v in result.items() if k != "data"}
+            return await run_in_threadpool(arrow_response, {"data": result["data"]}, meta)
+        return ORJSONResponse(result)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
 
+class ChartItem(BaseModel):
+    """一括取得する 1 チャート分の指定（GET /candlestick/{filename} のクエリと同じ項目）"""
+    filename: str = Field(..., pattern=_CSV_FILENAME_PATTERN)
+    with_indicators: bool = False
+    currency: str = "USD"
+    annotate_dates: Optional[List[str]] = None
+    mark_month_start: bool = False
+    axis_tick: str = "auto"
+    axis_tick_format: Optional[str] = None
+    axis_tick_dates: Optional[List[str]] = None
+    indicators: IndicatorOptions = Field(default_factory=IndicatorOptions)
+
+class BatchChartRequest(BaseModel):
+    items: List[ChartItem] = Field(..., min_length=1, max_length=50)
+
+@router.post("/candlestick/batch")
+async def post_candlestick_batch(request: BatchChartRequest):
+    """複数チャートを 1 リクエストでまとめて取得（各チャートはスレッドプールで並行生成）"""
+    try:
+        results = await asyncio.gather(*(
+            run_in_threadpool(
+                _get_chart_data,
+                item.filename,
+                item.with_indicators,
+                currency=item.currency,
+                annotate_dates=item.annotate_dates,
+                mark_month_start=item.mark_month_start,
+                axis_tick=item.axis_tick,
+                axis_tick_format=item.axis_tick_format,
+                axis_tick_dates=item.axis_tick_dates,
+                **item.indicators.model_dump(exclude_none=True)
+            )
+            for item in request.items
+        ))
+        # 失敗したチャートも success/error 付きでそのまま返す（1 件の失敗で全体を落とさない）
+        return ORJSONResponse({"results": results, "count": len(results)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
+
 @router.get("/html/{filename}", response_class=HTMLResponse)
 async def get_candlestick_chart_html(
-    filename: str,
+    filename: CsvFilename,
     with_indicators: bool = Query(False, description="代表的指標を一括有効化"),
     currency: str = Query("USD"),
     annotate_dates: Optional[List[str]] = Query(None),
@@ -81,33 +186,13 @@ async def get_candlestick_chart_html(
     axis_tick: str = Query("auto"),
     axis_tick_format: Optional[str] = Query(None),
     axis_tick_dates: Optional[List[str]] = Query(None),
-    show_ma: Optional[bool] = Query(None),
-    ma_windows: Optional[List[int]] = Query(None),
-    show_bb: Optional[bool] = Query(None),
-    bb_window: int = Query(20),
-    bb_std: float = Query(2.0),
-    show_rsi: Optional[bool] = Query(None),
-    rsi_period: int = Query(14),
-    show_macd: Optional[bool] = Query(None),
-    macd_fast: int = Query(12),
-    macd_slow: int = Query(26),
-    macd_signal: int = Query(9),
-    show_vwap: Optional[bool] = Query(None),
-    show_mdd: Optional[bool] = Query(None),
+    opts: IndicatorOptions = Depends(indicator_options),
 ):
     try:
-        if not filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="ファイルはCSV形式である必要があります")
-        options = {
-            "show_ma": show_ma, "ma_windows": ma_windows,
-            "show_bb": show_bb, "bb_window": bb_window, "bb_std": bb_std,
-            "show_rsi": show_rsi, "rsi_period": rsi_period,
-            "show_macd": show_macd, "macd_fast": macd_fast, "macd_slow": macd_slow, "macd_signal": macd_signal,
-            "show_vwap": show_vwap,
-            "show_mdd": show_mdd,
-        }
-        options = {k: v for k, v in options.items() if v is not None}
-        result = chart_service.get_chart_data(
+        # None は渡さない（デフォルトに任せる）
+        options = opts.model_dump(exclude_none=True)
+        result = await run_in_threadpool(
+            _get_chart_data,
             filename,
             with_indicators,
             currency=currency,
@@ -120,173 +205,127 @@ async def get_candlestick_chart_html(
         )
         if not result.get("success"):
             raise HTTPException(status_code=404, detail=result.get("error", "不明なエラー"))
-        fig_dict = result["data"]
         title = result.get("ticker", "Chart")
-        fig_json = json.dumps(fig_dict, default=str)
-        html = f"""
-        <!doctype html>
-        <html lang=\"ja\">
-          <head>
-            <meta charset=\"utf-8\" />
-            <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-            <title>{title} チャート</title>
-            <script src=\"https://cdn.plot.ly/plotly-2.30.0.min.js\"></script>
-            <style>
-              html, body {{ height: 100%; margin: 0; }}
-              #chart {{ width: 100%; height: 100vh; }}
-            </style>
-          </head>
-          <body>
-            <div id=\"chart\"></div>
-            <script>
-              const fig = {fig_json};
-              Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-            </script>
-          </body>
-        </html>
-        """
-        return HTMLResponse(content=html)
+        return figure_page_response(result["data"], f"{title} チャート")
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
 
-@router.get("/json/{filename}")
-async def get_candlestick_chart_json(
-    filename: str,
-    with_indicators: bool = Query(False, description="代表的指標を一括有効化"),
-    currency: str = Query("USD", description="通貨: USD または JPY"),
-    annotate_dates: Optional[List[str]] = Query(None),
-    mark_month_start: bool = Query(False),
-    axis_tick: str = Query("auto"),
-    axis_tick_format: Optional[str] = Query(None),
-    axis_tick_dates: Optional[List[str]] = Query(None),
-    show_ma: Optional[bool] = Query(None),
-    ma_windows: Optional[List[int]] = Query(None),
-    show_bb: Optional[bool] = Query(None),
-    bb_window: int = Query(20),
-    bb_std: float = Query(2.0),
-    show_rsi: Optional[bool] = Query(None),
-    rsi_period: int = Query(14),
-    show_macd: Optional[bool] = Query(None),
-    macd_fast: int = Query(12),
-    macd_slow: int = Query(26),
-    macd_signal: int = Query(9),
-    show_vwap: Optional[bool] = Query(None),
-    show_mdd: Optional[bool] = Query(None),
-):
+_TRUE_VALUES = {"1", "on", "t", "true", "y", "yes"}
+_FALSE_VALUES = {"0", "off", "f", "false", "n", "no"}
+
+def _to_bool(value: str) -> bool:
+    v = value.lower()
+    if v in _TRUE_VALUES:
+        return True
+    if v in _FALSE_VALUES:
+        return False
+    raise ValueError(value)
+
+# IndicatorOptions と同じ項目の変換関数（ma_windows は複数値のため別扱い）
+_INDICATOR_PARSERS = {
+    "show_ma": _to_bool, "show_bb": _to_bool, "bb_window": int, "bb_std": float,
+    "show_rsi": _to_bool, "rsi_period": int,
+    "show_macd": _to_bool, "macd_fast": int, "macd_slow": int, "macd_signal": int,
+    "show_vwap": _to_bool, "show_mdd": _to_bool,
+}
+_INDICATOR_DEFAULTS = IndicatorOptions().model_dump(exclude_none=True)
+
+def _parse_chart_query(qp) -> Dict[str, Any]:
+    """クエリパラメータを get_chart_data のキーワード引数に変換（Pydantic を通さない軽量版）"""
+    name = None
     try:
-        if not filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="ファイルはCSV形式である必要があります")
-        options = {
-            "show_ma": show_ma, "ma_windows": ma_windows,
-            "show_bb": show_bb, "bb_window": bb_window, "bb_std": bb_std,
-            "show_rsi": show_rsi, "rsi_period": rsi_period,
-            "show_macd": show_macd, "macd_fast": macd_fast, "macd_slow": macd_slow, "macd_signal": macd_signal,
-            "show_vwap": show_vwap,
-            "show_mdd": show_mdd,
-        }
-        options = {k: v for k, v in options.items() if v is not None}
-        result = chart_service.get_chart_data(
-            filename,
-            with_indicators,
-            currency=currency,
-            annotate_dates=annotate_dates,
-            mark_month_start=mark_month_start,
-            axis_tick=axis_tick,
-            axis_tick_format=axis_tick_format,
-            axis_tick_dates=axis_tick_dates,
-            **options
-        )
+        options: Dict[str, Any] = dict(_INDICATOR_DEFAULTS)
+        for name, parse in _INDICATOR_PARSERS.items():
+            value = qp.get(name)
+            if value is not None:
+                options[name] = parse(value)
+        name = "ma_windows"
+        ma_windows = qp.getlist("ma_windows")
+        if ma_windows:
+            options["ma_windows"] = [int(w) for w in ma_windows]
+        name = "with_indicators"
+        with_indicators = _to_bool(qp.get("with_indicators", "false"))
+        name = "mark_month_start"
+        mark_month_start = _to_bool(qp.get("mark_month_start", "false"))
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"クエリパラメータ {name} の値が不正です")
+    return {
+        "with_indicators": with_indicators,
+        "currency": qp.get("currency", "USD"),
+        "annotate_dates": qp.getlist("annotate_dates") or None,
+        "mark_month_start": mark_month_start,
+        "axis_tick": qp.get("axis_tick", "auto"),
+        "axis_tick_format": qp.get("axis_tick_format"),
+        "axis_tick_dates": qp.getlist("axis_tick_dates") or None,
+        **options,
+    }
+
+async def get_candlestick_chart_json(request: Request):
+    """GET /chart/json/{filename}
+
+    呼び出し頻度の高いエンドポイントのため FastAPI の依存解決/Pydantic 検証を通さない
+    Starlette ルートとして登録し、クエリは _parse_chart_query で直接変換する。
+    受け付けるパラメータは /chart/candlestick/{filename} と同じ（format を除く）。
+    """
+    try:
+        filename = request.path_params["filename"]
+        if not _CSV_FILENAME_RE.fullmatch(filename):
+            raise HTTPException(status_code=422, detail="ファイルはCSV形式である必要があります")
+        kwargs = _parse_chart_query(request.query_params)
+        result = await run_in_threadpool(_get_chart_data, filename, **kwargs)
         if not result.get("success"):
             raise HTTPException(status_code=404, detail=result.get("error", "不明なエラー"))
         
         # JSONデータを直接返す
-        return {
+        return ORJSONResponse({
             "success": True,
             "data": result["data"],
             "ticker": result.get("ticker", "Chart"),
-            "html_content": f"""
-            <!doctype html>
-            <html lang="ja">
-              <head>
-                <meta charset="utf-8" />
-                <meta name="viewport" content="width=device-width, initial-scale=1" />
-                <title>{result.get("ticker", "Chart")} チャート</title>
-                <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
-                <style>
-                  html, body {{ height: 100%; margin: 0; }}
-                  #chart {{ width: 100%; height: 100vh; }}
-                </style>
-              </head>
-              <body>
-                <div id="chart"></div>
-                <script>
-                  const fig = {json.dumps(result["data"], default=str)};
-                  Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-                </script>
-              </body>
-            </html>
-            """
-        }
+            "html_content": render_figure_page(result["data"], f"{result.get('ticker', 'Chart')} チャート").decode("utf-8")
+        })
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
 
+# APIRouter の prefix は Starlette ルートには付与されないため完全なパスで登録
+router.add_route(f"{router.prefix}/json/{{filename}}", get_candlestick_chart_json, methods=["GET"])
+
+# ファイル一覧のキャッシュ（ディレクトリの mtime が変わった時だけ再取得）
+_listdir_cache = {"mtime": None, "files": []}
+
 @router.get("/available-files")
-async def get_available_files():
+def get_available_files():
     try:
         data_dir = chart_service.data_dir
-        if not os.path.exists(data_dir):
+        try:
+            mtime = os.stat(data_dir).st_mtime_ns
+        except FileNotFoundError:
             return {"files": [], "message": "データディレクトリが存在しません"}
-        csv_files = []
-        for file in os.listdir(data_dir):
-            if file.endswith('.csv'):
-                csv_files.append(file)
+        if mtime != _listdir_cache["mtime"]:
+            with os.scandir(data_dir) as it:
+                csv_files = [e.name for e in it if e.name.endswith('.csv') and e.is_file()]
+            _listdir_cache["files"] = sorted(csv_files)
+            _listdir_cache["mtime"] = mtime
+        csv_files = _listdir_cache["files"]
         return {"files": csv_files, "count": len(csv_files)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"サーバーエラー: {str(e)}")
 
 @router.get("/file-info/{filename}")
-async def get_file_info(filename: str):
+async def get_file_info(filename: CsvFilename):
     try:
-        if not filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="ファイルはCSV形式である必要があります")
-        df = chart_service.load_csv_data(filename)
+        df = await run_in_threadpool(chart_service.load_csv_data, filename)
+        # 5 列 × 4 統計量を 1 回の集約で計算
+        stats = df[['Open', 'High', 'Low', 'Close', 'Volume']].agg(['min', 'max', 'mean', 'std'])
+        # numpy の値のまま ORJSONResponse で返す（jsonable_encoder と float() 変換を通さない）
         price_stats = {
-            "open": {
-                "min": float(df['Open'].min()),
-                "max": float(df['Open'].max()),
-                "mean": float(df['Open'].mean()),
-                "std": float(df['Open'].std())
-            },
-            "high": {
-                "min": float(df['High'].min()),
-                "max": float(df['High'].max()),
-                "mean": float(df['High'].mean()),
-                "std": float(df['High'].std())
-            },
-            "low": {
-                "min": float(df['Low'].min()),
-                "max": float(df['Low'].max()),
-                "mean": float(df['Low'].mean()),
-                "std": float(df['Low'].std())
-            },
-            "close": {
-                "min": float(df['Close'].min()),
-                "max": float(df['Close'].max()),
-                "mean": float(df['Close'].mean()),
-                "std": float(df['Close'].std())
-            },
-            "volume": {
-                "min": float(df['Volume'].min()),
-                "max": float(df['Volume'].max()),
-                "mean": float(df['Volume'].mean()),
-                "std": float(df['Volume'].std())
-            }
+            col.lower(): dict(zip(stats.index, stats[col].to_numpy()))
+            for col in stats.columns
         }
-        return {
+        return ORJSONResponse({
             "filename": filename,
             "ticker": filename.replace('.csv', ''),
             "date_range": {
@@ -295,7 +334,7 @@ async def get_file_info(filename: str):
             },
             "records_count": len(df),
             "statistics": price_stats
-        }
+        })
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="ファイルが見つかりません")
     except Exception as e:
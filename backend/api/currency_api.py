@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import logging
@@ -12,6 +13,7 @@ from services.currency_service import CurrencyService
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/currency", tags=["currency"])
+currency_service = CurrencyService()
 
 class CurrencyConversionRequest(BaseModel):
     files: List[str]
@@ -28,8 +30,7 @@ async def download_exchange_rate():
     為替レートデータをダウンロード
     """
     try:
-        currency_service = CurrencyService()
-        success = currency_service.download_exchange_rate()
+        success = await run_in_threadpool(currency_service.download_exchange_rate)
         
         if success:
             return {"success": True, "message": "Exchange rate data downloaded successfully"}
@@ -46,18 +47,17 @@ async def convert_currency(request: CurrencyConversionRequest):
     指定されたファイルを指定された通貨に換算
     """
     try:
-        currency_service = CurrencyService()
-        
         # 為替レートデータが存在するかチェック
-        exchange_rates = currency_service.get_exchange_rate_data()
+        exchange_rates = await run_in_threadpool(currency_service.get_exchange_rate_data)
         if exchange_rates.empty:
             # 為替レートデータが存在しない場合はダウンロード
-            success = currency_service.download_exchange_rate()
+            success = await run_in_threadpool(currency_service.download_exchange_rate)
             if not success:
                 raise HTTPException(status_code=500, detail="Failed to download exchange rate data")
         
         # 通貨換算を実行
-        converted_files = currency_service.generate_analysis_data(
+        converted_files = await run_in_threadpool(
+            currency_service.generate_analysis_data,
             request.files, 
             request.target_currency
         )
@@ -78,8 +78,7 @@ async def get_exchange_rate_status():
     為替レートデータの状態を確認
     """
     try:
-        currency_service = CurrencyService()
-        exchange_rates = currency_service.get_exchange_rate_data()
+        exchange_rates = await run_in_threadpool(currency_service.get_exchange_rate_data)
         
         if not exchange_rates.empty:
             return {
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Query, Body
-from typing import List, Optional, Dict, Any
-import json
-from datetime import date
-from fastapi.responses import HTMLResponse
-from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel
-
-from services.download_service import DownloadService
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Body, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Literal, Optional, Dict, Any
+import asyncio
+from datetime import date, datetime
+from uuid import uuid4
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from services.download_service import DownloadService, format_size
+from utils.cache import TTLCache, etag_matches, make_etag
+from utils.arrow_ipc import PYARROW_AVAILABLE, frame_response
+from utils.serialization import ORJSONResponse
 from data_provider.yahoo_provider import YahooFinanceProvider
 
 router = APIRouter(prefix="/download", tags=["download"])
@@ -19,41 +23,65 @@ try:
 except ImportError as e:
     print(f"Warning: Yahoo Finance provider not available: {e}")
 
+# 一括ダウンロード時のプロバイダーへの同時リクエスト数
+_BATCH_CONCURRENCY = 5
+
+# 一括ダウンロードジョブの状態（job_id → 状態 dict。完了後 1 時間で破棄）
+_batch_jobs = TTLCache(maxsize=256, ttl=3600)
+
 # Pydanticモデル
-class DownloadRequest(BaseModel):
-    symbol: str
+class DownloadOptions(BaseModel):
+    """ダウンロード共通オプション（日付は YYYY-MM-DD、不正な形式は 422）"""
     provider: str = "yahoo"
     interval: str = "1d"
-    start_date: Optional[str] = None
-    end_date: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
     prepost: bool = False
 
+    @field_validator("start_date", "end_date", mode="before")
+    @classmethod
+    def _empty_to_none(cls, v: Any) -> Any:
+        # フォームの未入力（空文字）は未指定として扱う
+        return v or None
+
+class DownloadRequest(DownloadOptions):
+    symbol: str
+
+class BatchDownloadRequest(DownloadOptions):
+    symbols: List[str] = Field(..., min_length=1, description="ダウンロードするシンボルのリスト")
+
+def batch_download_query(
+    symbols: List[str] = Query(..., description="ダウンロードするシンボルのリスト"),
+    provider_name: str = Query("yahoo", description="使用するプロバイダー名"),
+    start_date: Optional[str] = Query(None, description="開始日（YYYY-MM-DD形式）"),
+    end_date: Optional[str] = Query(None, description="終了日（YYYY-MM-DD形式）"),
+    interval: str = Query("1d", description="データ間隔"),
+    prepost: bool = Query(False, description="前後場データを含むか")
+) -> BatchDownloadRequest:
+    """一括ダウンロードのクエリパラメータから BatchDownloadRequest を組み立てる（日付の形式不正は 422）"""
+    try:
+        return BatchDownloadRequest(
+            symbols=symbols,
+            provider=provider_name,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval,
+            prepost=prepost
+        )
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
 @router.post("/")
 async def download_data(request: DownloadRequest):
     """株価データをダウンロード（POST）"""
     try:
-        # 日付の変換
-        start_dt = None
-        end_dt = None
-        
-        if request.start_date:
-            try:
-                start_dt = date.fromisoformat(request.start_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid start_date format. Use YYYY-MM-DD")
-        
-        if request.end_date:
-            try:
-                end_dt = date.fromisoformat(request.end_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid end_date format. Use YYYY-MM-DD")
-        
         # ダウンロード実行
-        result = svc.download_stock_data(
+        result = await run_in_threadpool(
+            svc.download_stock_data,
             symbol=request.symbol,
             provider_name=request.provider,
-            start_date=start_dt,
-            end_date=end_dt,
+            start_date=request.start_date,
+            end_date=request.end_date,
             filename=None,
             interval=request.interval,
             prepost=request.prepost
@@ -76,6 +104,44 @@ async def download_data(request: DownloadRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/history/{symbol}")
+async def get_history(
+    symbol: str,
+    provider_name: str = Query("yahoo", description="使用するプロバイダー名"),
+    interval: str = Query("1d", description="データ間隔"),
+    start_date: Optional[date] = Query(None, description="開始日 YYYY-MM-DD"),
+    end_date: Optional[date] = Query(None, description="終了日 YYYY-MM-DD"),
+    prepost: bool = Query(False, description="時間外取引を含める"),
+    metadata: bool = Query(True, description="通貨/取引所等のメタデータを取得する（OHLCV のみなら false）"),
+    format: Literal["json", "arrow"] = Query("json", description="レスポンス形式: json（列毎の配列）または arrow（Arrow IPC ストリーム）")
+):
+    """株価データを保存せずに取得（長期間/分足は format=arrow で列データのまま返す）"""
+    try:
+        if format == "arrow" and not PYARROW_AVAILABLE:
+            raise HTTPException(status_code=501, detail="pyarrow がインストールされていないため arrow 形式は利用できません")
+        result = await run_in_threadpool(
+            svc.fetch_stock_data,
+            symbol=symbol,
+            provider_name=provider_name,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval,
+            prepost=prepost,
+            metadata=metadata
+        )
+        if not result["success"]:
+            raise HTTPException(status_code=404, detail=result["error"])
+        
+        df = result["data"]
+        meta = {"symbol": symbol, "provider": provider_name, "metadata": result["metadata"]}
+        if format == "arrow":
+            return await run_in_threadpool(frame_response, df, meta)
+        return ORJSONResponse({**meta, "data": {col: df[col].to_numpy() for col in df.columns}})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/providers")
 async def get_providers():
     """利用可能なデータプロバイダー一覧を取得"""
@@ -116,7 +182,7 @@ async def search_symbols(
 ):
     """シンボルを検索"""
     try:
-        results = svc.search_symbols(query, provider_name)
+        results = await run_in_threadpool(svc.search_symbols, query, provider_name)
         return {
             "query": query,
             "provider": provider_name,
@@ -133,7 +199,7 @@ async def get_company_info(
 ):
     """会社情報を取得"""
     try:
-        info = svc.get_company_info(symbol, provider_name)
+        info = await run_in_threadpool(svc.get_company_info, symbol, provider_name)
         if info is None:
             raise HTTPException(status_code=404, detail=f"Company info not found for {symbol}")
         
@@ -143,80 +209,139 @@ async def get_company_info(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _run_batch(request: BatchDownloadRequest) -> Dict[str, Any]:
+    """一括ダウンロードの本体（結果はジョブの result に格納される）"""
+    symbols = request.symbols
+    # まずプロバイダーの一括取得 API でまとめてダウンロード（重複シンボルは 1 回だけ取得）
+    unique_symbols = list(dict.fromkeys(symbols))
+    bulk = await run_in_threadpool(
+        svc.download_many,
+        unique_symbols,
+        request.provider,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        interval=request.interval,
+        prepost=request.prepost
+    )
+    
+    # 一括取得で失敗したシンボルのみ個別に再取得（スレッドで並行実行し、同時実行数を制限）
+    sem = asyncio.Semaphore(_BATCH_CONCURRENCY)
+
+    async def _download_one(symbol: str) -> Dict[str, Any]:
+        async with sem:
+            return await run_in_threadpool(
+                svc.download_stock_data,
+                symbol=symbol,
+                provider_name=request.provider,
+                start_date=request.start_date,
+                end_date=request.end_date,
+                interval=request.interval,
+                prepost=request.prepost
+            )
+
+    retry = [s for s in unique_symbols if not bulk[s]["success"]]
+    retried = await asyncio.gather(*(_download_one(s) for s in retry), return_exceptions=True)
+    bulk.update(zip(retry, retried))
+
+    succeeded, failed = [], []
+    for symbol in symbols:
+        result = bulk[symbol]
+        if isinstance(result, Exception):
+            failed.append({"symbol": symbol, "error": str(result)})
+        elif result["success"]:
+            succeeded.append({
+                "symbol": symbol,
+                "file_path": result["file_path"],
+                "data_points": result["data_points"]
+            })
+        else:
+            failed.append({"symbol": symbol, "error": result["error"]})
+    
+    return {
+        "total": len(symbols),
+        "success_count": len(succeeded),
+        "failed_count": len(failed),
+        "success": succeeded,
+        "failed": failed
+    }
+
+async def _run_batch_job(job_id: str, request: BatchDownloadRequest) -> None:
+    """バックグラウンドで一括ダウンロードを実行し、ジョブの状態を更新"""
+    job = _batch_jobs.get(job_id)
+    if job is None:
+        return
+    try:
+        job["result"] = await _run_batch(request)
+        job["status"] = "completed"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+    job["finished_at"] = datetime.now().isoformat()
+    # 完了時刻から保持期間を数え直す
+    _batch_jobs.set(job_id, job)
+
 @router.post("/batch-download")
-async def batch_download(
-    symbols: List[str] = Query(..., description="ダウンロードするシンボルのリスト"),
-    provider_name: str = Query("yahoo", description="使用するプロバイダー名"),
-    start_date: Optional[str] = Query(None, description="開始日（YYYY-MM-DD形式）"),
-    end_date: Optional[str] = Query(None, description="終了日（YYYY-MM-DD形式）"),
-    interval: str = Query("1d", description="データ間隔"),
-    prepost: bool = Query(False, description="前後場データを含むか")
-):
-    """複数シンボルの一括ダウンロード"""
+async def batch_download(request: BatchDownloadRequest = Depends(batch_download_query)):
+    """複数シンボルの一括ダウンロード（完了まで待って結果を返す）"""
     try:
-        # 日付の変換
-        start_dt = None
-        end_dt = None
-        
-        if start_date:
-            try:
-                start_dt = date.fromisoformat(start_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid start_date format. Use YYYY-MM-DD")
-        
-        if end_date:
-            try:
-                end_dt = date.fromisoformat(end_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid end_date format. Use YYYY-MM-DD")
-        
-        # 一括ダウンロード実行
-        result = svc.batch_download(
-            symbols=symbols,
-            provider_name=provider_name,
-            start_date=start_dt,
-            end_date=end_dt,
-            interval=interval,
-            prepost=prepost
-        )
-        
-        return {
-            "total": result["total"],
-            "success_count": result["success_count"],
-            "failed_count": result["failed_count"],
-            "success": result["success"],
-            "failed": result["failed"]
-        }
-        
+        return await _run_batch(request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/batch", status_code=202)
+async def start_batch_download(background_tasks: BackgroundTasks, request: BatchDownloadRequest = Depends(batch_download_query)):
+    """複数シンボルの一括ダウンロードをジョブとして開始（202 を返す。進捗/結果は status_url で取得）
+
+    パラメータは /batch-download と同じ。銘柄数が多く完了まで待てない場合に使う。
+    """
+    job_id = uuid4().hex
+    _batch_jobs.set(job_id, {
+        "job_id": job_id,
+        "status": "running",
+        "symbols": request.symbols,
+        "total": len(request.symbols),
+        "started_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "result": None,
+        "error": None
+    })
+    background_tasks.add_task(_run_batch_job, job_id, request)
+    return {
+        "job_id": job_id,
+        "status": "running",
+        "status_url": f"{router.prefix}/batch/{job_id}"
+    }
+
+@router.get("/batch/{job_id}")
+async def get_batch_status(job_id: str):
+    """一括ダウンロードジョブの状態/結果を取得"""
+    job = _batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return ORJSONResponse(job)
+
+def _conditional_json(request: Request, state: Any, content: Dict[str, Any]) -> Response:
+    """状態から ETag を付与して content を返す（If-None-Match が一致すれば本文なしの 304）
+
+    削除/ダウンロード直後の一覧が古く見えないよう、キャッシュは毎回再検証させる（no-cache）。
+    """
+    etag = make_etag(state)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(content, headers=headers)
+
 @router.get("/files")
-async def list_files():
+async def list_files(request: Request):
     """ダウンロード済みファイル一覧を取得"""
     try:
-        files = svc.list_downloaded_files()
-        return {
+        files = await run_in_threadpool(svc.list_downloaded_files)
+        return _conditional_json(request, tuple(files), {
             "files": files,
             "count": len(files)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.delete("/files/{filename}")
-async def delete_file(filename: str):
-    """ファイルを削除"""
-    try:
-        success = svc.delete_file(filename)
-        if not success:
-            raise HTTPException(status_code=404, detail=f"File '{filename}' not found")
-        
-        return {
-            "success": True,
-            "message": f"File '{filename}' deleted successfully"
-        }
-    except HTTPException:
-        raise
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -224,7 +349,7 @@ async def delete_file(filename: str):
 async def delete_files_by_symbol(symbol: str):
     """シンボルに関連するファイルを削除"""
     try:
-        result = svc.delete_files_by_symbol(symbol)
+        result = await run_in_threadpool(svc.delete_files_by_symbol, symbol)
         if not result["success"] and "error" in result:
             raise HTTPException(status_code=404, detail=result["error"])
         
@@ -243,7 +368,7 @@ async def delete_multiple_files(
         if not filenames:
             raise HTTPException(status_code=400, detail="No filenames provided")
         
-        result = svc.delete_multiple_files(filenames)
+        result = await run_in_threadpool(svc.delete_multiple_files, filenames)
         return result
     except HTTPException:
         raise
@@ -254,57 +379,64 @@ async def delete_multiple_files(
 async def delete_all_files():
     """全てのダウンロード済みファイルを削除"""
     try:
-        result = svc.delete_all_files()
+        result = await run_in_threadpool(svc.delete_all_files)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# パスパラメータのルートは /files/batch, /files/all より後に登録する（先に登録すると "batch" 等がファイル名として扱われる）
+@router.delete("/files/{filename}")
+async def delete_file(filename: str):
+    """ファイルを削除"""
+    try:
+        success = await run_in_threadpool(svc.delete_file, filename)
+        if not success:
+            raise HTTPException(status_code=404, detail=f"File '{filename}' not found")
+        
+        return {
+            "success": True,
+            "message": f"File '{filename}' deleted successfully"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/files/{filename}/info")
-async def get_file_info(filename: str):
+async def get_file_info(filename: str, request: Request):
     """ファイル情報を取得"""
     try:
-        info = svc.get_file_info(filename)
+        info = await run_in_threadpool(svc.get_file_info, filename)
         if info is None:
             raise HTTPException(status_code=404, detail=f"File '{filename}' not found")
         
-        return info
+        return _conditional_json(request, (filename, info["modified_time"], info["size_bytes"]), info)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/files/info")
-async def get_all_files_info():
+async def get_all_files_info(request: Request):
     """全てのファイルの情報を取得"""
     try:
-        files = svc.list_downloaded_files()
-        files_info = []
-        
-        for filename in files:
-            info = svc.get_file_info(filename)
-            if info:
-                files_info.append(info)
+        # 一覧と stat を 1 回のディレクトリ走査で取得
+        files_info = await run_in_threadpool(svc.list_files_with_info)
+        total_size = sum(f["size_bytes"] for f in files_info)
         
-        return {
-            "files": files_info,
-            "count": len(files_info),
-            "total_size_bytes": sum(f["size_bytes"] for f in files_info),
-            "total_size_readable": _format_size(sum(f["size_bytes"] for f in files_info))
-        }
+        return _conditional_json(
+            request,
+            tuple((f["filename"], f["modified_time"], f["size_bytes"]) for f in files_info),
+            {
+                "files": files_info,
+                "count": len(files_info),
+                "total_size_bytes": total_size,
+                "total_size_readable": format_size(total_size)
+            },
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def _format_size(size_bytes: int) -> str:
-    """ファイルサイズを読みやすい形式に変換"""
-    if size_bytes < 1024:
-        return f"{size_bytes} B"
-    elif size_bytes < 1024 * 1024:
-        return f"{size_bytes / 1024:.1f} KB"
-    elif size_bytes < 1024 * 1024 * 1024:
-        return f"{size_bytes / (1024 * 1024):.1f} MB"
-    else:
-        return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
-
 @router.get("/validate/{symbol}")
 async def validate_symbol(
     symbol: str,
@@ -316,7 +448,7 @@ async def validate_symbol(
             raise HTTPException(status_code=404, detail=f"Provider '{provider_name}' not found")
         
         provider = svc._providers[provider_name]
-        is_valid = provider.validate_symbol(symbol)
+        is_valid = await run_in_threadpool(provider.validate_symbol, symbol)
         
         return {
             "symbol": symbol,
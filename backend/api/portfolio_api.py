@@ -1,14 +1,177 @@
-from fastapi import APIRouter, HTTPException, Query, Body
-from typing import List, Optional, Dict, Any
-import json
-from fastapi.responses import HTMLResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from typing import Iterator, List, Optional, Dict, Any, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import os
+import threading
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
+from services.currency_service import CurrencyService
 from services.portfolio_service import PortfolioService
+from utils.cache import TTLCache, dir_signature, file_signature
+from utils.html_templates import figure_page_response
+from utils.serialization import ORJSONResponse, dumps, json_fragment
 
 router = APIRouter(prefix="/portfolio", tags=["portfolio"])
 svc = PortfolioService()
+logger = logging.getLogger(__name__)
+
+# 最適化/フロンティア/実行可能集合の計算結果のキャッシュ
+# 元データ/換算済みデータのファイル状態をキーに含めるため、ダウンロードや削除で自動的に無効化される
+_result_cache = TTLCache(maxsize=64, ttl=24 * 3600)
+# 計算結果の図をシリアライズした JSON バイト列（キーは _result_cache と同じ）
+_figure_json_cache = TTLCache(maxsize=64, ttl=24 * 3600)
+_currency_paths = CurrencyService()
+_DATA_DIRS = (_currency_paths.data_dir, _currency_paths.analysis_dir)
+
+def _data_signature(files: Optional[Tuple[str, ...]]) -> tuple:
+    """計算が依存するデータファイルの状態
+
+    銘柄指定がある場合はその元 CSV・換算済み CSV・為替レートのみを見る（他銘柄のダウンロードでは無効化しない）。
+    指定が無い場合は全銘柄が対象になるため、ディレクトリ全体の状態を使う。
+    """
+    if not files:
+        return dir_signature(*_DATA_DIRS)
+    data_dir, analysis_dir = _DATA_DIRS
+    paths = [_currency_paths.exchange_rate_file]
+    for f in files:
+        ticker = f[:-4] if f.endswith(".csv") else f
+        paths.append(os.path.join(data_dir, f))
+        paths.extend(os.path.join(analysis_dir, f"{ticker}_{cur}.csv") for cur in ("USD", "JPY"))
+    return file_signature(*paths)
+
+def _cache_key(func, filenames: Optional[List[str]], params: Dict[str, Any]) -> tuple:
+    """(サービス関数, ファイル列, パラメータ, データ状態) のキャッシュキー
+
+    重みの並び順はファイルの指定順に従うため、キーも指定順のまま保持する。
+    """
+    files = tuple(filenames) if filenames else None
+    return (
+        func.__name__,
+        files,
+        tuple(sorted(params.items())),
+        _data_signature(files),
+    )
+
+# 最適化等の CPU 負荷の高い計算を実行するプロセスプール（GIL を避けて複数リクエストをコア毎に並列化）
+# NEWANALYZER_PORTFOLIO_PROCESSES=0 でプロセスプールを使わず呼び出し元スレッドで計算する
+_PROCESS_POOL_SIZE = int(os.environ.get("NEWANALYZER_PORTFOLIO_PROCESSES", str(min(4, os.cpu_count() or 1))))
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+# ワーカープロセスは起動時に自プロセスのキャッシュを温める（NEWANALYZER_WARMUP=0 で無効化。main のウォームアップと同じ設定）
+_WARM_UP_WORKERS = os.environ.get("NEWANALYZER_WARMUP", "1") != "0"
+
+def _warm_up_worker() -> None:
+    """ワーカープロセスの初期化処理（全銘柄の μ/Σ を読み込み、CSV パース結果等のキャッシュを温める）
+
+    キャッシュはプロセス毎のため、メインプロセスのウォームアップはワーカーには効かない。
+    失敗してもワーカーは起動させる（プールが壊れないよう例外は握りつぶす）。
+    """
+    try:
+        if svc.list_csv_files():
+            svc.estimate_mu_sigma(None)
+    except Exception as e:
+        logger.warning(f"Worker warm-up skipped: {e}")
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """プロセスプールを必要になった時点で生成（無効化されている場合は None）"""
+    global _process_pool
+    if _PROCESS_POOL_SIZE <= 0:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=_PROCESS_POOL_SIZE,
+                initializer=_warm_up_worker if _WARM_UP_WORKERS else None,
+            )
+        return _process_pool
+
+def _noop() -> None:
+    pass
+
+def start_process_pool() -> None:
+    """プロセスプールのワーカーを起動しておく（アプリ起動時に呼ぶ）
+
+    ワーカーは必要になった時点で 1 つずつ起動されるため、プールサイズ分のタスクを同時に投入して全ワーカーを立ち上げ、
+    各ワーカーの初期化（_warm_up_worker）の完了を待つ。プールが無効な場合は何もしない。
+    """
+    pool = _get_process_pool()
+    if pool is None:
+        return
+    futures = [pool.submit(_noop) for _ in range(_PROCESS_POOL_SIZE)]
+    for future in futures:
+        future.result()
+
+def shutdown_process_pool() -> None:
+    """プロセスプールを終了（アプリ終了時に呼ぶ）"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+def _run_service(method_name: str, filenames: Optional[List[str]], params: Dict[str, Any]):
+    """ワーカープロセス側のエントリポイント（各プロセスのモジュールレベル svc で計算する）"""
+    return getattr(svc, method_name)(filenames, **params)
+
+def _compute(func, filenames: Optional[List[str]], params: Dict[str, Any]):
+    """サービス関数をプロセスプールで実行（プールが使えない場合はこのスレッドで実行）"""
+    global _process_pool
+    pool = _get_process_pool()
+    if pool is None:
+        return func(filenames, **params)
+    try:
+        return pool.submit(_run_service, func.__name__, filenames, params).result()
+    except BrokenProcessPool:
+        logger.warning("portfolio process pool is broken; computing in thread")
+        with _process_pool_lock:
+            _process_pool = None
+        return func(filenames, **params)
+
+def _cached_result(key: tuple, func, filenames: Optional[List[str]], params: Dict[str, Any]):
+    """key で _result_cache を引き、無ければ計算して保存する"""
+    result = _result_cache.get_or_compute(key, lambda: _compute(func, filenames, params))
+    logger.debug("portfolio cache %s", _result_cache.stats())
+    return result
+
+def _cached_call(func, filenames: Optional[List[str]], **params):
+    """計算結果を _result_cache にキャッシュしてサービス関数を呼ぶ"""
+    return _cached_result(_cache_key(func, filenames, params), func, filenames, params)
+
+def _cached_figure_call(func, filenames: Optional[List[str]], **params) -> Tuple[Dict[str, Any], bytes]:
+    """_cached_call に加えて図の JSON バイト列を返す
+
+    図のシリアライズ結果は計算結果と同じキーで _figure_json_cache に保存し、
+    同じパラメータの JSON/HTML エンドポイント間で共有する（図のシリアライズは 1 回だけ）。
+    """
+    key = _cache_key(func, filenames, params)
+    result = _cached_result(key, func, filenames, params)
+    figure_json = _figure_json_cache.get_or_compute(key, lambda: dumps(result["figure"]))
+    return result, figure_json
+
+# 図の JSON がこのサイズを超える場合はレスポンス全体を連結せずにストリーミングする
+_STREAM_FIGURE_BYTES = 1 << 20
+_STREAM_CHUNK_BYTES = 256 * 1024
+
+def _iter_result_json(result: Dict[str, Any], figure_json: bytes) -> Iterator[bytes]:
+    """{...図以外のキー..., "figure": 図} を断片ごとに生成（図のバイト列は一定サイズに分割して送る）"""
+    rest = dumps({k: v for k, v in result.items() if k != "figure"})
+    yield rest[:-1] + (b',"figure":' if len(rest) > 2 else b'"figure":')
+    for start in range(0, len(figure_json), _STREAM_CHUNK_BYTES):
+        yield figure_json[start:start + _STREAM_CHUNK_BYTES]
+    yield b"}"
+
+def _figure_result_response(result: Dict[str, Any], figure_json: bytes) -> Response:
+    """計算結果の JSON レスポンス（図はシリアライズ済みのバイト列をそのまま埋め込む）
+
+    図が大きい場合は StreamingResponse で返し、最初のバイトを全体の組み立てを待たずに送る。
+    """
+    if len(figure_json) > _STREAM_FIGURE_BYTES:
+        return StreamingResponse(_iter_result_json(result, figure_json), media_type="application/json")
+    return Response(dumps({**result, "figure": json_fragment(figure_json)}), media_type="application/json")
 
 # Pydanticモデル
 class PortfolioRequest(BaseModel):
@@ -32,247 +195,52 @@ class PortfolioRequest(BaseModel):
     min_weight: float = 0.0
     currency: str = "USD"  # "USD" or "JPY"
 
+    def service_args(self) -> Tuple[Optional[List[str]], Dict[str, Any]]:
+        """svc.get_*_figure に渡す (ファイル名リスト, キーワード引数)"""
+        filenames = [f"{t}.csv" for t in self.tickers] if self.tickers else None
+        return filenames, self.model_dump(exclude={"tickers"})
+
+async def _figure_page(func, filenames: Optional[List[str]], params: Dict[str, Any], title: str) -> StreamingResponse:
+    """図を計算（キャッシュ経由）して HTML ページで返す。ポートフォリオの HTML エンドポイントは全てこれを使う"""
+    try:
+        _, figure_json = await run_in_threadpool(_cached_figure_call, func, filenames, **params)
+        return figure_page_response(figure_json, title)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/optimization")
 async def post_optimization(request: PortfolioRequest):
     """ポートフォリオ最適化（POST）"""
     try:
-        filenames = None
-        if request.tickers:
-            filenames = [f"{t}.csv" for t in request.tickers]
-        
-        result = svc.get_optimization_figure(
-            filenames,
-            method=request.method,
-            annualize=request.annualize,
-            periods_per_year=request.periods_per_year,
-            r_f=request.r_f,
-            allow_short=request.allow_short,
-            num_frontier_points=request.num_frontier_points,
-            num_samples=request.num_samples,
-            max_leverage=request.max_leverage,
-            consolidate_correlated=request.consolidate_correlated,
-            correlation_threshold=request.correlation_threshold,
-            consolidation_method=request.consolidation_method,
-            optimization_method=request.optimization_method,
-            target_return=request.target_return,
-            target_risk=request.target_risk,
-            risk_tolerance=request.risk_tolerance,
-            max_weight=request.max_weight,
-            min_weight=request.min_weight,
-            currency=request.currency,
+        filenames, params = request.service_args()
+        result, figure_json = await run_in_threadpool(
+            _cached_figure_call, svc.get_optimization_figure, filenames, **params
         )
-        
-        return jsonable_encoder(json.loads(json.dumps(result, default=str)))
+        return _figure_result_response(result, figure_json)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/optimization/html", response_class=HTMLResponse)
 async def post_optimization_html(request: PortfolioRequest):
     """ポートフォリオ最適化HTML（POST）"""
-    try:
-        filenames = None
-        if request.tickers:
-            filenames = [f"{t}.csv" for t in request.tickers]
-        
-        result = svc.get_optimization_figure(
-            filenames,
-            method=request.method,
-            annualize=request.annualize,
-            periods_per_year=request.periods_per_year,
-            r_f=request.r_f,
-            allow_short=request.allow_short,
-            num_frontier_points=request.num_frontier_points,
-            num_samples=request.num_samples,
-            max_leverage=request.max_leverage,
-            consolidate_correlated=request.consolidate_correlated,
-            correlation_threshold=request.correlation_threshold,
-            consolidation_method=request.consolidation_method,
-            optimization_method=request.optimization_method,
-            target_return=request.target_return,
-            target_risk=request.target_risk,
-            risk_tolerance=request.risk_tolerance,
-            max_weight=request.max_weight,
-            min_weight=request.min_weight,
-            currency=request.currency,
-        )
-        
-        fig = result["figure"]
-        fig_json = json.dumps(fig, default=str)
-        html = f"""
-        <!doctype html>
-        <html lang="ja">
-          <head>
-            <meta charset="utf-8" />
-            <meta name="viewport" content="width=device-width, initial-scale=1" />
-            <title>Portfolio Optimization</title>
-            <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
-            <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-          </head>
-          <body>
-            <div id="chart"></div>
-            <script>
-              const fig = {fig_json};
-              Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-            </script>
-          </body>
-        </html>
-        """
-        return HTMLResponse(content=html)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.get("/optimization/html", response_class=HTMLResponse)
-async def get_optimization_html(
-    tickers: Optional[str] = Query(None, description="ティッカー（カンマ区切り）"),
-    currency: str = Query("USD", description="通貨（USD/JPY）"),
-    consolidate_correlated: bool = Query(False, description="相関統合有効化"),
-    correlation_threshold: float = Query(0.9, description="相関閾値"),
-    consolidation_method: str = Query("mean", description="統合方法"),
-    allow_short: bool = Query(True, description="ショート売り許可"),
-    optimization_method: str = Query("sharpe", description="最適化方法"),
-    num_frontier_points: int = Query(50, description="フロンティアポイント数"),
-    num_samples: int = Query(2000, description="サンプル数")
-):
-    """ポートフォリオ最適化HTML（GET）"""
-    try:
-        filenames = None
-        if tickers:
-            ticker_list = [t.strip() for t in tickers.split(",")]
-            filenames = [f"{t}.csv" for t in ticker_list]
-        
-        result = svc.get_optimization_figure(
-            filenames,
-            method="simple",
-            annualize=True,
-            periods_per_year=252,
-            r_f=0.0,
-            allow_short=allow_short,
-            num_frontier_points=num_frontier_points,
-            num_samples=num_samples,
-            max_leverage=2.0,
-            consolidate_correlated=consolidate_correlated,
-            correlation_threshold=correlation_threshold,
-            consolidation_method=consolidation_method,
-            optimization_method=optimization_method,
-            target_return=None,
-            target_risk=None,
-            risk_tolerance=1.0,
-            max_weight=1.0,
-            min_weight=0.0,
-            currency=currency,
-        )
-        
-        fig = result["figure"]
-        fig_json = json.dumps(fig, default=str)
-        html = f"""
-        <!doctype html>
-        <html lang="ja">
-          <head>
-            <meta charset="utf-8" />
-            <meta name="viewport" content="width=device-width, initial-scale=1" />
-            <title>Portfolio Optimization</title>
-            <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
-            <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-          </head>
-          <body>
-            <div id="chart"></div>
-            <script>
-              const fig = {fig_json};
-              Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-            </script>
-          </body>
-        </html>
-        """
-        return HTMLResponse(content=html)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _figure_page(svc.get_optimization_figure, *request.service_args(), "Portfolio Optimization")
 
 @router.post("/efficient-frontier")
 async def post_efficient_frontier(request: PortfolioRequest):
     """効率的フロンティア（POST）"""
     try:
-        filenames = None
-        if request.tickers:
-            filenames = [f"{t}.csv" for t in request.tickers]
-        
-        result = svc.get_efficient_frontier_figure(
-            filenames,
-            method=request.method,
-            annualize=request.annualize,
-            periods_per_year=request.periods_per_year,
-            r_f=request.r_f,
-            allow_short=request.allow_short,
-            num_frontier_points=request.num_frontier_points,
-            num_samples=request.num_samples,
-            max_leverage=request.max_leverage,
-            consolidate_correlated=request.consolidate_correlated,
-            correlation_threshold=request.correlation_threshold,
-            consolidation_method=request.consolidation_method,
-            optimization_method=request.optimization_method,
-            target_return=request.target_return,
-            target_risk=request.target_risk,
-            risk_tolerance=request.risk_tolerance,
-            max_weight=request.max_weight,
-            min_weight=request.min_weight,
+        filenames, params = request.service_args()
+        result, figure_json = await run_in_threadpool(
+            _cached_figure_call, svc.get_efficient_frontier_figure, filenames, **params
         )
-        
-        return jsonable_encoder(json.loads(json.dumps(result, default=str)))
+        return _figure_result_response(result, figure_json)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/efficient-frontier/html", response_class=HTMLResponse)
 async def post_efficient_frontier_html(request: PortfolioRequest):
     """効率的フロンティアHTML（POST）"""
-    try:
-        filenames = None
-        if request.tickers:
-            filenames = [f"{t}.csv" for t in request.tickers]
-        
-        result = svc.get_efficient_frontier_figure(
-            filenames,
-            method=request.method,
-            annualize=request.annualize,
-            periods_per_year=request.periods_per_year,
-            r_f=request.r_f,
-            allow_short=request.allow_short,
-            num_frontier_points=request.num_frontier_points,
-            num_samples=request.num_samples,
-            max_leverage=request.max_leverage,
-            consolidate_correlated=request.consolidate_correlated,
-            correlation_threshold=request.correlation_threshold,
-            consolidation_method=request.consolidation_method,
-            optimization_method=request.optimization_method,
-            target_return=request.target_return,
-            target_risk=request.target_risk,
-            risk_tolerance=request.risk_tolerance,
-            max_weight=request.max_weight,
-            min_weight=request.min_weight,
-        )
-        
-        fig = result["figure"]
-        fig_json = json.dumps(fig, default=str)
-        html = f"""
-        <!doctype html>
-        <html lang="ja">
-          <head>
-            <meta charset="utf-8" />
-            <meta name="viewport" content="width=device-width, initial-scale=1" />
-            <title>Efficient Frontier</title>
-            <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
-            <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-          </head>
-          <body>
-            <div id="chart"></div>
-            <script>
-              const fig = {fig_json};
-              Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-            </script>
-          </body>
-        </html>
-        """
-        return HTMLResponse(content=html)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _figure_page(svc.get_efficient_frontier_figure, *request.service_args(), "Efficient Frontier")
 
 @router.get("/inputs")
 async def get_inputs(
@@ -288,7 +256,9 @@ async def get_inputs(
         filenames = None
         if tickers:
             filenames = [f"{t}.csv" for t in tickers]
-        result = svc.get_portfolio_inputs(
+        result = await run_in_threadpool(
+            _cached_call,
+            svc.get_portfolio_inputs,
             filenames, 
             method=method, 
             annualize=annualize, 
@@ -297,12 +267,33 @@ async def get_inputs(
             correlation_threshold=correlation_threshold,
             consolidation_method=consolidation_method
         )
-        return jsonable_encoder(json.loads(json.dumps(result, default=str)))
+        return ORJSONResponse(result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/feasible")
-async def get_feasible(
+class FeasibleQuery(BaseModel):
+    """実行可能集合のクエリパラメータ（/feasible, /feasible/stream, /feasible/html で共有。feasible_query で組み立てる）"""
+    tickers: Optional[List[str]] = None
+    method: str = "simple"
+    annualize: bool = True
+    periods_per_year: int = 252
+    r_f: float = 0.0
+    allow_short: bool = True
+    target_return_min: Optional[float] = None
+    target_return_max: Optional[float] = None
+    num_frontier_points: int = 50
+    num_samples: int = 2000
+    max_leverage: float = 2.0
+    consolidate_correlated: bool = False
+    correlation_threshold: float = 0.9
+    consolidation_method: str = "mean"
+
+    def service_args(self) -> Tuple[Optional[List[str]], Dict[str, Any]]:
+        """svc.get_feasible_set_figure に渡す (ファイル名リスト, キーワード引数)"""
+        filenames = [f"{t}.csv" for t in self.tickers] if self.tickers else None
+        return filenames, self.model_dump(exclude={"tickers"})
+
+def feasible_query(
     tickers: Optional[List[str]] = Query(None),
     method: str = Query("simple"),
     annualize: bool = Query(True),
@@ -316,50 +307,14 @@ async def get_feasible(
     max_leverage: float = Query(2.0),
     consolidate_correlated: bool = Query(False, description="相関統合の有無"),
     correlation_threshold: float = Query(0.9, description="相関統合の閾値"),
-    consolidation_method: str = Query("mean", description="統合方法: mean/median/first")
-):
-    try:
-        filenames = None
-        if tickers:
-            filenames = [f"{t}.csv" for t in tickers]
-        result = svc.get_feasible_set_figure(
-            filenames,
-            method=method,
-            annualize=annualize,
-            periods_per_year=periods_per_year,
-            r_f=r_f,
-            allow_short=allow_short,
-            target_return_min=target_return_min,
-            target_return_max=target_return_max,
-            num_frontier_points=num_frontier_points,
-            num_samples=num_samples,
-            max_leverage=max_leverage,
-            consolidate_correlated=consolidate_correlated,
-            correlation_threshold=correlation_threshold,
-            consolidation_method=consolidation_method,
-        )
-        return jsonable_encoder(json.loads(json.dumps(result, default=str)))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    consolidation_method: str = Query("mean", description="統合方法: mean/median/first"),
+) -> FeasibleQuery:
+    """クエリパラメータから FeasibleQuery を組み立てる依存関数
 
-@router.get("/feasible/html", response_class=HTMLResponse)
-async def get_feasible_html(
-    tickers: Optional[List[str]] = Query(None),
-    method: str = Query("simple"),
-    annualize: bool = Query(True),
-    periods_per_year: int = Query(252),
-    r_f: float = Query(0.0),
-    allow_short: bool = Query(True),
-    target_return_min: Optional[float] = Query(None),
-    target_return_max: Optional[float] = Query(None),
-    num_frontier_points: int = Query(50),
-    num_samples: int = Query(2000),
-    max_leverage: float = Query(2.0),
-    consolidate_correlated: bool = Query(False),
-    correlation_threshold: float = Query(0.9),
-    consolidation_method: str = Query("mean")
-):
-    result = await get_feasible(
+    BaseModel を直接 Depends() に渡すと List 型の tickers がリクエストボディ扱いになるため、
+    パラメータは関数の引数として宣言する。
+    """
+    return FeasibleQuery(
         tickers=tickers,
         method=method,
         annualize=annualize,
@@ -375,104 +330,109 @@ async def get_feasible_html(
         correlation_threshold=correlation_threshold,
         consolidation_method=consolidation_method,
     )
-    fig = result["figure"]
-    fig_json = json.dumps(fig, default=str)
-    html = f"""
-    <!doctype html>
-    <html lang=\"ja\">
-      <head>
-        <meta charset=\"utf-8\" />
-        <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-        <title>Feasible Set</title>
-        <script src=\"https://cdn.plot.ly/plotly-2.30.0.min.js\"></script>
-        <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-      </head>
-      <body>
-        <div id=\"chart\"></div>
-        <script>
-          const fig = {fig_json};
-          Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-        </script>
-      </body>
-    </html>
+
+def _feasible_core(q: FeasibleQuery) -> Tuple[Dict[str, Any], bytes]:
+    """実行可能集合の計算本体（同期・キャッシュ経由）。(結果, 図の JSON バイト列) を返す
+
+    /feasible はハンドラを経由せずにこの関数を直接使う（/feasible/html は同じキャッシュを _figure_page 経由で使う）。
     """
-    return HTMLResponse(content=html)
+    filenames, params = q.service_args()
+    return _cached_figure_call(svc.get_feasible_set_figure, filenames, **params)
 
-@router.get("/optimization/html", response_class=HTMLResponse)
-async def get_optimization_html(
-    tickers: Optional[List[str]] = Query(None),
-    method: str = Query("simple"),
-    annualize: bool = Query(True),
-    periods_per_year: int = Query(252),
-    r_f: float = Query(0.0),
-    allow_short: bool = Query(True),
-    num_frontier_points: int = Query(50),
-    num_samples: int = Query(2000),
-    max_leverage: float = Query(2.0),
-    consolidate_correlated: bool = Query(False),
-    correlation_threshold: float = Query(0.9),
-    consolidation_method: str = Query("mean"),
-    optimization_method: str = Query("sharpe", description="最適化方法: sharpe/min_variance/max_return"),
-    target_return: Optional[float] = Query(None),
-    target_risk: Optional[float] = Query(None),
-    risk_tolerance: float = Query(1.0),
-    max_weight: float = Query(1.0),
-    min_weight: float = Query(0.0)
-):
+async def _compute_feasible(q: FeasibleQuery) -> Tuple[Dict[str, Any], bytes]:
+    """_feasible_core をスレッドプールで実行（失敗時は 500）"""
     try:
-        filenames = None
-        if tickers:
-            filenames = [f"{t}.csv" for t in tickers]
-        
-        result = svc.get_optimization_figure(
-            filenames,
-            method=method,
-            annualize=annualize,
-            periods_per_year=periods_per_year,
-            r_f=r_f,
-            allow_short=allow_short,
-            num_frontier_points=num_frontier_points,
-            num_samples=num_samples,
-            max_leverage=max_leverage,
-            consolidate_correlated=consolidate_correlated,
-            correlation_threshold=correlation_threshold,
-            consolidation_method=consolidation_method,
-            optimization_method=optimization_method,
-            target_return=target_return,
-            target_risk=target_risk,
-            risk_tolerance=risk_tolerance,
-            max_weight=max_weight,
-            min_weight=min_weight,
-        )
-        
-        fig = result["figure"]
-        fig_json = json.dumps(fig, default=str)
-        html = f"""
-        <!doctype html>
-        <html lang="ja">
-          <head>
-            <meta charset="utf-8" />
-            <meta name="viewport" content="width=device-width, initial-scale=1" />
-            <title>Portfolio Optimization</title>
-            <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
-            <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-          </head>
-          <body>
-            <div id="chart"></div>
-            <script>
-              const fig = {fig_json};
-              Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-            </script>
-          </body>
-        </html>
-        """
-        return HTMLResponse(content=html)
+        return await run_in_threadpool(_feasible_core, q)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/efficient-frontier/html", response_class=HTMLResponse)
-async def get_efficient_frontier_html(
-    tickers: Optional[List[str]] = Query(None),
+@router.get("/feasible")
+async def get_feasible(q: FeasibleQuery = Depends(feasible_query)):
+    return _figure_result_response(*await _compute_feasible(q))
+
+def _sse_event(payload: Dict[str, Any], event: Optional[str] = None) -> bytes:
+    """Server-Sent Events の 1 イベント分のバイト列"""
+    head = f"event: {event}\n".encode() if event else b""
+    return head + b"data: " + dumps(payload) + b"\n\n"
+
+@router.get("/feasible/stream")
+async def get_feasible_stream(request: Request, q: FeasibleQuery = Depends(feasible_query)):
+    """実行可能集合を SSE で返す（進捗イベント {"progress"} の後、最後に {"progress": 100, "result"}）
+
+    クライアントが切断した場合は残りの計算を打ち切る。
+    """
+    filenames, params = q.service_args()
+
+    async def event_stream():
+        key = await run_in_threadpool(_cache_key, svc.get_feasible_set_figure, filenames, params)
+        cached = _result_cache.get(key)
+        if cached is not None:
+            yield _sse_event({"progress": 100, "result": cached})
+            return
+
+        steps = svc.iter_feasible_set_figure(filenames, **params)
+        try:
+            while True:
+                step = await run_in_threadpool(next, steps, None)
+                if step is None:
+                    return
+                if await request.is_disconnected():
+                    return
+                progress, result = step
+                if result is None:
+                    yield _sse_event({"progress": progress})
+                else:
+                    _result_cache.set(key, result)
+                    yield _sse_event({"progress": progress, "result": result})
+        except Exception as e:
+            yield _sse_event({"detail": str(e)}, event="error")
+        finally:
+            steps.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Content-Encoding を明示して GZipMiddleware のバッファリングを回避（イベントを即時に届ける）
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Content-Encoding": "identity"},
+    )
+
+@router.get("/feasible/html", response_class=HTMLResponse)
+async def get_feasible_html(q: FeasibleQuery = Depends(feasible_query)):
+    return await _figure_page(svc.get_feasible_set_figure, *q.service_args(), "Feasible Set")
+
+class PortfolioQuery(BaseModel):
+    """GET の最適化/フロンティア HTML のクエリパラメータ（PortfolioRequest の GET 版。portfolio_query で組み立てる）"""
+    tickers: Optional[List[str]] = None
+    currency: str = "USD"
+    method: str = "simple"
+    annualize: bool = True
+    periods_per_year: int = 252
+    r_f: float = 0.0
+    allow_short: bool = True
+    num_frontier_points: int = 50
+    num_samples: int = 2000
+    max_leverage: float = 2.0
+    consolidate_correlated: bool = False
+    correlation_threshold: float = 0.9
+    consolidation_method: str = "mean"
+    optimization_method: str = "sharpe"
+    target_return: Optional[float] = None
+    target_risk: Optional[float] = None
+    risk_tolerance: float = 1.0
+    max_weight: float = 1.0
+    min_weight: float = 0.0
+
+    def service_args(self) -> Tuple[Optional[List[str]], Dict[str, Any]]:
+        """svc.get_*_figure に渡す (ファイル名リスト, キーワード引数)"""
+        filenames = None
+        if self.tickers:
+            ticker_list = [t.strip() for value in self.tickers for t in value.split(",") if t.strip()]
+            filenames = [f"{t}.csv" for t in ticker_list] or None
+        return filenames, self.model_dump(exclude={"tickers"})
+
+def portfolio_query(
+    tickers: Optional[List[str]] = Query(None, description="ティッカー（複数指定またはカンマ区切り）"),
+    currency: str = Query("USD", description="通貨（USD/JPY）"),
     method: str = Query("simple"),
     annualize: bool = Query(True),
     periods_per_year: int = Query(252),
@@ -484,60 +444,42 @@ async def get_efficient_frontier_html(
     consolidate_correlated: bool = Query(False),
     correlation_threshold: float = Query(0.9),
     consolidation_method: str = Query("mean"),
-    optimization_method: str = Query("sharpe"),
+    optimization_method: str = Query("sharpe", description="最適化方法: sharpe/min_variance/max_return"),
     target_return: Optional[float] = Query(None),
     target_risk: Optional[float] = Query(None),
     risk_tolerance: float = Query(1.0),
     max_weight: float = Query(1.0),
-    min_weight: float = Query(0.0)
-):
-    try:
-        filenames = None
-        if tickers:
-            filenames = [f"{t}.csv" for t in tickers]
-        
-        result = svc.get_efficient_frontier_figure(
-            filenames,
-            method=method,
-            annualize=annualize,
-            periods_per_year=periods_per_year,
-            r_f=r_f,
-            allow_short=allow_short,
-            num_frontier_points=num_frontier_points,
-            num_samples=num_samples,
-            max_leverage=max_leverage,
-            consolidate_correlated=consolidate_correlated,
-            correlation_threshold=correlation_threshold,
-            consolidation_method=consolidation_method,
-            optimization_method=optimization_method,
-            target_return=target_return,
-            target_risk=target_risk,
-            risk_tolerance=risk_tolerance,
-            max_weight=max_weight,
-            min_weight=min_weight,
-        )
-        
-        fig = result["figure"]
-        fig_json = json.dumps(fig, default=str)
-        html = f"""
-        <!doctype html>
-        <html lang="ja">
-          <head>
-            <meta charset="utf-8" />
-            <meta name="viewport" content="width=device-width, initial-scale=1" />
-            <title>Efficient Frontier</title>
-            <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
-            <style>html, body {{ height: 100%; margin: 0; }} #chart {{ width: 100%; height: 100vh; }}</style>
-          </head>
-          <body>
-            <div id="chart"></div>
-            <script>
-              const fig = {fig_json};
-              Plotly.newPlot('chart', fig.data, fig.layout, {{responsive: true, displaylogo: false}});
-            </script>
-          </body>
-        </html>
-        """
-        return HTMLResponse(content=html)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    min_weight: float = Query(0.0),
+) -> PortfolioQuery:
+    """クエリパラメータから PortfolioQuery を組み立てる依存関数（tickers をボディ扱いさせないため。feasible_query と同様）"""
+    return PortfolioQuery(
+        tickers=tickers,
+        currency=currency,
+        method=method,
+        annualize=annualize,
+        periods_per_year=periods_per_year,
+        r_f=r_f,
+        allow_short=allow_short,
+        num_frontier_points=num_frontier_points,
+        num_samples=num_samples,
+        max_leverage=max_leverage,
+        consolidate_correlated=consolidate_correlated,
+        correlation_threshold=correlation_threshold,
+        consolidation_method=consolidation_method,
+        optimization_method=optimization_method,
+        target_return=target_return,
+        target_risk=target_risk,
+        risk_tolerance=risk_tolerance,
+        max_weight=max_weight,
+        min_weight=min_weight,
+    )
+
+@router.get("/optimization/html", response_class=HTMLResponse)
+async def get_optimization_html(q: PortfolioQuery = Depends(portfolio_query)):
+    """ポートフォリオ最適化HTML（GET）"""
+    return await _figure_page(svc.get_optimization_figure, *q.service_args(), "Portfolio Optimization")
+
+@router.get("/efficient-frontier/html", response_class=HTMLResponse)
+async def get_efficient_frontier_html(q: PortfolioQuery = Depends(portfolio_query)):
+    """効率的フロンティアHTML（GET）"""
+    return await _figure_page(svc.get_efficient_frontier_figure, *q.service_args(), "Efficient Frontier")
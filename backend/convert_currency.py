@@ -4,55 +4,108 @@
 data/のCSVファイルを読み込み、為替レートを適用してdata_analysis/に保存
 """
 
+import numpy as np
 import pandas as pd
 import os
 import json
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+# pyarrow はオプション依存（あればマルチスレッドの CSV パーサで型変換まで済ませる）
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+EXCHANGE_RATE_FILE = "data/USDJPY.csv"
+
+if PYARROW_AVAILABLE:
+    # 列の型は一度だけ定義（存在しない列の指定は無視される）
+    _CSV_SCHEMA = {'Date': pa.timestamp('ns'), **{col: pa.float64() for col in PRICE_COLUMNS}}
+    _READ_OPTIONS = pacsv.ReadOptions(use_threads=True)
+    _CONVERT_OPTIONS = pacsv.ConvertOptions(
+        column_types=_CSV_SCHEMA, null_values=['', ' '], strings_can_be_null=True
+    )
+
+def read_csv(file_path):
+    """CSVを読み込み（pyarrow があれば Date/価格列を型付きで読む）"""
+    if PYARROW_AVAILABLE:
+        try:
+            table = pacsv.read_csv(file_path, read_options=_READ_OPTIONS, convert_options=_CONVERT_OPTIONS)
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+        except pa.ArrowInvalid:
+            # 複数行ヘッダー等の特殊な構造やタイムゾーン付きの日付は pandas で読む
+            pass
+    return pd.read_csv(file_path)
+
 def load_exchange_rate():
     """為替レートデータを読み込み"""
-    exchange_file = "data/USDJPY.csv"
+    exchange_file = EXCHANGE_RATE_FILE
     if not os.path.exists(exchange_file):
         print(f"為替レートファイルが見つかりません: {exchange_file}")
         return None
     
-    df = pd.read_csv(exchange_file)
-    df['Date'] = pd.to_datetime(df['Date'])
+    df = read_csv(exchange_file)
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df['Date'] = pd.to_datetime(df['Date'])
+    df['Close'] = pd.to_numeric(df['Close'], errors='coerce')
+    # 日付順・重複なしにしておく（convert_stock_data で二分探索するため）
+    df = df.drop_duplicates('Date', keep='last').sort_values('Date').reset_index(drop=True)
     return df
 
+def exchange_rate_arrays(exchange_rates):
+    """為替レートの DataFrame を (日付配列 datetime64[ns], レート配列 float64) に変換"""
+    return (
+        exchange_rates['Date'].to_numpy(dtype='datetime64[ns]'),
+        exchange_rates['Close'].to_numpy(dtype=np.float64),
+    )
+
 def identify_currency(ticker):
     """ティッカーから通貨を識別"""
-    if ticker.endswith('.T'):
-        return 'JPY'
-    else:
-        return 'USD'
+    return 'JPY' if ticker[-2:] == '.T' else 'USD'
+
+def is_up_to_date(target_paths, source_paths):
+    """換算済みファイルが全て存在し、元データ・為替レートより新しいか"""
+    try:
+        source_mtime = max(os.path.getmtime(path) for path in source_paths)
+        return all(os.path.getmtime(path) >= source_mtime for path in target_paths)
+    except OSError:
+        return False
 
 def convert_stock_data(df, from_currency, to_currency, exchange_rates):
-    """株価データを通貨換算"""
+    """株価データを通貨換算（exchange_rates は exchange_rate_arrays の (日付配列, レート配列)）"""
     if from_currency == to_currency:
         return df.copy()
     
-    # 為替レートとマージ
-    merged = pd.merge(df, exchange_rates[['Date', 'Close']], on='Date', how='left', suffixes=('', '_rate'))
-    
-    # 為替レートの欠損値を削除
-    merged = merged.dropna(subset=['Close_rate'])
-    
-    # 通貨換算
+    # 各行の日付に対応する為替レートを二分探索で引く（日付配列は昇順・重複なし）
+    rate_dates, rates = exchange_rates
+    if len(rate_dates) == 0:
+        return df.iloc[:0].reset_index(drop=True)
+    dates = df['Date'].to_numpy(dtype='datetime64[ns]')
+    idx = np.minimum(np.searchsorted(rate_dates, dates), len(rate_dates) - 1)
+    rate = rates[idx]
+    
+    # 同じ日付の為替レートが無い行・欠損行を除外
+    has_rate = (rate_dates[idx] == dates) & ~np.isnan(rate)
+    converted = df.loc[has_rate].reset_index(drop=True)
+    rate = rate[has_rate]
+    
+    # 価格列をまとめて換算（列毎のループではなく 2 次元配列に一度でブロードキャスト）
+    price_cols = [col for col in ['Open', 'High', 'Low', 'Close'] if col in converted.columns]
+    prices = converted[price_cols].to_numpy(dtype=float)
     if from_currency == 'USD' and to_currency == 'JPY':
         # ドルから円
-        for col in ['Open', 'High', 'Low', 'Close']:
-            if col in merged.columns:
-                merged[col] = merged[col].astype(float) * merged['Close_rate'].astype(float)
+        prices *= rate[:, None]
     elif from_currency == 'JPY' and to_currency == 'USD':
         # 円からドル
-        for col in ['Open', 'High', 'Low', 'Close']:
-            if col in merged.columns:
-                merged[col] = merged[col].astype(float) / merged['Close_rate'].astype(float)
+        prices /= rate[:, None]
+    converted[price_cols] = prices
     
-    # 為替レート列を削除
-    merged = merged.drop('Close_rate', axis=1)
-    return merged
+    return converted
 
 def process_csv_file(file_path, exchange_rates):
     """CSVファイルを処理して換算"""
@@ -65,57 +118,65 @@ def process_csv_file(file_path, exchange_rates):
         print(f"  スキップ: 英字ではないため変換しません -> {ticker}")
         return {}
     
+    original_currency = identify_currency(ticker)
+    
+    # 換算先ファイル（元データ・為替レートが更新されていなければ再生成しない）
+    results = {
+        currency: f"{ticker}_{currency}.csv"
+        for currency in ('USD', 'JPY') if currency != original_currency
+    }
+    target_paths = [os.path.join("data_analysis", name) for name in results.values()]
+    if is_up_to_date(target_paths, [file_path, EXCHANGE_RATE_FILE]):
+        print(f"  スキップ: 換算済みファイルが最新です -> {', '.join(results.values())}")
+        return results
+    
     # ファイルを読み込み
-    df = pd.read_csv(file_path)
+    df = read_csv(file_path)
     
     # 特殊なCSV構造に対応（最初の2行をスキップ）
     if 'Date' not in df.columns and len(df.columns) >= 6:
         df = df.iloc[2:].reset_index(drop=True)
         df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
         
-        # 空のDate行を削除
-        df = df.dropna(subset=['Date'])
-        df = df[df['Date'] != '']
+        # 空のDate行を削除（欠損と空文字を一つのマスクで判定）
+        df = df[df['Date'].notna() & (df['Date'] != '')]
     
-    # 数値列を確実に数値型に変換
-    for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
-        if col in df.columns:
+    # 数値列を確実に数値型に変換（pyarrow で読めた列は変換済み）
+    for col in PRICE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_float_dtype(df[col]):
             df[col] = pd.to_numeric(df[col], errors='coerce')
     
-    # 欠損値を削除
-    df = df.dropna(subset=['Open', 'High', 'Low', 'Close', 'Volume'])
+    # 欠損値（および inf）を含む行を一度の判定で削除
+    valid = np.isfinite(df[PRICE_COLUMNS].to_numpy(dtype=np.float64)).all(axis=1)
+    df = df.loc[valid].reset_index(drop=True)
     
-    df['Date'] = pd.to_datetime(df['Date'])
-    
-    original_currency = identify_currency(ticker)
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df['Date'] = pd.to_datetime(df['Date'])
     
     print(f"  ティッカー: {ticker}, 元通貨: {original_currency}")
     print(f"  データ行数: {len(df)}")
     
-    results = {}
-    
-    # USD換算
-    if original_currency != 'USD':
-        print(f"  USDに換算中...")
-        usd_df = convert_stock_data(df, original_currency, 'USD', exchange_rates)
-        usd_filename = f"{ticker}_USD.csv"
-        usd_path = os.path.join("data_analysis", usd_filename)
-        usd_df.to_csv(usd_path, index=False)
-        results['USD'] = usd_filename
-        print(f"  保存: {usd_path}")
-    
-    # JPY換算
-    if original_currency != 'JPY':
-        print(f"  JPYに換算中...")
-        jpy_df = convert_stock_data(df, original_currency, 'JPY', exchange_rates)
-        jpy_filename = f"{ticker}_JPY.csv"
-        jpy_path = os.path.join("data_analysis", jpy_filename)
-        jpy_df.to_csv(jpy_path, index=False)
-        results['JPY'] = jpy_filename
-        print(f"  保存: {jpy_path}")
+    # USD / JPY換算
+    for currency, converted_filename in results.items():
+        print(f"  {currency}に換算中...")
+        converted_df = convert_stock_data(df, original_currency, currency, exchange_rates)
+        converted_path = os.path.join("data_analysis", converted_filename)
+        converted_df.to_csv(converted_path, index=False)
+        print(f"  保存: {converted_path}")
     
     return results
 
+# ワーカープロセス側で保持する為替レート（initializer で各プロセス起動時に一度だけ読み込む）
+_worker_exchange_rates = None
+
+def _init_worker(dates_path, rates_path):
+    """.npy をメモリマップで開く（コピーせず、全ワーカーで同じ物理ページを共有）"""
+    global _worker_exchange_rates
+    _worker_exchange_rates = (np.load(dates_path, mmap_mode='r'), np.load(rates_path, mmap_mode='r'))
+
+def _process_csv_file_in_worker(file_path):
+    return process_csv_file(file_path, _worker_exchange_rates)
+
 def main():
     """メイン処理"""
     print("=== 通貨換算スクリプト ===")
@@ -131,22 +192,34 @@ def main():
     
     # 為替レート読み込み
     print("為替レートを読み込み中...")
-    exchange_rates = load_exchange_rate()
-    if exchange_rates is None:
+    exchange_rate_df = load_exchange_rate()
+    if exchange_rate_df is None:
         return
     
-    print(f"為替レート期間: {exchange_rates['Date'].min()} ～ {exchange_rates['Date'].max()}")
+    print(f"為替レート期間: {exchange_rate_df['Date'].min()} ～ {exchange_rate_df['Date'].max()}")
+    exchange_rates = exchange_rate_arrays(exchange_rate_df)
     
     # CSVファイル一覧
     csv_files = [f for f in os.listdir("data") if f.endswith('.csv') and f != 'USDJPY.csv']
     print(f"処理対象ファイル: {csv_files}")
     
-    # 各ファイルを処理
-    all_conversions = {}
-    for csv_file in csv_files:
-        file_path = os.path.join("data", csv_file)
-        conversions = process_csv_file(file_path, exchange_rates)
-        all_conversions[csv_file] = conversions
+    # 各ファイルを処理（ファイル毎に独立しているのでプロセス並列で実行）
+    file_paths = [os.path.join("data", csv_file) for csv_file in csv_files]
+    if len(file_paths) > 1:
+        max_workers = min(len(file_paths), os.cpu_count() or 1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 為替レートは .npy に一度だけ書き出し、各ワーカーはメモリマップで参照する
+            dates_path = os.path.join(tmp_dir, 'USDJPY_dates.npy')
+            rates_path = os.path.join(tmp_dir, 'USDJPY_rates.npy')
+            np.save(dates_path, exchange_rates[0])
+            np.save(rates_path, exchange_rates[1])
+            with ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_init_worker, initargs=(dates_path, rates_path)
+            ) as executor:
+                results = list(executor.map(_process_csv_file_in_worker, file_paths))
+    else:
+        results = [process_csv_file(file_path, exchange_rates) for file_path in file_paths]
+    all_conversions = dict(zip(csv_files, results))
     
     # メタデータ保存
     metadata = {
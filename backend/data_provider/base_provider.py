@@ -1,7 +1,15 @@
+import logging
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import ClassVar, Dict, List, Optional, Any
 from datetime import datetime, date
 
+from utils.cache import TTLCache
+
+
+# get_stock_data の "data" の列（この順で保存される）
+STOCK_DATA_COLUMNS = ["Date", "Open", "High", "Low", "Close", "Volume"]
+
 
 class BaseDataProvider(ABC):
     """データプロバイダーの抽象基底クラス
@@ -10,6 +18,11 @@ class BaseDataProvider(ABC):
     新しいデータソースを追加する際は、このクラスを継承して実装してください。
     """
     
+    # シンボル検索結果のキャッシュ（全プロバイダー共有、キーにプロバイダーのクラス名を含める）
+    _search_cache: ClassVar[TTLCache] = TTLCache(maxsize=1024, ttl=600)
+    # get_stock_data_bulk で同時に発行するリクエスト数の上限（プロバイダーのレート制限に合わせて上書きする）
+    max_concurrent_requests: int = 4
+    
     @abstractmethod
     def get_stock_data(
         self, 
@@ -30,13 +43,70 @@ class BaseDataProvider(ABC):
             標準化されたデータ辞書:
             {
                 "success": bool,
-                "data": Optional[List[Dict]],  # 成功時のみ
-                "error": Optional[str],        # 失敗時のみ
-                "metadata": Dict               # メタデータ
+                "data": Optional[pd.DataFrame],  # 成功時のみ（列は STOCK_DATA_COLUMNS）
+                "error": Optional[str],          # 失敗時のみ
+                "metadata": Dict                 # メタデータ
             }
         """
         pass
     
+    def get_stock_data_many(
+        self,
+        symbols: List[str],
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        **kwargs: Any
+    ) -> Dict[str, Dict[str, Any]]:
+        """複数シンボルの株価データをまとめて取得する
+        
+        既定では get_stock_data_bulk でシンボル毎に並行取得する。一括取得 API を持つプロバイダーはオーバーライドする。
+        
+        Args:
+            symbols: 株式シンボルのリスト
+            start_date: 開始日
+            end_date: 終了日
+            **kwargs: プロバイダー固有のパラメータ
+            
+        Returns:
+            シンボル → get_stock_data と同形式の結果辞書
+        """
+        return self.get_stock_data_bulk(symbols, start_date=start_date, end_date=end_date, **kwargs)
+    
+    def get_stock_data_bulk(
+        self,
+        symbols: List[str],
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        **kwargs: Any
+    ) -> Dict[str, Dict[str, Any]]:
+        """シンボル毎の get_stock_data をスレッドで並行実行する
+        
+        get_stock_data は同期 I/O のため、スレッドで重ねることで全体の待ち時間を
+        各リクエストの合計から最大値程度に短縮する（同時実行数は max_concurrent_requests まで）。
+        
+        Args:
+            symbols: 株式シンボルのリスト
+            start_date: 開始日
+            end_date: 終了日
+            **kwargs: プロバイダー固有のパラメータ
+            
+        Returns:
+            シンボル → get_stock_data と同形式の結果辞書
+        """
+        unique_symbols = list(dict.fromkeys(symbols))
+        if len(unique_symbols) <= 1:
+            return {
+                symbol: self.get_stock_data(symbol, start_date=start_date, end_date=end_date, **kwargs)
+                for symbol in unique_symbols
+            }
+        max_workers = min(self.max_concurrent_requests, len(unique_symbols))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            fetched = executor.map(
+                lambda symbol: self.get_stock_data(symbol, start_date=start_date, end_date=end_date, **kwargs),
+                unique_symbols,
+            )
+            return dict(zip(unique_symbols, fetched))
+    
     @abstractmethod
     def validate_symbol(self, symbol: str) -> bool:
         """シンボルの妥当性を検証する
@@ -65,10 +135,13 @@ class BaseDataProvider(ABC):
         """
         pass
     
-    @abstractmethod
     def search_symbols(self, query: str) -> List[Dict[str, Any]]:
         """シンボルを検索する
         
+        結果は前後の空白と大文字小文字を無視したクエリ毎に 10 分間キャッシュする
+        （入力補完で同じクエリが繰り返されても外部 API を呼ばない）。
+        空のクエリは問い合わせずに空リストを返す。検索に失敗した場合は空リストを返し、キャッシュしない。
+        
         Args:
             query: 検索クエリ
             
@@ -83,4 +156,24 @@ class BaseDataProvider(ABC):
                 }
             ]
         """
+        query = query.strip()
+        if not query:
+            return []
+        key = (type(self).__name__, query.lower())
+        try:
+            return self._search_cache.get_or_compute(key, lambda: self._search_symbols_impl(query))
+        except Exception as e:
+            logging.error(f"Error searching symbols for '{query}': {str(e)}")
+            return []
+    
+    @abstractmethod
+    def _search_symbols_impl(self, query: str) -> List[Dict[str, Any]]:
+        """シンボル検索の実装（サブクラスで実装する。失敗時は例外を送出する）
+        
+        Args:
+            query: 検索クエリ
+            
+        Returns:
+            search_symbols と同形式の検索結果のリスト
+        """
         pass
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Any, Optional
+
+import orjson
+
+from utils.serialization import dumps
+
+# ディレクトリ名としてそのまま使える namespace（例: "AAPL", "6758.T", "^N225", "USDJPY=X"）
+_SAFE_NAMESPACE_RE = re.compile(r"[A-Za-z0-9^=_-][A-Za-z0-9.^=_-]{0,63}")
+
+
+class FileCache:
+    """JSON ファイルによる永続キャッシュ
+
+    値は <cache_dir>/<namespace>/<md5(key)>.json に {"timestamp", "value"} として保存する。
+    namespace はそのままディレクトリ名になるため、英数字と ._^=- 以外を含む（または . で始まる）場合は md5 に置き換える
+    （"/" や ".." を含むシンボルで cache_dir の外に書き込まないため）。
+    プロセス再起動後も有効で、書き込みは一時ファイル経由の置き換えで行う（読み込み側が途中の状態を見ない）。
+    """
+
+    def __init__(self, cache_dir: str, ttl: float) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _path(self, namespace: str, key: str) -> str:
+        if not _SAFE_NAMESPACE_RE.fullmatch(namespace):
+            namespace = hashlib.md5(namespace.encode("utf-8")).hexdigest()
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, namespace, f"{digest}.json")
+
+    def get(self, namespace: str, key: str, ttl: Optional[float] = None) -> Optional[Any]:
+        """有効期限内の値を返す（無い/期限切れ/壊れている場合は None）"""
+        path = self._path(namespace, key)
+        try:
+            with open(path, "rb") as f:
+                entry = orjson.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, orjson.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable cache file {path}: {str(e)}")
+            return None
+        if time.time() - entry.get("timestamp", 0) >= (self.ttl if ttl is None else ttl):
+            return None
+        return entry.get("value")
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """値を保存（保存に失敗してもキャッシュなしで動作を続ける）"""
+        path = self._path(namespace, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(dumps({"timestamp": time.time(), "value": value}))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Failed to write cache file {path}: {str(e)}")
@@ -0,0 +1,46 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class TokenBucket:
+    """トークンバケット（capacity 回/period 秒のペースに平滑化。空なら補充まで待つ）"""
+
+    def __init__(self, capacity: int, period: float) -> None:
+        self.capacity = float(capacity)
+        self.refill_per_sec = capacity / period
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """トークンを 1 つ取得（無ければ補充されるまでスリープ）"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.refill_per_sec)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_per_sec
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """分/時間あたりのリクエスト数と同時実行数を制限する
+
+    外部 API の呼び出しを `with limiter.limit():` で囲んで使う。
+    """
+
+    def __init__(self, requests_per_minute: int, requests_per_hour: int, concurrent_requests: int) -> None:
+        self._buckets = (TokenBucket(requests_per_minute, 60), TokenBucket(requests_per_hour, 3600))
+        self._semaphore = threading.BoundedSemaphore(concurrent_requests)
+
+    @contextmanager
+    def limit(self) -> Iterator[None]:
+        for bucket in self._buckets:
+            bucket.acquire()
+        with self._semaphore:
+            yield
@@ -1,26 +1,67 @@
+import importlib.util
 import logging
-from typing import Dict, List, Optional, Any
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Any, Tuple
 from datetime import datetime, date, timedelta
+import numpy as np
 import pandas as pd
 
-from .base_provider import BaseDataProvider
+from utils.cache import TTLCache
+from .base_provider import BaseDataProvider, STOCK_DATA_COLUMNS
+from .cache import FileCache
+from .rate_limit import RateLimiter
 
 # 外部依存をインポート（プロバイダー内でのみ使用）
-try:
-    import yfinance as yf
-    YFINANCE_AVAILABLE = True
-except ImportError:
-    YFINANCE_AVAILABLE = False
+# yfinance は import が重いため、存在確認だけ行い最初の取得時に _require_yfinance で読み込む
+# （起動や /health など株価を取得しない経路では読み込まない）
+YFINANCE_AVAILABLE = importlib.util.find_spec("yfinance") is not None
+if not YFINANCE_AVAILABLE:
     logging.warning("yfinance not available. Yahoo Finance provider will not work.")
+if TYPE_CHECKING:
+    import yfinance as yf
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     REQUESTS_AVAILABLE = True
 except ImportError:
     REQUESTS_AVAILABLE = False
     logging.warning("requests not available. Some Yahoo Finance features may not work.")
 
 
+def _require_yfinance():
+    """yfinance モジュールを返す（初回のみ import される）"""
+    try:
+        import yfinance
+    except ImportError as e:
+        raise ImportError("yfinance is required for YahooFinanceProvider") from e
+    return yfinance
+
+
+# シンボル → yfinance の Ticker（同じシンボルの連続した呼び出しで Ticker を作り直さない）
+_ticker_cache = TTLCache(maxsize=256, ttl=300)
+# シンボル → Ticker.info（会社名/セクター等はほぼ変わらないため長めに保持し、HTTP リクエストを省く）
+_info_cache = TTLCache(maxsize=1024, ttl=3600)
+# シンボル → (通貨, 取引所)（上場先は変わらないため 1 時間保持し、Ticker 再生成時の fast_info 取得を省く）
+_listing_cache = TTLCache(maxsize=1024, ttl=3600)
+# シンボル → 妥当性（上場/廃止は日単位でしか変わらないため 24 時間保持）
+_symbol_valid_cache = TTLCache(maxsize=4096, ttl=24 * 3600)
+
+# 株価履歴のディスクキャッシュの保持期間（1 日）
+# history は配当/分割調整済みの価格を返し、権利落ちのたびに過去の価格も書き換わるため、過去の期間でも長くは保持しない
+_HISTORY_TTL = 24 * 3600
+_RATE_LIMITS = {
+    "requests_per_minute": 60,
+    "requests_per_hour": 2000,
+    "concurrent_requests": 5
+}
+# Yahoo への全リクエストに適用するレート制限（429 で長時間ブロックされる前に自分でペースを落とす）
+_rate_limiter = RateLimiter(**_RATE_LIMITS)
+
+_history_cache = FileCache(os.path.join(os.path.dirname(__file__), '..', '.cache', 'yahoo'), ttl=_HISTORY_TTL)
+
+
 class YahooFinanceProvider(BaseDataProvider):
     """Yahoo Financeからのデータ取得プロバイダー
     
@@ -38,12 +79,38 @@ class YahooFinanceProvider(BaseDataProvider):
             "NYSE", "NASDAQ", "TOKYO", "LSE", "TSE", "ASX", "TSX"
         ]
         
-        # レート制限情報
-        self._rate_limits = {
-            "requests_per_minute": 60,
-            "requests_per_hour": 2000,
-            "concurrent_requests": 5
-        }
+        # レート制限情報（_rate_limiter で実際に適用される）
+        self._rate_limits = dict(_RATE_LIMITS)
+        self.max_concurrent_requests = self._rate_limits["concurrent_requests"]
+        
+        # 全リクエストで共有する HTTP セッション（接続プール/keep-alive で TLS ハンドシェイクを使い回す）
+        self._session = self._create_session() if REQUESTS_AVAILABLE else None
+    
+    def _create_session(self) -> "requests.Session":
+        """コネクションプールとリトライを設定したセッションを作成"""
+        session = requests.Session()
+        session.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        adapter = HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def _ticker(self, symbol: str) -> "yf.Ticker":
+        """共有セッションを使う yfinance の Ticker を取得（5 分間キャッシュ）"""
+        return _ticker_cache.get_or_compute(symbol, lambda: _require_yfinance().Ticker(symbol, session=self._session))
+    
+    def _info(self, symbol: str) -> Dict[str, Any]:
+        """Ticker.info を取得（1 時間キャッシュ。get_stock_data/get_company_info で共有）"""
+        return _info_cache.get_or_compute(symbol, lambda: self._fetch_info(symbol))
+    
+    def _fetch_info(self, symbol: str) -> Dict[str, Any]:
+        """Ticker.info をレート制限の範囲内で取得"""
+        with _rate_limiter.limit():
+            return self._ticker(symbol).info
     
     def get_stock_data(
         self, 
@@ -58,7 +125,9 @@ class YahooFinanceProvider(BaseDataProvider):
             symbol: 株式シンボル（例: "AAPL", "6758.T"）
             start_date: 開始日（Noneの場合は1年前）
             end_date: 終了日（Noneの場合は現在日）
-            **kwargs: 追加パラメータ（interval, prepost等）
+            **kwargs: 追加パラメータ（interval, prepost, include_company_info, metadata等）
+                metadata=False の場合は通貨/取引所/会社情報を取得せず、metadata は
+                symbol/期間/provider/data_points のみとする（OHLCV だけが必要な場合）
             
         Returns:
             標準化されたデータ辞書
@@ -70,20 +139,30 @@ class YahooFinanceProvider(BaseDataProvider):
             if start_date is None:
                 start_date = end_date - timedelta(days=365)
             
-            # yfinanceを使用してデータ取得
-            ticker = yf.Ticker(symbol)
-            
             # データ取得パラメータ
             interval = kwargs.get("interval", "1d")
             prepost = kwargs.get("prepost", False)
+            # 会社名/セクター/業種が必要な場合のみ、追加のリクエストが多い Ticker.info を取得する
+            with_metadata = kwargs.get("metadata", True)
+            include_company_info = with_metadata and kwargs.get("include_company_info", False)
+            
+            # ディスクキャッシュを確認（成功した結果のみ保存されている）
+            cache_key = f"{symbol}|{start_date}|{end_date}|{interval}|{prepost}|{include_company_info}|{with_metadata}"
+            cached = _history_cache.get(symbol, cache_key)
+            if cached is not None:
+                return {**cached, "data": pd.DataFrame(cached["data"], columns=STOCK_DATA_COLUMNS)}
+            
+            # yfinanceを使用してデータ取得
+            ticker = self._ticker(symbol)
             
             # データ取得
-            df = ticker.history(
-                start=start_date,
-                end=end_date,
-                interval=interval,
-                prepost=prepost
-            )
+            with _rate_limiter.limit():
+                df = ticker.history(
+                    start=start_date,
+                    end=end_date,
+                    interval=interval,
+                    prepost=prepost
+                )
             
             if df.empty:
                 return {
@@ -99,38 +178,35 @@ class YahooFinanceProvider(BaseDataProvider):
                 }
             
             # データを標準形式に変換
-            data_list = []
-            for index, row in df.iterrows():
-                data_list.append({
-                    "Date": index.strftime("%Y/%m/%d"),
-                    "Open": float(row["Open"]),
-                    "High": float(row["High"]),
-                    "Low": float(row["Low"]),
-                    "Close": float(row["Close"]),
-                    "Volume": int(row["Volume"])
-                })
+            data_frame = self._to_frame(df)
             
-            # メタデータの取得
-            info = ticker.info
             metadata = {
                 "symbol": symbol,
                 "start_date": start_date.isoformat(),
                 "end_date": end_date.isoformat(),
                 "provider": self._provider_name,
-                "data_points": len(data_list),
-                "company_name": info.get("longName", "Unknown"),
-                "sector": info.get("sector", "Unknown"),
-                "industry": info.get("industry", "Unknown"),
-                "currency": info.get("currency", "Unknown"),
-                "exchange": info.get("exchange", "Unknown")
+                "data_points": len(data_frame)
             }
+            if with_metadata:
+                # メタデータの取得（通貨/取引所は history 取得時のメタデータから読む fast_info で足りる）
+                info = self._info(symbol) if include_company_info else {}
+                currency, exchange = self._listing(symbol, ticker)
+                metadata.update({
+                    "company_name": info.get("longName", "Unknown"),
+                    "sector": info.get("sector", "Unknown"),
+                    "industry": info.get("industry", "Unknown"),
+                    "currency": currency,
+                    "exchange": exchange
+                })
             
-            return {
+            result = {
                 "success": True,
-                "data": data_list,
+                "data": data_frame,
                 "error": None,
                 "metadata": metadata
             }
+            _history_cache.set(symbol, cache_key, {**result, "data": data_frame.to_dict("list")})
+            return result
             
         except Exception as e:
             logging.error(f"Error fetching data for {symbol}: {str(e)}")
@@ -146,6 +222,140 @@ class YahooFinanceProvider(BaseDataProvider):
                 }
             }
     
+    def _listing(self, symbol: str, ticker: "yf.Ticker") -> Tuple[str, str]:
+        """シンボルの (通貨, 取引所) を取得（1 時間キャッシュ。取得できなかった結果はキャッシュしない）"""
+        cached = _listing_cache.get(symbol)
+        if cached is not None:
+            return cached
+        listing = self._fast_info_fields(ticker)
+        if listing[0] != "Unknown":
+            _listing_cache.set(symbol, listing)
+        return listing
+    
+    @staticmethod
+    def _fast_info_fields(ticker: "yf.Ticker") -> Tuple[str, str]:
+        """fast_info から (通貨, 取引所) を取得（取得できない場合は "Unknown"）"""
+        try:
+            fast_info = ticker.fast_info
+            return fast_info.currency or "Unknown", fast_info.exchange or "Unknown"
+        except Exception:
+            return "Unknown", "Unknown"
+    
+    @staticmethod
+    def _format_dates(index: pd.DatetimeIndex) -> np.ndarray:
+        """DatetimeIndex を "YYYY/MM/DD" 文字列の配列に変換
+
+        strftime（要素毎の書式解釈）ではなく、日単位の datetime64 を numpy で一括して文字列化する。
+        タイムゾーン付きの場合は取引所の現地日付を使う（UTC に変換すると日付がずれるため）。
+        """
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        days = index.values.astype("datetime64[D]")
+        return np.char.replace(np.datetime_as_string(days, unit="D"), "-", "/")
+    
+    @staticmethod
+    def _to_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """yfinance の OHLCV DataFrame を標準形式（STOCK_DATA_COLUMNS の列）に変換（行毎の dict は作らない）
+
+        価格が欠けた行は除外し、出来高の欠損は 0 とする（列単位のベクトル演算のみ）。
+        """
+        df = df.dropna(subset=["Open", "High", "Low", "Close"])
+        return pd.DataFrame({
+            "Date": YahooFinanceProvider._format_dates(df.index),
+            "Open": df["Open"].to_numpy(dtype="float64"),
+            "High": df["High"].to_numpy(dtype="float64"),
+            "Low": df["Low"].to_numpy(dtype="float64"),
+            "Close": df["Close"].to_numpy(dtype="float64"),
+            "Volume": df["Volume"].fillna(0).to_numpy(dtype="int64"),
+        })
+    
+    def get_stock_data_many(
+        self,
+        symbols: List[str],
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        **kwargs: Any
+    ) -> Dict[str, Dict[str, Any]]:
+        """複数シンボルの株価データを yf.download の 1 回の呼び出しでまとめて取得
+        
+        シンボル毎の検証や会社情報の取得は行わない（metadata は最小限）。
+        データが取れなかったシンボルは success=False となるため、呼び出し側で個別取得にフォールバックできる。
+        
+        Args:
+            symbols: 株式シンボルのリスト
+            start_date: 開始日（Noneの場合は1年前）
+            end_date: 終了日（Noneの場合は現在日）
+            **kwargs: 追加パラメータ（interval, prepost等）
+            
+        Returns:
+            シンボル → get_stock_data と同形式の結果辞書
+        """
+        if end_date is None:
+            end_date = date.today()
+        if start_date is None:
+            start_date = end_date - timedelta(days=365)
+        
+        def _metadata(symbol: str, data_points: int = 0) -> Dict[str, Any]:
+            return {
+                "symbol": symbol,
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "provider": self._provider_name,
+                "data_points": data_points,
+            }
+        
+        try:
+            # Ticker.history と同じく配当/分割調整済みの価格を取得
+            with _rate_limiter.limit():
+                data = _require_yfinance().download(
+                    tickers=symbols,
+                    start=start_date,
+                    end=end_date,
+                    interval=kwargs.get("interval", "1d"),
+                    prepost=kwargs.get("prepost", False),
+                    group_by="ticker",
+                    auto_adjust=True,
+                    threads=True,
+                    progress=False,
+                    session=self._session,
+                )
+        except Exception as e:
+            logging.error(f"Error fetching data for {symbols}: {str(e)}")
+            error = f"Failed to fetch data: {str(e)}"
+            return {s: {"success": False, "data": None, "error": error, "metadata": _metadata(s)} for s in symbols}
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        for symbol in symbols:
+            df = None
+            if isinstance(data.columns, pd.MultiIndex):
+                # yfinance はティッカーを大文字化して列に持つ
+                for key in (symbol, symbol.upper()):
+                    if key in data.columns.get_level_values(0):
+                        df = data[key]
+                        break
+            elif len(symbols) == 1:
+                df = data
+            
+            # 一括取得では他銘柄の営業日の行が NaN になるが、_to_frame で除外される
+            data_frame = self._to_frame(df) if df is not None else None
+            
+            if data_frame is None or data_frame.empty:
+                results[symbol] = {
+                    "success": False,
+                    "data": None,
+                    "error": f"No data found for symbol: {symbol}",
+                    "metadata": _metadata(symbol),
+                }
+                continue
+            
+            results[symbol] = {
+                "success": True,
+                "data": data_frame,
+                "error": None,
+                "metadata": _metadata(symbol, len(data_frame)),
+            }
+        return results
+    
     def validate_symbol(self, symbol: str) -> bool:
         """シンボルの妥当性を検証
         
@@ -163,16 +373,33 @@ class YahooFinanceProvider(BaseDataProvider):
             if len(symbol) < 1 or len(symbol) > 20:
                 return False
             
-            # yfinanceで実際に検証
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            
-            # 有効なシンボルかチェック
-            return info.get("regularMarketPrice") is not None
+            return _symbol_valid_cache.get_or_compute(symbol, lambda: self._check_symbol(symbol))
             
         except Exception:
             return False
     
+    def _check_symbol(self, symbol: str) -> bool:
+        """Yahoo に問い合わせてシンボルを検証（通信エラー時は例外を送出し、結果をキャッシュさせない）
+        
+        Ticker.info（複数リクエスト・数十 KB）ではなく、chart API の 1 日分（1 リクエスト・約 1 KB）の
+        メタデータに現在値があるかで判定する。
+        """
+        if not REQUESTS_AVAILABLE:
+            return self._info(symbol).get("regularMarketPrice") is not None
+        
+        chart_url = f"https://query1.finance.yahoo.com/v8/finance/chart/{requests.utils.quote(symbol, safe='')}"
+        params = {"range": "1d", "interval": "1d"}
+        
+        with _rate_limiter.limit():
+            response = self._session.get(chart_url, params=params, timeout=5)
+        # 存在しないシンボルは 404
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        
+        results = (response.json().get("chart") or {}).get("result") or []
+        return bool(results) and results[0].get("meta", {}).get("regularMarketPrice") is not None
+    
     def get_provider_info(self) -> Dict[str, Any]:
         """プロバイダー情報を取得
         
@@ -198,8 +425,8 @@ class YahooFinanceProvider(BaseDataProvider):
             ]
         }
     
-    def search_symbols(self, query: str) -> List[Dict[str, Any]]:
-        """シンボルを検索
+    def _search_symbols_impl(self, query: str) -> List[Dict[str, Any]]:
+        """シンボルを検索（キャッシュと例外処理は BaseDataProvider.search_symbols が行う）
         
         Args:
             query: 検索クエリ
@@ -207,37 +434,30 @@ class YahooFinanceProvider(BaseDataProvider):
         Returns:
             検索結果のリスト
         """
-        try:
-            if not REQUESTS_AVAILABLE:
-                return []
-            
-            # Yahoo Financeの検索APIを使用
-            search_url = f"https://query2.finance.yahoo.com/v1/finance/search?q={query}&quotesCount=10&newsCount=0"
-            
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            
-            response = requests.get(search_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            results = []
-            
-            for quote in data.get("quotes", []):
-                results.append({
-                    "symbol": quote.get("symbol", ""),
-                    "name": quote.get("longname", quote.get("shortname", "")),
-                    "exchange": quote.get("exchange", ""),
-                    "type": quote.get("quoteType", ""),
-                    "market": quote.get("market", "")
-                })
-            
-            return results
-            
-        except Exception as e:
-            logging.error(f"Error searching symbols for '{query}': {str(e)}")
+        if not REQUESTS_AVAILABLE:
             return []
+        
+        # Yahoo Financeの検索APIを使用（クエリは requests にエンコードさせる）
+        search_url = "https://query2.finance.yahoo.com/v1/finance/search"
+        params = {"q": query, "quotesCount": 10, "newsCount": 0}
+        
+        with _rate_limiter.limit():
+            response = self._session.get(search_url, params=params, timeout=10)
+        response.raise_for_status()
+        
+        data = response.json()
+        results = []
+        
+        for quote in data.get("quotes", []):
+            results.append({
+                "symbol": quote.get("symbol", ""),
+                "name": quote.get("longname", quote.get("shortname", "")),
+                "exchange": quote.get("exchange", ""),
+                "type": quote.get("quoteType", ""),
+                "market": quote.get("market", "")
+            })
+        
+        return results
     
     def get_company_info(self, symbol: str) -> Dict[str, Any]:
         """会社情報を取得（追加メソッド）
@@ -249,8 +469,7 @@ class YahooFinanceProvider(BaseDataProvider):
             会社情報辞書
         """
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
+            info = self._info(symbol)
             
             return {
                 "success": True,
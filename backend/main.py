@@ -1,28 +1,112 @@
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from api.chart_api import router as chart_router
 from api.analysis_api import router as analysis_router
-from api.portfolio_api import router as portfolio_router
-from api.download_api import router as download_router
+from api.portfolio_api import router as portfolio_router, svc as portfolio_service, shutdown_process_pool, start_process_pool
+from api.download_api import router as download_router, svc as download_service
 from api.currency_api import router as currency_router
+from utils.serialization import ORJSONResponse
+from contextlib import asynccontextmanager
+import anyio.to_thread
+import logging
+import os
 import uvicorn
 
+# uvloop / httptools は uvicorn[standard] に含まれる（Windows では uvloop 非対応）
+try:
+    import uvloop  # noqa: F401
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+try:
+    import httptools  # noqa: F401
+    HTTPTOOLS_AVAILABLE = True
+except ImportError:
+    HTTPTOOLS_AVAILABLE = False
+
+# brotli-asgi はオプション依存（未導入なら gzip のみ）
+try:
+    from brotli_asgi import BrotliMiddleware
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# run_in_threadpool と同期ハンドラが共有するワーカースレッド数（anyio の既定は 40）
+# Yahoo への問い合わせなど I/O 待ちのスレッドで埋まって他のリクエストが待たされないよう引き上げる
+THREADPOOL_SIZE = int(os.environ.get("NEWANALYZER_THREADS", "64"))
+
+
+def _warm_up() -> None:
+    """起動時にファイル一覧と全銘柄の μ/Σ を読み込み、CSV パース結果等のキャッシュを温める
+
+    ポートフォリオ計算のキャッシュミスはプロセスプールのワーカーで計算されるため、
+    ワーカーも起動して各プロセスのキャッシュを温める（NEWANALYZER_PORTFOLIO_PROCESSES=0 の場合はメインプロセスのみ）。
+    """
+    files = download_service.list_downloaded_files()
+    logger.info(f"Warm-up: {len(files)} files in data directory")
+    if portfolio_service.list_csv_files():
+        portfolio_service.estimate_mu_sigma(None)
+    start_process_pool()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # リミッターはイベントループ毎に作られるため、ループ上（起動時）で設定する
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # NEWANALYZER_WARMUP=0 でウォームアップを無効化
+    if os.environ.get("NEWANALYZER_WARMUP", "1") != "0":
+        try:
+            await run_in_threadpool(_warm_up)
+        except Exception as e:
+            # データが無い/壊れている場合でも起動は継続する
+            logger.warning(f"Warm-up skipped: {e}")
+    yield
+    shutdown_process_pool()
+
+
 # FastAPIアプリケーションを作成
 app = FastAPI(
     title="NewAnalyzer API",
     description="ローソク足チャート分析API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS設定（フロントエンドからのアクセスを許可）
+# 許可するメソッド/ヘッダーを明示するとプリフライト応答のヘッダーは起動時に一度だけ組み立てられ、
+# max_age の間はブラウザがプリフライトの結果を再利用する
+# オリジンは NEWANALYZER_CORS_ORIGINS（カンマ区切り）で制限できる（本番環境では適切に制限してください）
+CORS_ORIGINS = [o.strip() for o in os.environ.get("NEWANALYZER_CORS_ORIGINS", "*").split(",") if o.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # 本番環境では適切に制限してください
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    # If-None-Match は ETag による条件付き GET 用
+    allow_headers=["Content-Type", "Accept", "Authorization", "If-None-Match"],
+    max_age=86400,
 )
 
+# 1KB 以上のレスポンスを圧縮（Plotly 図の JSON/HTML は数値と同じキー名の繰り返しで圧縮が効く）
+# brotli-asgi があれば br を優先し、br 非対応のクライアントには gzip で返す
+if BROTLI_AVAILABLE:
+    app.add_middleware(
+        BrotliMiddleware,
+        minimum_size=1024,
+        quality=4,
+        gzip_fallback=True,
+        # SSE はイベント毎に即時送信する必要があるため圧縮しない
+        excluded_handlers=[r"^/portfolio/feasible/stream$"],
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=4)
+
 # APIルーターを登録
 app.include_router(chart_router)
 app.include_router(analysis_router)
@@ -54,10 +138,18 @@ async def health_check():
 
 if __name__ == "__main__":
     # 開発サーバーを起動
+    # NEWANALYZER_WORKERS を 2 以上にするとリロード/アクセスログ無しのマルチワーカー構成で起動
+    # （"auto" で CPU コア数）
+    workers_env = os.environ.get("NEWANALYZER_WORKERS", "1")
+    workers = (os.cpu_count() or 1) if workers_env == "auto" else int(workers_env)
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=workers == 1,
+        workers=workers,
+        loop="uvloop" if UVLOOP_AVAILABLE else "asyncio",
+        http="httptools" if HTTPTOOLS_AVAILABLE else "h11",
+        access_log=workers == 1,
         log_level="info"
     )
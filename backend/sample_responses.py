@@ -7,8 +7,236 @@
 
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _to_json(obj: Any) -> bytes:
+    """インデント 2 の UTF-8 JSON（orjson が無ければ標準の json で同じ形式に出力）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+# 応答の組み立てと JSON 化は引数に対して決まるためキャッシュする
+# （戻り値の dict はキャッシュと共有されるので変更しないこと）
+
+# チャート応答の固定値（通貨 → 系列。USD 以外は円建ての値を使う）
+_CHART_SERIES = {
+    "USD": {
+        "open": (100.0, 101.0, 102.0),
+        "high": (102.0, 103.0, 104.0),
+        "low": (99.0, 100.0, 101.0),
+        "close": (101.0, 102.0, 103.0),
+        "sma_20": (100.5, 100.7, 100.9),
+        "sma_50": (100.2, 100.3, 100.4),
+    },
+    "JPY": {
+        "open": (15000.0, 15150.0, 15300.0),
+        "high": (15300.0, 15450.0, 15600.0),
+        "low": (14850.0, 15000.0, 15150.0),
+        "close": (15150.0, 15300.0, 15450.0),
+        "sma_20": (15075.0, 15105.0, 15135.0),
+        "sma_50": (15030.0, 15045.0, 15060.0),
+    },
+}
+_CHART_DATES = ("2020-01-01", "2020-01-02", "2020-01-03")
+_CHART_VOLUME = (1000000, 1100000, 1200000)
+
+
+@lru_cache(maxsize=None)
+def _build_chart_response(ticker: str, currency: str, with_indicators: bool) -> Tuple[Dict[str, Any], bytes]:
+    """チャート応答の (dict, JSON 文字列)"""
+    series = _CHART_SERIES["USD" if currency == "USD" else "JPY"]
+    response = {
+        "ticker": ticker,
+        "currency": currency,
+        "with_indicators": with_indicators,
+        "data": {
+            "dates": _CHART_DATES,
+            "open": series["open"],
+            "high": series["high"],
+            "low": series["low"],
+            "close": series["close"],
+            "volume": _CHART_VOLUME
+        },
+        "indicators": {
+            "sma_20": series["sma_20"],
+            "sma_50": series["sma_50"]
+        } if with_indicators else None,
+        "metadata": {
+            "currency_converted": currency != "USD",
+            "exchange_rate_used": 150.0 if currency == "JPY" else 1.0,
+            "data_source": "data_analysis" if ticker in ["SPY", "MSFT"] else "data"
+        }
+    }
+    return response, _to_json(response)
+
+
+@lru_cache(maxsize=None)
+def _build_correlation_response(tickers: Tuple[str, ...]) -> Tuple[Dict[str, Any], bytes]:
+    """相関分析応答の (dict, JSON 文字列)"""
+    response = {
+        "currency": "JPY",  # 固定
+        "tickers": list(tickers),
+        "correlation_matrix": {
+            "SPY": {"SPY": 1.0, "MSFT": 0.85, "7203": 0.45, "9984": 0.42},
+            "MSFT": {"SPY": 0.85, "MSFT": 1.0, "7203": 0.48, "9984": 0.44},
+            "7203": {"SPY": 0.45, "MSFT": 0.48, "7203": 1.0, "9984": 0.92},
+            "9984": {"SPY": 0.42, "MSFT": 0.44, "7203": 0.92, "9984": 1.0}
+        },
+        "metadata": {
+            "currency_converted": True,
+            "exchange_rate_used": 150.0,
+            "data_sources": {
+                "SPY": "data_analysis/SPY_JPY.csv",
+                "MSFT": "data_analysis/MSFT_JPY.csv", 
+                "7203": "data/7203.csv",
+                "9984": "data/9984.csv"
+            }
+        }
+    }
+    return response, _to_json(response)
+
+
+@lru_cache(maxsize=None)
+def _build_consolidated_correlation_response(correlation_threshold: float) -> Tuple[Dict[str, Any], bytes]:
+    """相関統合分析応答の (dict, JSON 文字列)"""
+    response = {
+        "currency": "JPY",  # 固定
+        "correlation_threshold": correlation_threshold,
+        "consolidation_method": "mean",
+        "original_correlation": {
+            "SPY": {"SPY": 1.0, "MSFT": 0.85, "7203": 0.45, "9984": 0.42},
+            "MSFT": {"SPY": 0.85, "MSFT": 1.0, "7203": 0.48, "9984": 0.44},
+            "7203": {"SPY": 0.45, "MSFT": 0.48, "7203": 1.0, "9984": 0.92},
+            "9984": {"SPY": 0.42, "MSFT": 0.44, "7203": 0.92, "9984": 1.0}
+        },
+        "consolidated_correlation": {
+            "SPY": {"SPY": 1.0, "MSFT": 0.85, "7203+9984": 0.44},
+            "MSFT": {"SPY": 0.85, "MSFT": 1.0, "7203+9984": 0.46},
+            "7203+9984": {"SPY": 0.44, "MSFT": 0.46, "7203+9984": 1.0}
+        },
+        "consolidation_groups": [
+            ["7203", "9984"]  # 相関0.92で統合
+        ],
+        "metadata": {
+            "currency_converted": True,
+            "exchange_rate_used": 150.0,
+            "original_assets": 4,
+            "consolidated_assets": 3
+        }
+    }
+    return response, _to_json(response)
+
+
+@lru_cache(maxsize=None)
+def _build_statistics_response(tickers: Tuple[str, ...]) -> Tuple[Dict[str, Any], bytes]:
+    """統計分析応答の (dict, JSON 文字列)"""
+    response = {
+        "currency": "JPY",  # 固定
+        "tickers": list(tickers),
+        "statistics": {
+            "SPY": {
+                "mean_return_daily": 0.0008,
+                "volatility_daily": 0.015,
+                "sharpe_daily": 0.053,
+                "mean_return_annual": 0.20,
+                "volatility_annual": 0.24,
+                "sharpe_annual": 0.83,
+                "observations": 1255
+            },
+            "MSFT": {
+                "mean_return_daily": 0.0012,
+                "volatility_daily": 0.018,
+                "sharpe_daily": 0.067,
+                "mean_return_annual": 0.30,
+                "volatility_annual": 0.29,
+                "sharpe_annual": 1.03,
+                "observations": 1255
+            },
+            "7203": {
+                "mean_return_daily": 0.0006,
+                "volatility_daily": 0.020,
+                "sharpe_daily": 0.030,
+                "mean_return_annual": 0.15,
+                "volatility_annual": 0.32,
+                "sharpe_annual": 0.47,
+                "observations": 1255
+            },
+            "9984": {
+                "mean_return_daily": 0.0007,
+                "volatility_daily": 0.022,
+                "sharpe_daily": 0.032,
+                "mean_return_annual": 0.18,
+                "volatility_annual": 0.35,
+                "sharpe_annual": 0.51,
+                "observations": 1255
+            }
+        },
+        "metadata": {
+            "currency_converted": True,
+            "exchange_rate_used": 150.0,
+            "data_sources": {
+                "SPY": "data_analysis/SPY_JPY.csv",
+                "MSFT": "data_analysis/MSFT_JPY.csv",
+                "7203": "data/7203.csv",
+                "9984": "data/9984.csv"
+            }
+        }
+    }
+    return response, _to_json(response)
+
+
+@lru_cache(maxsize=None)
+def _build_portfolio_response(tickers: Tuple[str, ...], consolidate_correlated: bool) -> Tuple[Dict[str, Any], bytes]:
+    """ポートフォリオ最適化応答の (dict, JSON 文字列)"""
+    response = {
+        "currency": "JPY",  # 固定
+        "tickers": list(tickers),
+        "consolidate_correlated": consolidate_correlated,
+        "optimization_method": "sharpe",
+        "allow_short": True,
+        "efficient_frontier": {
+            "risks": [0.20, 0.25, 0.30, 0.35, 0.40],
+            "returns": [0.15, 0.20, 0.25, 0.30, 0.35]
+        },
+        "optimal_portfolio": {
+            "weights": {
+                "SPY": 0.35,
+                "MSFT": 0.45,
+                "7203+9984": 0.20  # 統合後
+            } if consolidate_correlated else {
+                "SPY": 0.30,
+                "MSFT": 0.40,
+                "7203": 0.15,
+                "9984": 0.15
+            },
+            "expected_return": 0.25,
+            "expected_risk": 0.28,
+            "sharpe_ratio": 0.89
+        },
+        "metadata": {
+            "currency_converted": True,
+            "exchange_rate_used": 150.0,
+            "data_sources": {
+                "SPY": "data_analysis/SPY_JPY.csv",
+                "MSFT": "data_analysis/MSFT_JPY.csv",
+                "7203": "data/7203.csv",
+                "9984": "data/9984.csv"
+            },
+            "consolidation_groups": [["7203", "9984"]] if consolidate_correlated else []
+        }
+    }
+    return response, _to_json(response)
+
 
 class SampleResponseGenerator:
     """サンプル応答生成クラス"""
@@ -17,6 +245,38 @@ class SampleResponseGenerator:
         self.output_dir = "sample_responses"
         os.makedirs(self.output_dir, exist_ok=True)
         self.execution_log = []
+        # True の間は応答/ログをファイルに書き込まず、flush_writes でまとめて書き出す
+        self._defer_writes = False
+        # 書き出し待ちのファイル → 内容（同じファイルは最後の内容だけを書く）
+        self._pending: Dict[str, bytes] = {}
+        # 書き込み済みのファイル → 内容（同じ内容の再書き込みを省く）
+        self._written: Dict[str, bytes] = {}
+    
+    def _write(self, filename: str, text: bytes) -> None:
+        """応答 JSON をファイルに保存（前回と同じ内容なら書き込まない）"""
+        filepath = os.path.join(self.output_dir, filename)
+        if self._written.get(filepath) == text:
+            self._pending.pop(filepath, None)
+            return
+        if self._defer_writes:
+            self._pending[filepath] = text
+            return
+        self._write_file(filepath, text)
+    
+    def _write_file(self, filepath: str, text: bytes) -> None:
+        with open(filepath, 'wb') as f:
+            f.write(text)
+        self._written[filepath] = text
+    
+    def flush_writes(self):
+        """書き出し待ちの応答と実行ログをスレッドで並行してファイルに保存"""
+        pending = list(self._pending.items())
+        self._pending = {}
+        with ThreadPoolExecutor(max_workers=min(8, len(pending) + 1)) as executor:
+            futures = [executor.submit(self._write_file, filepath, text) for filepath, text in pending]
+            futures.append(executor.submit(self.flush_log))
+            for future in futures:
+                future.result()
     
     def log_execution(self, endpoint: str, params: Dict[str, Any], response_type: str):
         """実行内容をログに記録"""
@@ -28,40 +288,20 @@ class SampleResponseGenerator:
         }
         self.execution_log.append(log_entry)
         
-        # ログファイルに保存
+        if not self._defer_writes:
+            self.flush_log()
+    
+    def flush_log(self):
+        """実行ログをファイルに保存"""
         log_file = os.path.join(self.output_dir, "execution_log.json")
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(self.execution_log, f, indent=2, ensure_ascii=False)
+        with open(log_file, 'wb') as f:
+            f.write(_to_json(self.execution_log))
     
     def generate_chart_response(self, ticker: str, currency: str = "USD", with_indicators: bool = True):
         """チャート応答サンプル生成"""
-        response = {
-            "ticker": ticker,
-            "currency": currency,
-            "with_indicators": with_indicators,
-            "data": {
-                "dates": ["2020-01-01", "2020-01-02", "2020-01-03"],
-                "open": [100.0, 101.0, 102.0] if currency == "USD" else [15000.0, 15150.0, 15300.0],
-                "high": [102.0, 103.0, 104.0] if currency == "USD" else [15300.0, 15450.0, 15600.0],
-                "low": [99.0, 100.0, 101.0] if currency == "USD" else [14850.0, 15000.0, 15150.0],
-                "close": [101.0, 102.0, 103.0] if currency == "USD" else [15150.0, 15300.0, 15450.0],
-                "volume": [1000000, 1100000, 1200000]
-            },
-            "indicators": {
-                "sma_20": [100.5, 100.7, 100.9] if currency == "USD" else [15075.0, 15105.0, 15135.0],
-                "sma_50": [100.2, 100.3, 100.4] if currency == "USD" else [15030.0, 15045.0, 15060.0]
-            } if with_indicators else None,
-            "metadata": {
-                "currency_converted": currency != "USD",
-                "exchange_rate_used": 150.0 if currency == "JPY" else 1.0,
-                "data_source": "data_analysis" if ticker in ["SPY", "MSFT"] else "data"
-            }
-        }
+        response, text = _build_chart_response(ticker, currency, with_indicators)
         
-        filename = f"chart_{ticker}_{currency}.json"
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(response, f, indent=2, ensure_ascii=False)
+        self._write(f"chart_{ticker}_{currency}.json", text)
         
         self.log_execution(f"/chart/html/{ticker}.csv", 
                           {"currency": currency, "with_indicators": with_indicators}, 
@@ -75,31 +315,9 @@ class SampleResponseGenerator:
             tickers = ["SPY", "MSFT", "7203", "9984"]
         
         # 円換算後の価格で相関計算
-        response = {
-            "currency": "JPY",  # 固定
-            "tickers": tickers,
-            "correlation_matrix": {
-                "SPY": {"SPY": 1.0, "MSFT": 0.85, "7203": 0.45, "9984": 0.42},
-                "MSFT": {"SPY": 0.85, "MSFT": 1.0, "7203": 0.48, "9984": 0.44},
-                "7203": {"SPY": 0.45, "MSFT": 0.48, "7203": 1.0, "9984": 0.92},
-                "9984": {"SPY": 0.42, "MSFT": 0.44, "7203": 0.92, "9984": 1.0}
-            },
-            "metadata": {
-                "currency_converted": True,
-                "exchange_rate_used": 150.0,
-                "data_sources": {
-                    "SPY": "data_analysis/SPY_JPY.csv",
-                    "MSFT": "data_analysis/MSFT_JPY.csv", 
-                    "7203": "data/7203.csv",
-                    "9984": "data/9984.csv"
-                }
-            }
-        }
+        response, text = _build_correlation_response(tuple(tickers))
         
-        filename = "correlation_analysis_jpy.json"
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(response, f, indent=2, ensure_ascii=False)
+        self._write("correlation_analysis_jpy.json", text)
         
         self.log_execution("/analysis/correlation/html", 
                           {"currency": "JPY", "tickers": tickers}, 
@@ -109,36 +327,9 @@ class SampleResponseGenerator:
     
     def generate_consolidated_correlation_response(self, correlation_threshold: float = 0.9):
         """相関統合分析応答サンプル生成（円換算固定）"""
-        response = {
-            "currency": "JPY",  # 固定
-            "correlation_threshold": correlation_threshold,
-            "consolidation_method": "mean",
-            "original_correlation": {
-                "SPY": {"SPY": 1.0, "MSFT": 0.85, "7203": 0.45, "9984": 0.42},
-                "MSFT": {"SPY": 0.85, "MSFT": 1.0, "7203": 0.48, "9984": 0.44},
-                "7203": {"SPY": 0.45, "MSFT": 0.48, "7203": 1.0, "9984": 0.92},
-                "9984": {"SPY": 0.42, "MSFT": 0.44, "7203": 0.92, "9984": 1.0}
-            },
-            "consolidated_correlation": {
-                "SPY": {"SPY": 1.0, "MSFT": 0.85, "7203+9984": 0.44},
-                "MSFT": {"SPY": 0.85, "MSFT": 1.0, "7203+9984": 0.46},
-                "7203+9984": {"SPY": 0.44, "MSFT": 0.46, "7203+9984": 1.0}
-            },
-            "consolidation_groups": [
-                ["7203", "9984"]  # 相関0.92で統合
-            ],
-            "metadata": {
-                "currency_converted": True,
-                "exchange_rate_used": 150.0,
-                "original_assets": 4,
-                "consolidated_assets": 3
-            }
-        }
+        response, text = _build_consolidated_correlation_response(correlation_threshold)
         
-        filename = "consolidated_correlation_jpy.json"
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(response, f, indent=2, ensure_ascii=False)
+        self._write("consolidated_correlation_jpy.json", text)
         
         self.log_execution("/analysis/consolidated-correlation/html", 
                           {"currency": "JPY", "correlation_threshold": correlation_threshold}, 
@@ -151,63 +342,9 @@ class SampleResponseGenerator:
         if tickers is None:
             tickers = ["SPY", "MSFT", "7203", "9984"]
         
-        response = {
-            "currency": "JPY",  # 固定
-            "tickers": tickers,
-            "statistics": {
-                "SPY": {
-                    "mean_return_daily": 0.0008,
-                    "volatility_daily": 0.015,
-                    "sharpe_daily": 0.053,
-                    "mean_return_annual": 0.20,
-                    "volatility_annual": 0.24,
-                    "sharpe_annual": 0.83,
-                    "observations": 1255
-                },
-                "MSFT": {
-                    "mean_return_daily": 0.0012,
-                    "volatility_daily": 0.018,
-                    "sharpe_daily": 0.067,
-                    "mean_return_annual": 0.30,
-                    "volatility_annual": 0.29,
-                    "sharpe_annual": 1.03,
-                    "observations": 1255
-                },
-                "7203": {
-                    "mean_return_daily": 0.0006,
-                    "volatility_daily": 0.020,
-                    "sharpe_daily": 0.030,
-                    "mean_return_annual": 0.15,
-                    "volatility_annual": 0.32,
-                    "sharpe_annual": 0.47,
-                    "observations": 1255
-                },
-                "9984": {
-                    "mean_return_daily": 0.0007,
-                    "volatility_daily": 0.022,
-                    "sharpe_daily": 0.032,
-                    "mean_return_annual": 0.18,
-                    "volatility_annual": 0.35,
-                    "sharpe_annual": 0.51,
-                    "observations": 1255
-                }
-            },
-            "metadata": {
-                "currency_converted": True,
-                "exchange_rate_used": 150.0,
-                "data_sources": {
-                    "SPY": "data_analysis/SPY_JPY.csv",
-                    "MSFT": "data_analysis/MSFT_JPY.csv",
-                    "7203": "data/7203.csv",
-                    "9984": "data/9984.csv"
-                }
-            }
-        }
+        response, text = _build_statistics_response(tuple(tickers))
         
-        filename = "statistics_analysis_jpy.json"
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(response, f, indent=2, ensure_ascii=False)
+        self._write("statistics_analysis_jpy.json", text)
         
         self.log_execution("/analysis/summary/html", 
                           {"currency": "JPY", "tickers": tickers}, 
@@ -220,48 +357,9 @@ class SampleResponseGenerator:
         if tickers is None:
             tickers = ["SPY", "MSFT", "7203", "9984"]
         
-        response = {
-            "currency": "JPY",  # 固定
-            "tickers": tickers,
-            "consolidate_correlated": consolidate_correlated,
-            "optimization_method": "sharpe",
-            "allow_short": True,
-            "efficient_frontier": {
-                "risks": [0.20, 0.25, 0.30, 0.35, 0.40],
-                "returns": [0.15, 0.20, 0.25, 0.30, 0.35]
-            },
-            "optimal_portfolio": {
-                "weights": {
-                    "SPY": 0.35,
-                    "MSFT": 0.45,
-                    "7203+9984": 0.20  # 統合後
-                } if consolidate_correlated else {
-                    "SPY": 0.30,
-                    "MSFT": 0.40,
-                    "7203": 0.15,
-                    "9984": 0.15
-                },
-                "expected_return": 0.25,
-                "expected_risk": 0.28,
-                "sharpe_ratio": 0.89
-            },
-            "metadata": {
-                "currency_converted": True,
-                "exchange_rate_used": 150.0,
-                "data_sources": {
-                    "SPY": "data_analysis/SPY_JPY.csv",
-                    "MSFT": "data_analysis/MSFT_JPY.csv",
-                    "7203": "data/7203.csv",
-                    "9984": "data/9984.csv"
-                },
-                "consolidation_groups": [["7203", "9984"]] if consolidate_correlated else []
-            }
-        }
+        response, text = _build_portfolio_response(tuple(tickers), consolidate_correlated)
         
-        filename = "portfolio_optimization_jpy.json"
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(response, f, indent=2, ensure_ascii=False)
+        self._write("portfolio_optimization_jpy.json", text)
         
         self.log_execution("/portfolio/optimization/html", 
                           {"currency": "JPY", "consolidate_correlated": consolidate_correlated, "tickers": tickers}, 
@@ -273,6 +371,26 @@ class SampleResponseGenerator:
         """すべてのサンプル応答を生成"""
         print("=== サンプル応答生成開始 ===")
         
+        # 応答とログは全応答の生成後にまとめて書き出す（呼び出し毎にログ全体を書き直さない）
+        self._defer_writes = True
+        try:
+            self._generate_samples()
+        finally:
+            self._defer_writes = False
+            self.flush_writes()
+        
+        print(f"=== サンプル応答生成完了 ===")
+        print(f"出力ディレクトリ: {self.output_dir}")
+        print(f"実行ログ: {self.output_dir}/execution_log.json")
+        
+        # 生成されたファイル一覧を表示
+        files = os.listdir(self.output_dir)
+        print("\n生成されたファイル:")
+        for file in sorted(files):
+            print(f"  {file}")
+    
+    def _generate_samples(self):
+        """各エンドポイントのサンプル応答を生成"""
         # チャート応答（円・ドル選択可能）
         print("1. チャート応答生成中...")
         self.generate_chart_response("SPY", "USD", True)
@@ -295,16 +413,6 @@ class SampleResponseGenerator:
         print("5. ポートフォリオ最適化応答生成中...")
         self.generate_portfolio_response(consolidate_correlated=True)
         self.generate_portfolio_response(consolidate_correlated=False)
-        
-        print(f"=== サンプル応答生成完了 ===")
-        print(f"出力ディレクトリ: {self.output_dir}")
-        print(f"実行ログ: {self.output_dir}/execution_log.json")
-        
-        # 生成されたファイル一覧を表示
-        files = os.listdir(self.output_dir)
-        print("\n生成されたファイル:")
-        for file in sorted(files):
-            print(f"  {file}")
 
 def main():
     """メイン処理"""
@@ -1,4 +1,6 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
 from typing import Dict, List, Optional, Tuple
 
 import numpy as np
@@ -7,6 +9,93 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 from services.chart_service import ChartService
+from services.currency_service import CurrencyService
+from utils.cache import TTLCache, dir_signature
+
+# パース済み終値系列（キーにファイルの mtime/サイズを含む）と相関行列のキャッシュ
+_close_series_cache = TTLCache(maxsize=256)
+_correlation_cache = TTLCache(maxsize=64)
+
+# 複数 CSV を並行して読み込む際の最大スレッド数
+_LOAD_MAX_WORKERS = 8
+
+# numba はオプション依存（あれば相関グループ探索や列統計の逐次ループを JIT コンパイルする）
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _greedy_group_labels(adjacent: np.ndarray) -> np.ndarray:
+    """隣接行列（uint8, N×N）から貪欲法で作ったグループの番号を資産毎に返す
+
+    先頭の未割り当て資産から順にグループを作り、グループの全メンバーと隣接する資産を追加する
+    （AnalysisService._find_correlated_groups と同じ規則）。スカラー演算のみで numba でコンパイルできる。
+    """
+    n = adjacent.shape[0]
+    labels = np.full(n, -1, dtype=np.int64)
+    members = np.empty(n, dtype=np.int64)
+    group = 0
+    for i in range(n):
+        if labels[i] >= 0:
+            continue
+        labels[i] = group
+        members[0] = i
+        size = 1
+        for j in range(i + 1, n):
+            if labels[j] >= 0:
+                continue
+            is_correlated = True
+            for k in range(size):
+                if adjacent[members[k], j] == 0:
+                    is_correlated = False
+                    break
+            if is_correlated:
+                labels[j] = group
+                members[size] = j
+                size += 1
+        group += 1
+    return labels
+
+
+def _column_moments(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """2 次元配列（float64, T×N）の列毎の観測数・平均・標準偏差（ddof=1）を返す
+
+    NaN は除外し、観測数 1 以下の列の標準偏差は NaN（pandas の count/mean/std と同じ）。
+    行方向に走査して列毎の和を 1 回の呼び出しで積み上げる（平均 → 偏差平方和の 2 パス）。
+    スカラー演算のみで numba でコンパイルできる。
+    """
+    n_rows, n_cols = values.shape
+    count = np.zeros(n_cols, dtype=np.int64)
+    total = np.zeros(n_cols)
+    for i in range(n_rows):
+        for j in range(n_cols):
+            x = values[i, j]
+            if not np.isnan(x):
+                count[j] += 1
+                total[j] += x
+    mean = np.full(n_cols, np.nan)
+    for j in range(n_cols):
+        if count[j] > 0:
+            mean[j] = total[j] / count[j]
+    sq = np.zeros(n_cols)
+    for i in range(n_rows):
+        for j in range(n_cols):
+            x = values[i, j]
+            if not np.isnan(x):
+                d = x - mean[j]
+                sq[j] += d * d
+    std = np.full(n_cols, np.nan)
+    for j in range(n_cols):
+        if count[j] > 1:
+            std[j] = np.sqrt(sq[j] / (count[j] - 1))
+    return count, mean, std
+
+
+if NUMBA_AVAILABLE:
+    _greedy_group_labels = njit(cache=True)(_greedy_group_labels)
+    _column_moments = njit(cache=True)(_column_moments)
 
 
 class AnalysisService:
@@ -15,6 +104,7 @@ class AnalysisService:
     def __init__(self) -> None:
         self.chart_service = ChartService()
         self.data_dir = self.chart_service.data_dir
+        self._currency_service = CurrencyService()
 
     # ---------- ファイル/データ取得 ----------
     def list_csv_files(self) -> List[str]:
@@ -26,13 +116,18 @@ class AnalysisService:
         return filename.replace(".csv", "")
 
     def load_close_series(self, filename: str, currency: str = "USD") -> pd.Series:
-        # 通貨換算サービスを使用してデータを読み込み
-        from services.currency_service import CurrencyService
-        currency_service = CurrencyService()
-        
-        # 分析用ファイルパスを取得
-        analysis_file_path = currency_service.get_analysis_file_path(filename, currency)
-        
+        """終値系列を読み込む（ファイルが更新されるまではパース済みの系列を再利用する。呼び出し側で変更しないこと）"""
+        # 分析用ファイルパスを取得（通貨換算済みファイルが無ければ生成される）
+        analysis_file_path = self._currency_service.get_analysis_file_path(filename, currency)
+        return self._cached_close_series(analysis_file_path, self._filename_to_ticker(filename))
+
+    def _cached_close_series(self, analysis_file_path: str, name: str) -> pd.Series:
+        """パース済みの終値系列を (パス, mtime, サイズ, 名前) をキーに再利用（ファイル更新で自動的に読み直す）"""
+        stat = os.stat(analysis_file_path)
+        key = (analysis_file_path, stat.st_mtime_ns, stat.st_size, name)
+        return _close_series_cache.get_or_compute(key, lambda: self._read_close_series(analysis_file_path, name))
+
+    def _read_close_series(self, analysis_file_path: str, name: str) -> pd.Series:
         # データを読み込み
         df = pd.read_csv(analysis_file_path)
         
@@ -51,22 +146,57 @@ class AnalysisService:
                 df[col] = pd.to_numeric(df[col], errors='coerce')
         
         s = df.set_index("Date")["Close"].sort_index().astype(float)
-        s.name = self._filename_to_ticker(filename)
+        s.name = name
         return s
 
     def load_all_close_series(self, filenames: Optional[List[str]] = None, currency: str = "USD") -> pd.DataFrame:
         files = filenames if filenames else self.list_csv_files()
-        series_list: List[pd.Series] = []
+        # 通貨換算済みファイルの解決/生成（ファイル書き込みを伴う）は直列に行い、CSV のパースのみスレッドで並行させる
+        targets: List[Tuple[str, str]] = []
         for f in files:
             try:
-                series_list.append(self.load_close_series(f, currency))
+                targets.append((self._currency_service.get_analysis_file_path(f, currency), self._filename_to_ticker(f)))
             except Exception:
-                # 壊れたファイルはスキップ
                 continue
+
+        def _load(target: Tuple[str, str]) -> Optional[pd.Series]:
+            try:
+                return self._cached_close_series(*target)
+            except Exception:
+                # 壊れたファイルはスキップ
+                return None
+
+        if len(targets) > 1:
+            with ThreadPoolExecutor(max_workers=min(_LOAD_MAX_WORKERS, len(targets))) as executor:
+                loaded = list(executor.map(_load, targets))
+        else:
+            loaded = [_load(target) for target in targets]
+        series_list = [s for s in loaded if s is not None]
         if not series_list:
             raise ValueError("有効なCSVがありません")
-        df_close = pd.concat(series_list, axis=1, join="inner").sort_index()
-        return df_close
+        try:
+            return self._align_on_common_dates(series_list)
+        except TypeError:
+            # 比較できない日付（欠損等）を含む場合は pandas の結合に任せる
+            return pd.concat(series_list, axis=1, join="inner").sort_index()
+
+    @staticmethod
+    def _align_on_common_dates(series_list: List[pd.Series]) -> pd.DataFrame:
+        """全系列に共通する日付だけを残して 1 つの DataFrame に並べる（pd.concat(join="inner") 相当）
+
+        共通日付を np.intersect1d で求め、各系列（日付昇順）から searchsorted の位置で値を取り出して
+        連続した 2 次元配列に書き込む（pandas の汎用的な結合処理を通さない）。
+        """
+        indexes = [s.index.to_numpy() for s in series_list]
+        common = reduce(np.intersect1d, indexes)
+        values = np.empty((len(common), len(series_list)), dtype=np.float64)
+        for k, (s, index) in enumerate(zip(series_list, indexes)):
+            values[:, k] = s.to_numpy(dtype=np.float64)[np.searchsorted(index, common)]
+        return pd.DataFrame(
+            values,
+            index=pd.Index(common, name=series_list[0].index.name),
+            columns=[s.name for s in series_list],
+        )
 
     # ---------- 指標計算 ----------
     def compute_returns(self, prices: pd.DataFrame, method: str = "simple") -> pd.DataFrame:
@@ -88,9 +218,21 @@ class AnalysisService:
         prices = self.load_all_close_series(filenames, currency)
         rets = self.compute_returns(prices, method=method)
 
-        # 日次統計
-        mean_daily = rets.mean()
-        vol_daily = rets.std()
+        # 日次統計（pandas の mean/std/count と同じく欠損を除外。1 つの配列上で列方向に集約する）
+        values = np.ascontiguousarray(rets.to_numpy(dtype=np.float64))
+        if NUMBA_AVAILABLE:
+            # 一時配列を作らずに観測数・平均・標準偏差をまとめて算出
+            count, mean, vol = _column_moments(values)
+        else:
+            valid = ~np.isnan(values)
+            count = valid.sum(axis=0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mean = np.where(valid, values, 0.0).sum(axis=0) / count
+                dev = np.where(valid, values - mean, 0.0)
+                # 不偏分散（ddof=1）。観測数 1 以下は NaN
+                vol = np.where(count > 1, np.sqrt(np.einsum("ij,ij->j", dev, dev) / (count - 1)), np.nan)
+        mean_daily = pd.Series(mean, index=rets.columns)
+        vol_daily = pd.Series(vol, index=rets.columns)
         sharpe_daily = (mean_daily - risk_free_rate / periods_per_year) / vol_daily.replace(0, np.nan)
 
         # 年率換算
@@ -107,7 +249,7 @@ class AnalysisService:
                 "mean_return_annual": mean_annual.values,
                 "volatility_annual": vol_annual.values,
                 "sharpe_annual": sharpe_annual.values,
-                "observations": rets.count().values,
+                "observations": count,
             }
         )
         # 見やすさのためソート（年率シャープ降順）
@@ -115,44 +257,82 @@ class AnalysisService:
         return summary
 
     def compute_correlation(self, filenames: Optional[List[str]] = None, method: str = "simple", currency: str = "USD") -> pd.DataFrame:
+        # 同じ銘柄/パラメータ/データ状態なら相関行列を再利用（/correlation と /correlation/html 等）
+        key = (
+            tuple(filenames) if filenames else None,
+            method, currency,
+            dir_signature(self._currency_service.data_dir, self._currency_service.analysis_dir),
+        )
+        corr = _correlation_cache.get_or_compute(key, lambda: self._compute_correlation(filenames, method, currency))
+        # 呼び出し側での変更がキャッシュに及ばないようコピーを返す
+        return corr.copy()
+
+    def _compute_correlation(self, filenames: Optional[List[str]], method: str, currency: str) -> pd.DataFrame:
         prices = self.load_all_close_series(filenames, currency)
         rets = self.compute_returns(prices, method=method)
-        corr = rets.corr()
-        return corr
+        return self._correlation_matrix(rets)
+
+    def _correlation_matrix(self, rets: pd.DataFrame) -> pd.DataFrame:
+        """リターン行列の相関係数行列
+
+        欠損が無ければ各列を標準化し C = Zᵀ·Z / T の 1 回の行列積（BLAS）で一括計算し、
+        欠損を含む場合は pairwise に欠損を除外する pandas の corr() を使う。
+        標準化はコピー済みの配列上でその場で行う（np.corrcoef のような中間コピーを作らない）。
+        """
+        values = rets.to_numpy(dtype=np.float64, copy=True)
+        if values.shape[0] < 2 or np.isnan(values).any():
+            return rets.corr()
+        values -= values.mean(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # 分散 0 の列は NaN になる（np.corrcoef と同じ）
+            values /= np.sqrt(np.einsum("ij,ij->j", values, values) / values.shape[0])
+            corr = values.T @ values / values.shape[0]
+        np.clip(corr, -1.0, 1.0, out=corr)
+        return pd.DataFrame(corr, index=rets.columns, columns=rets.columns)
 
     def _find_correlated_groups(self, corr: pd.DataFrame, threshold: float = 0.9) -> List[List[str]]:
-        """閾値を超える相関を持つ資産グループを見つける"""
+        """閾値を超える相関を持つ資産グループを見つける
+
+        先頭の未訪問資産から順にグループを作り、グループの全メンバーと |相関| が閾値以上の資産を追加する。
+        判定は |相関| >= 閾値 のブール行列を一度作り、numba があれば _greedy_group_labels（JIT）で、
+        無ければ候補毎にメンバー行の AND を取って行う。
+        """
         tickers = list(corr.columns)
         n = len(tickers)
-        visited = set()
+        with np.errstate(invalid="ignore"):
+            # NaN（分散 0 の系列等）は閾値未満と見なさない
+            adjacent = ~(np.abs(corr.to_numpy(dtype=np.float64)) < threshold)
+        if NUMBA_AVAILABLE:
+            labels = _greedy_group_labels(adjacent.astype(np.uint8))
+            # 番号順（= 先頭メンバーの順）に、メンバーは元の列順で並べる
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels)
+            return [
+                [tickers[k] for k in members]
+                for members in np.split(order, np.cumsum(counts)[:-1])
+                if len(members) > 1
+            ]
+        
+        visited = np.zeros(n, dtype=bool)
         groups = []
         
         for i in range(n):
-            if tickers[i] in visited:
+            if visited[i]:
                 continue
                 
             # 新しいグループを開始
-            group = [tickers[i]]
-            visited.add(tickers[i])
+            members = [i]
+            visited[i] = True
             
-            # 他の資産との相関をチェック
-            for j in range(i + 1, n):
-                if tickers[j] in visited:
-                    continue
-                    
-                # グループ内の全ての資産との相関をチェック
-                is_correlated = True
-                for member in group:
-                    if abs(corr.loc[member, tickers[j]]) < threshold:
-                        is_correlated = False
-                        break
-                
-                if is_correlated:
-                    group.append(tickers[j])
-                    visited.add(tickers[j])
+            # i と相関する未訪問の資産のうち、グループ内の全ての資産と相関するものを追加
+            candidates = np.flatnonzero(adjacent[i, i + 1:] & ~visited[i + 1:]) + i + 1
+            for j in candidates:
+                if adjacent[members, j].all():
+                    members.append(j)
+                    visited[j] = True
             
-            if len(group) > 1:  # 2つ以上の資産が相関している場合のみ
-                groups.append(group)
+            if len(members) > 1:  # 2つ以上の資産が相関している場合のみ
+                groups.append([tickers[k] for k in members])
         
         return groups
 
@@ -192,7 +372,7 @@ class AnalysisService:
         """相関の高い資産グループを代表資産に統合"""
         prices = self.load_all_close_series(filenames, currency)
         rets = self.compute_returns(prices, method=method)
-        corr = rets.corr()
+        corr = self._correlation_matrix(rets)
         
         # 相関グループを見つける
         groups = self._find_correlated_groups(corr, correlation_threshold)
@@ -217,7 +397,7 @@ class AnalysisService:
                     consolidated_rets = consolidated_rets.drop(columns=[asset])
         
         # 統合後の相関行列を計算
-        consolidated_corr = consolidated_rets.corr()
+        consolidated_corr = self._correlation_matrix(consolidated_rets)
         
         return {
             "original_correlation": corr,
@@ -229,10 +409,10 @@ class AnalysisService:
 
     # ---------- 可視化（Plotly） ----------
     def create_summary_table_figure(self, summary: pd.DataFrame, title: str = "統計量サマリ") -> Dict:
-        # 表示桁の整形
-        df = summary.copy()
-        for col in ["mean_return_daily", "volatility_daily", "sharpe_daily", "mean_return_annual", "volatility_annual", "sharpe_annual"]:
-            df[col] = df[col].astype(float)
+        # 表示桁の整形（列毎に配列のまま書式化する。% 表示の列は 100 倍）
+        def fmt(col: str, scale: float = 1.0, suffix: str = "") -> np.ndarray:
+            return np.char.mod(f"%.2f{suffix}", summary[col].to_numpy(dtype=float) * scale)
+
         fig = go.Figure(
             data=[
                 go.Table(
@@ -252,14 +432,14 @@ class AnalysisService:
                     ),
                     cells=dict(
                         values=[
-                            df["ticker"],
-                            (df["mean_return_daily"] * 100).map(lambda x: f"{x:.2f}%"),
-                            (df["volatility_daily"] * 100).map(lambda x: f"{x:.2f}%"),
-                            df["sharpe_daily"].map(lambda x: f"{x:.2f}"),
-                            (df["mean_return_annual"] * 100).map(lambda x: f"{x:.2f}%"),
-                            (df["volatility_annual"] * 100).map(lambda x: f"{x:.2f}%"),
-                            df["sharpe_annual"].map(lambda x: f"{x:.2f}"),
-                            df["observations"],
+                            summary["ticker"],
+                            fmt("mean_return_daily", 100, "%%"),
+                            fmt("volatility_daily", 100, "%%"),
+                            fmt("sharpe_daily"),
+                            fmt("mean_return_annual", 100, "%%"),
+                            fmt("volatility_annual", 100, "%%"),
+                            fmt("sharpe_annual"),
+                            summary["observations"],
                         ],
                         align="center",
                     ),
@@ -1,10 +1,127 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List, Tuple
 import os
 
+from utils.cache import TTLCache, file_signature
+
+# numba はオプション依存（あれば移動平均/標準偏差の逐次ループを JIT コンパイルする）
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# パース済み CSV（キーにファイルの mtime/サイズを含むため、更新されたファイルは再パースされる）
+# load_csv_data はファイルシグネチャ、get_chart_data は ("chart", シグネチャ) をキーにする
+_csv_frame_cache = TTLCache(maxsize=64)
+# 指標の計算結果（キーは元ファイルのシグネチャ + 指標名 + パラメータ。図ではなく系列を保持する）
+_indicator_cache = TTLCache(maxsize=256)
+
+def _parse_date(s: str) -> Optional[pd.Timestamp]:
+    """日付文字列を解釈（解釈できなければ None）
+
+    頻出の YYYY-MM-DD / YYYY/MM/DD は文字列スライス + int で直接組み立て、
+    それ以外の形式のみ pandas の汎用パーサにフォールバックする。
+    """
+    if len(s) == 10 and s[4] == s[7] and s[4] in "-/" and s[:4].isdigit() and s[5:7].isdigit() and s[8:].isdigit():
+        try:
+            return pd.Timestamp(int(s[:4]), int(s[5:7]), int(s[8:]))
+        except ValueError:
+            return None
+    d = pd.to_datetime(s, errors='coerce')
+    if pd.isna(d):
+        return None
+    return pd.Timestamp(d)
+
+def _rolling_mean_std(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """移動平均と移動標準偏差（ddof=0, min_periods=1）を 1 パスで計算する
+
+    窓に入る値を加え、外れる値を除く Welford 法の逐次更新で平均と偏差平方和を保持する（窓幅に依存しない O(N)）。
+    NaN は除外し、窓内が同じ値だけのときは pandas と同じく平均をその値、標準偏差を 0 とする。
+    スカラー演算のみで numba でコンパイルできる。
+    """
+    n = values.shape[0]
+    mean_out = np.full(n, np.nan)
+    std_out = np.full(n, np.nan)
+    nobs = 0
+    mean = 0.0
+    m2 = 0.0
+    prev = np.nan
+    same = 0
+    for i in range(n):
+        x = values[i]
+        if not np.isnan(x):
+            nobs += 1
+            delta = x - mean
+            mean += delta / nobs
+            m2 += delta * (x - mean)
+            if x == prev:
+                same += 1
+            else:
+                same = 1
+            prev = x
+        if i >= window:
+            old = values[i - window]
+            if not np.isnan(old):
+                nobs -= 1
+                if nobs == 0:
+                    mean = 0.0
+                    m2 = 0.0
+                else:
+                    delta = old - mean
+                    mean -= delta / nobs
+                    m2 -= delta * (old - mean)
+        if nobs > 0:
+            if same >= nobs:
+                mean_out[i] = prev
+                std_out[i] = 0.0
+            else:
+                mean_out[i] = mean
+                std_out[i] = np.sqrt(max(m2, 0.0) / nobs)
+    return mean_out, std_out
+
+
+def _ema(values: np.ndarray, alpha: float, min_periods: int) -> np.ndarray:
+    """指数移動平均 y[t] = α·x[t] + (1-α)·y[t-1]（pandas の ewm(adjust=False).mean() と同じ規則）
+
+    NaN の間も前回値の重みは減衰させ、観測数が min_periods 未満の位置は NaN とする。
+    スカラー演算のみで numba でコンパイルできる。
+    """
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if n == 0:
+        return out
+    weighted = values[0]
+    nobs = 0 if np.isnan(weighted) else 1
+    old_wt = 1.0
+    if nobs >= min_periods:
+        out[0] = weighted
+    for i in range(1, n):
+        x = values[i]
+        is_observation = not np.isnan(x)
+        if is_observation:
+            nobs += 1
+        if not np.isnan(weighted):
+            old_wt *= 1.0 - alpha
+            if is_observation:
+                if weighted != x:
+                    weighted = (old_wt * weighted + alpha * x) / (old_wt + alpha)
+                old_wt = 1.0
+        elif is_observation:
+            weighted = x
+        if nobs >= min_periods:
+            out[i] = weighted
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _rolling_mean_std = njit(cache=True)(_rolling_mean_std)
+    _ema = njit(cache=True)(_ema)
+
 class ChartService:
     """ローソク足チャートと出来高折れ線グラフを生成するサービス"""
     
@@ -12,10 +129,25 @@ class ChartService:
         self.data_dir = "data"
     
     def load_csv_data(self, filename: str) -> pd.DataFrame:
+        """CSV を読み込み Date 昇順の OHLCV DataFrame を返す
+
+        ファイルが更新されるまではパース済みの DataFrame を再利用する（呼び出し側で変更しないこと）。
+        """
         file_path = os.path.join(self.data_dir, filename)
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"ファイルが見つかりません: {file_path}")
-        raw = pd.read_csv(file_path, header=None, dtype=str, engine="python")
+        return _csv_frame_cache.get_or_compute(file_signature(file_path), lambda: self._parse_csv(file_path))
+
+    @staticmethod
+    def _read_raw_csv(file_path: str) -> pd.DataFrame:
+        """全列を文字列として読み込む（C パーサで読めない不揃いな行がある場合のみ python エンジン）"""
+        try:
+            return pd.read_csv(file_path, header=None, dtype=str, engine="c")
+        except pd.errors.ParserError:
+            return pd.read_csv(file_path, header=None, dtype=str, engine="python")
+
+    def _parse_csv(self, file_path: str) -> pd.DataFrame:
+        raw = self._read_raw_csv(file_path)
         if raw.empty:
             raise ValueError("CSVが空です")
         max_cols = 6
@@ -41,16 +173,16 @@ class ChartService:
             for s in annotate_dates:
                 if not s:
                     continue
-                d = pd.to_datetime(s, errors='coerce')
-                if pd.isna(d):
+                d = _parse_date(s)
+                if d is None:
                     continue
                 marks.append(pd.Timestamp(d.date()))
         if mark_month_start:
-            df2 = df.copy()
-            df2['date_only'] = df2['Date'].dt.date
-            df2['year_month'] = df2['Date'].dt.to_period('M')
-            firsts = df2.groupby('year_month')['date_only'].min().tolist()
-            marks.extend(pd.Timestamp(x) for x in firsts)
+            # 各月の最初の取引日（日付を昇順に並べ、月が切り替わる位置を np.unique で拾う）
+            days = df['Date'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+            days = np.sort(days[~np.isnat(days)])
+            _, first_idx = np.unique(days.astype('datetime64[M]'), return_index=True)
+            marks.extend(pd.Timestamp(x) for x in days[first_idx])
         if marks:
             min_d, max_d = df['Date'].min().normalize(), df['Date'].max().normalize()
             unique = []
@@ -96,10 +228,10 @@ class ChartService:
                 return
             ticks: List[pd.Timestamp] = []
             for s in axis_tick_dates:
-                d = pd.to_datetime(s, errors='coerce')
-                if pd.isna(d):
+                d = _parse_date(s)
+                if d is None:
                     continue
-                ticks.append(pd.Timestamp(d))
+                ticks.append(d)
             if not ticks:
                 return
             min_d, max_d = df['Date'].min(), df['Date'].max()
@@ -111,36 +243,75 @@ class ChartService:
             return
 
     # --------- 指標計算ユーティリティ ---------
+    @staticmethod
+    def _cached_indicator(data_key: Optional[Tuple], name: str, params: Tuple, compute: Callable[[], Any]) -> Any:
+        """指標を計算（data_key があれば同じファイル・同じパラメータの結果を再利用する。呼び出し側で変更しないこと）"""
+        if data_key is None:
+            return compute()
+        return _indicator_cache.get_or_compute((data_key, name, params), compute)
+
     def _compute_bb(self, close: pd.Series, window: int = 20, num_std: float = 2.0):
-        ma = close.rolling(window=window, min_periods=1).mean()
-        sd = close.rolling(window=window, min_periods=1).std(ddof=0)
+        if window < 1:
+            raise ValueError(f"bb_window は 1 以上を指定してください: {window}")
+        if NUMBA_AVAILABLE:
+            # 移動平均と標準偏差を 1 パスでまとめて計算
+            ma_values, sd_values = _rolling_mean_std(close.to_numpy(dtype=np.float64), window)
+            ma = pd.Series(ma_values, index=close.index)
+            sd = pd.Series(sd_values, index=close.index)
+        else:
+            ma = close.rolling(window=window, min_periods=1).mean()
+            sd = close.rolling(window=window, min_periods=1).std(ddof=0)
         upper = ma + num_std * sd
         lower = ma - num_std * sd
         return ma, upper, lower
 
+    def _ewm_mean(self, series: pd.Series, alpha: float, min_periods: int = 0) -> pd.Series:
+        """series.ewm(alpha=alpha, adjust=False, min_periods=min_periods).mean() と同じ（numba があれば逐次ループで計算）"""
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha は 0 < alpha <= 1 の範囲で指定してください: {alpha}")
+        if NUMBA_AVAILABLE:
+            return pd.Series(_ema(series.to_numpy(dtype=np.float64), alpha, min_periods), index=series.index)
+        return series.ewm(alpha=alpha, adjust=False, min_periods=min_periods).mean()
+
     def _compute_rsi(self, close: pd.Series, period: int = 14) -> pd.Series:
+        if period < 1:
+            raise ValueError(f"rsi_period は 1 以上を指定してください: {period}")
         delta = close.diff()
         gain = delta.clip(lower=0.0)
         loss = -delta.clip(upper=0.0)
-        avg_gain = gain.ewm(alpha=1/period, adjust=False, min_periods=period).mean()
-        avg_loss = loss.ewm(alpha=1/period, adjust=False, min_periods=period).mean()
+        avg_gain = self._ewm_mean(gain, 1 / period, min_periods=period)
+        avg_loss = self._ewm_mean(loss, 1 / period, min_periods=period)
         rs = avg_gain / avg_loss.replace(0, pd.NA)
         rsi = 100 - (100 / (1 + rs))
         return rsi.fillna(50)
 
     def _compute_macd(self, close: pd.Series, fast: int = 12, slow: int = 26, signal: int = 9):
-        ema_fast = close.ewm(span=fast, adjust=False).mean()
-        ema_slow = close.ewm(span=slow, adjust=False).mean()
+        for name, span in (("macd_fast", fast), ("macd_slow", slow), ("macd_signal", signal)):
+            if span < 1:
+                raise ValueError(f"{name} は 1 以上を指定してください: {span}")
+        # span から平滑化係数 α = 2 / (span + 1)
+        ema_fast = self._ewm_mean(close, 2 / (fast + 1))
+        ema_slow = self._ewm_mean(close, 2 / (slow + 1))
         macd = ema_fast - ema_slow
-        macd_signal = macd.ewm(span=signal, adjust=False).mean()
+        macd_signal = self._ewm_mean(macd, 2 / (signal + 1))
         hist = macd - macd_signal
         return macd, macd_signal, hist
 
     def _compute_vwap(self, close: pd.Series, volume: pd.Series) -> pd.Series:
-        cum_pv = (close * volume).cumsum()
-        cum_vol = volume.cumsum().replace(0, pd.NA)
-        vwap = (cum_pv / cum_vol).fillna(method='ffill')
-        return vwap
+        """累積 VWAP（累積出来高が 0 の間は直前の値を引き継ぐ）。numpy 配列上の累積和と前方補完で計算する"""
+        vol = volume.to_numpy(dtype=np.float64)
+        pv = close.to_numpy(dtype=np.float64) * vol
+        # pandas の cumsum と同じく欠損は飛ばして累積し、欠損位置自体は NaN にする
+        cum_pv = np.nancumsum(pv)
+        cum_pv[np.isnan(pv)] = np.nan
+        cum_vol = np.nancumsum(vol)
+        cum_vol[np.isnan(vol)] = np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vwap = np.where(cum_vol != 0, cum_pv / cum_vol, np.nan)
+        # 前方補完: 各位置で直近の有効値の位置を累積最大で求める
+        last_valid = np.where(~np.isnan(vwap), np.arange(len(vwap)), 0)
+        np.maximum.accumulate(last_valid, out=last_valid)
+        return pd.Series(vwap[last_valid], index=close.index)
 
     def _max_drawdown(self, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
         s_close = df.set_index('Date')['Close']
@@ -189,7 +360,13 @@ class ChartService:
         macd_signal: int = 9,
         show_vwap: bool = False,
         show_mdd: bool = False,
+        data_key: Optional[Tuple] = None,
     ) -> Dict[str, Any]:
+        """チャートの図を組み立てる
+
+        data_key には df の元ファイルのシグネチャ（file_signature）を渡す。指定すると指標の計算結果を
+        ファイルが更新されるまでキャッシュする（df がファイルから一意に決まる場合のみ指定すること）。
+        """
         include_rsi = show_rsi
         include_macd = show_macd
         rows_total = 2 + (1 if include_rsi else 0) + (1 if include_macd else 0)  # price + (rsi) + (macd) + volume
@@ -227,7 +404,7 @@ class ChartService:
             windows = ma_windows if ma_windows else [5, 25]
             palette = ['#FF9800', '#9C27B0', '#4CAF50', '#795548']
             for i, w in enumerate(windows):
-                ma = df['Close'].rolling(window=w, min_periods=1).mean()
+                ma = self._cached_indicator(data_key, "ma", (w,), lambda w=w: df['Close'].rolling(window=w, min_periods=1).mean())
                 fig.add_trace(
                     go.Scatter(x=df['Date'], y=ma, mode='lines', name=f"MA{w}", line=dict(color=palette[i % len(palette)], width=1)),
                     row=row_price, col=1
@@ -235,19 +412,19 @@ class ChartService:
 
         # Bollinger Bands
         if show_bb:
-            ma, upper, lower = self._compute_bb(df['Close'], window=bb_window, num_std=bb_std)
+            ma, upper, lower = self._cached_indicator(data_key, "bb", (bb_window, bb_std), lambda: self._compute_bb(df['Close'], window=bb_window, num_std=bb_std))
             fig.add_trace(go.Scatter(x=df['Date'], y=upper, line=dict(color='rgba(33,150,243,0.6)', width=1), name='BB upper'), row=row_price, col=1)
             fig.add_trace(go.Scatter(x=df['Date'], y=lower, line=dict(color='rgba(33,150,243,0.6)', width=1), name='BB lower', fill='tonexty', fillcolor='rgba(33,150,243,0.10)'), row=row_price, col=1)
             fig.add_trace(go.Scatter(x=df['Date'], y=ma, line=dict(color='rgba(33,150,243,0.8)', width=1, dash='dot'), name='BB basis'), row=row_price, col=1)
 
         # VWAP
         if show_vwap:
-            vwap = self._compute_vwap(df['Close'], df['Volume'])
+            vwap = self._cached_indicator(data_key, "vwap", (), lambda: self._compute_vwap(df['Close'], df['Volume']))
             fig.add_trace(go.Scatter(x=df['Date'], y=vwap, mode='lines', name='VWAP', line=dict(color='#3F51B5', width=1.2)), row=row_price, col=1)
 
         # Max Drawdown highlight
         if show_mdd:
-            mdd_info = self._max_drawdown(df)
+            mdd_info = self._cached_indicator(data_key, "mdd", (), lambda: self._max_drawdown(df))
             if mdd_info:
                 peak = mdd_info['peak']
                 trough = mdd_info['trough']
@@ -262,7 +439,7 @@ class ChartService:
 
         # RSI panel
         if include_rsi and row_rsi is not None:
-            rsi = self._compute_rsi(df['Close'], period=rsi_period)
+            rsi = self._cached_indicator(data_key, "rsi", (rsi_period,), lambda: self._compute_rsi(df['Close'], period=rsi_period))
             fig.add_trace(go.Scatter(x=df['Date'], y=rsi, mode='lines', name=f'RSI({rsi_period})', line=dict(color='#607D8B', width=1.2)), row=row_rsi, col=1)
             # 30/70 lines
             x0, x1 = df['Date'].min(), df['Date'].max()
@@ -274,7 +451,10 @@ class ChartService:
 
         # MACD panel
         if include_macd and row_macd is not None:
-            macd, macd_signal, hist = self._compute_macd(df['Close'], fast=macd_fast, slow=macd_slow, signal=macd_signal)
+            macd, macd_signal, hist = self._cached_indicator(
+                data_key, "macd", (macd_fast, macd_slow, macd_signal),
+                lambda: self._compute_macd(df['Close'], fast=macd_fast, slow=macd_slow, signal=macd_signal),
+            )
             fig.add_trace(go.Bar(x=df['Date'], y=hist, name='MACD Hist', marker_color=['#26A69A' if v >= 0 else '#EF5350' for v in hist.fillna(0)]), row=row_macd, col=1)
             fig.add_trace(go.Scatter(x=df['Date'], y=macd, mode='lines', name='MACD', line=dict(color='#FF7043', width=1.2)), row=row_macd, col=1)
             fig.add_trace(go.Scatter(x=df['Date'], y=macd_signal, mode='lines', name='Signal', line=dict(color='#42A5F5', width=1)), row=row_macd, col=1)
@@ -308,6 +488,28 @@ class ChartService:
         merged = {**defaults, **(indicator_options or {})}
         return self._build_chart(df, title, annotate_dates=annotate_dates, mark_month_start=mark_month_start, axis_tick=axis_tick, axis_tick_format=axis_tick_format, axis_tick_dates=axis_tick_dates, **merged)
     
+    @staticmethod
+    def _read_chart_csv(file_path: str) -> pd.DataFrame:
+        """チャート用に分析用 CSV を読み込み Date 昇順の DataFrame を返す（結果はキャッシュされるため呼び出し側で変更しないこと）"""
+        df = pd.read_csv(file_path)
+        
+        # 特殊なCSV構造に対応（最初の2行をスキップしてDateカラムを設定）
+        if 'Date' not in df.columns and len(df.columns) >= 6:
+            # 3行目以降のデータを使用し、最初の列をDateとして設定
+            df = df.iloc[2:].reset_index(drop=True)
+            df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+            
+            # 空のDate行を削除
+            df = df.dropna(subset=['Date'])
+            df = df[df['Date'] != '']
+            
+            # 数値列を数値型に変換
+            for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        
+        df['Date'] = pd.to_datetime(df['Date'])
+        return df.sort_values('Date').reset_index(drop=True)
+
     def get_chart_data(self, filename: str, with_indicators: bool = False, currency: str = "USD", *, annotate_dates: Optional[List[str]] = None, mark_month_start: bool = False, axis_tick: str = "auto", axis_tick_format: Optional[str] = None, axis_tick_dates: Optional[List[str]] = None, **indicator_options) -> Dict[str, Any]:
         try:
             # 通貨換算サービスを使用してデータを読み込み
@@ -316,36 +518,21 @@ class ChartService:
             
             # 分析用ファイルパスを取得
             analysis_file_path = currency_service.get_analysis_file_path(filename, currency)
+            # 指標/データのキャッシュキー（ファイルが更新されると変わる）
+            data_key = file_signature(analysis_file_path)
             
-            # データを読み込み
-            df = pd.read_csv(analysis_file_path)
-            
-            # 特殊なCSV構造に対応（最初の2行をスキップしてDateカラムを設定）
-            if 'Date' not in df.columns and len(df.columns) >= 6:
-                # 3行目以降のデータを使用し、最初の列をDateとして設定
-                df = df.iloc[2:].reset_index(drop=True)
-                df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
-                
-                # 空のDate行を削除
-                df = df.dropna(subset=['Date'])
-                df = df[df['Date'] != '']
-                
-                # 数値列を数値型に変換
-                for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            df['Date'] = pd.to_datetime(df['Date'])
-            df = df.sort_values('Date').reset_index(drop=True)
+            # データを読み込み（ファイルが更新されるまではパース済みの DataFrame を再利用）
+            df = _csv_frame_cache.get_or_compute(("chart", data_key), lambda: self._read_chart_csv(analysis_file_path))
             
             ticker = filename.replace('.csv', '')
             title = f"{ticker} ローソク足チャート ({currency})"
             if with_indicators:
                 chart_data = self.create_chart_with_indicators(
-                    df, title, annotate_dates=annotate_dates, mark_month_start=mark_month_start, axis_tick=axis_tick, axis_tick_format=axis_tick_format, axis_tick_dates=axis_tick_dates, **indicator_options
+                    df, title, annotate_dates=annotate_dates, mark_month_start=mark_month_start, axis_tick=axis_tick, axis_tick_format=axis_tick_format, axis_tick_dates=axis_tick_dates, data_key=data_key, **indicator_options
                 )
             else:
                 chart_data = self.create_candlestick_chart(
-                    df, title, annotate_dates=annotate_dates, mark_month_start=mark_month_start, axis_tick=axis_tick, axis_tick_format=axis_tick_format, axis_tick_dates=axis_tick_dates, **indicator_options
+                    df, title, annotate_dates=annotate_dates, mark_month_start=mark_month_start, axis_tick=axis_tick, axis_tick_format=axis_tick_format, axis_tick_dates=axis_tick_dates, data_key=data_key, **indicator_options
                 )
             return {
                 "success": True,
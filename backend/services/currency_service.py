@@ -4,6 +4,7 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,11 @@ class CurrencyService:
         self.exchange_rate_file = os.path.join(self.data_dir, 'USDJPY.csv')
         self.metadata_file = os.path.join(self.analysis_dir, 'metadata.json')
         
+        # 為替レートの読み込み結果 (ファイル mtime, DataFrame)
+        self._exchange_rates: Optional[Tuple[int, pd.DataFrame]] = None
+        # 為替レートファイルの書き換えを直列化
+        self._download_lock = threading.Lock()
+        
         # ディレクトリが存在しない場合は作成
         os.makedirs(self.analysis_dir, exist_ok=True)
     
@@ -34,14 +40,20 @@ class CurrencyService:
     def get_exchange_rate_data(self) -> pd.DataFrame:
         """
         為替レートデータを取得
+        ファイルの更新時刻が変わるまでは読み込み済みの DataFrame を再利用する（呼び出し側で変更しないこと）
         """
-        if os.path.exists(self.exchange_rate_file):
-            df = pd.read_csv(self.exchange_rate_file)
-            df['Date'] = pd.to_datetime(df['Date'])
-            return df
-        else:
+        try:
+            mtime = os.stat(self.exchange_rate_file).st_mtime_ns
+        except FileNotFoundError:
             logger.warning("USDJPY.csv not found. Please download exchange rate data first.")
             return pd.DataFrame()
+        cached = self._exchange_rates
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        df = pd.read_csv(self.exchange_rate_file)
+        df['Date'] = pd.to_datetime(df['Date'])
+        self._exchange_rates = (mtime, df)
+        return df
     
     def download_exchange_rate(self) -> bool:
         """
@@ -58,7 +70,9 @@ class CurrencyService:
             
             if not usdjpy.empty:
                 # CSV形式で保存
-                usdjpy.reset_index().to_csv(self.exchange_rate_file, index=False)
+                with self._download_lock:
+                    usdjpy.reset_index().to_csv(self.exchange_rate_file, index=False)
+                    self._exchange_rates = None
                 logger.info(f"Exchange rate data downloaded and saved to {self.exchange_rate_file}")
                 return True
             else:
@@ -1,11 +1,27 @@
 import os
 import logging
-from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import date, datetime
 import pandas as pd
 
 from data_provider.base_provider import BaseDataProvider
 
+# 一括削除時の最大並行数
+_DELETE_MAX_WORKERS = 8
+
+# サイズ表記の単位（1024 倍ごと）
+_SIZE_UNITS = ((1, "B"), (1024, "KB"), (1024 ** 2, "MB"), (1024 ** 3, "GB"))
+
+
+def format_size(size_bytes: int) -> str:
+    """ファイルサイズを読みやすい形式に変換（bit_length で単位を直接引く）"""
+    idx = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1) if size_bytes > 0 else 0
+    if idx == 0:
+        return f"{size_bytes} B"
+    divisor, unit = _SIZE_UNITS[idx]
+    return f"{size_bytes / divisor:.1f} {unit}"
+
 
 class DownloadService:
     """データダウンロードサービス
@@ -137,6 +153,41 @@ class DownloadService:
                 "file_path": None
             }
     
+    def fetch_stock_data(
+        self,
+        symbol: str,
+        provider_name: str = "yahoo",
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """株価データを取得する（CSV には保存しない）
+        
+        Args:
+            symbol: 株式シンボル
+            provider_name: 使用するプロバイダー名
+            start_date: 開始日
+            end_date: 終了日
+            **kwargs: プロバイダー固有のパラメータ
+            
+        Returns:
+            プロバイダーの get_stock_data と同形式の結果辞書（"data" は DataFrame）
+        """
+        if provider_name not in self._providers:
+            return {
+                "success": False,
+                "data": None,
+                "error": f"Provider '{provider_name}' not found. Available: {self.get_available_providers()}",
+                "metadata": {"symbol": symbol}
+            }
+        
+        return self._providers[provider_name].get_stock_data(
+            symbol=symbol,
+            start_date=start_date,
+            end_date=end_date,
+            **kwargs
+        )
+    
     def search_symbols(self, query: str, provider_name: str) -> List[Dict[str, Any]]:
         """シンボルを検索
         
@@ -185,6 +236,60 @@ class DownloadService:
             logging.error(f"Error getting company info: {str(e)}")
             return None
     
+    def download_many(
+        self,
+        symbols: List[str],
+        provider_name: str,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        **kwargs: Any
+    ) -> Dict[str, Dict[str, Any]]:
+        """複数シンボルをプロバイダーの一括取得 API でまとめてダウンロードし、CSV に保存
+        
+        Args:
+            symbols: シンボルのリスト
+            provider_name: 使用するプロバイダー名
+            start_date: 開始日
+            end_date: 終了日
+            **kwargs: プロバイダー固有のパラメータ
+            
+        Returns:
+            シンボル → download_stock_data と同形式の結果辞書
+            （失敗したシンボルは download_stock_data で個別に再取得できる）
+        """
+        if provider_name not in self._providers:
+            error = f"Provider '{provider_name}' not found. Available: {self.get_available_providers()}"
+            return {s: {"success": False, "error": error, "file_path": None} for s in symbols}
+        
+        provider = self._providers[provider_name]
+        fetched = provider.get_stock_data_many(symbols, start_date=start_date, end_date=end_date, **kwargs)
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        for symbol in symbols:
+            result = fetched.get(symbol)
+            if not result or not result["success"]:
+                results[symbol] = {
+                    "success": False,
+                    "error": result["error"] if result else f"No data returned for {symbol}",
+                    "file_path": None
+                }
+                continue
+            try:
+                file_path = os.path.join(self.data_dir, f"{symbol}.csv")
+                self._save_to_csv(result["data"], file_path, symbol)
+            except Exception as e:
+                logging.error(f"Error saving data for {symbol}: {str(e)}")
+                results[symbol] = {"success": False, "error": f"Download failed: {str(e)}", "file_path": None}
+                continue
+            results[symbol] = {
+                "success": True,
+                "error": None,
+                "file_path": file_path,
+                "metadata": result["metadata"],
+                "data_points": len(result["data"])
+            }
+        return results
+    
     def batch_download(
         self,
         symbols: List[str],
@@ -195,6 +300,8 @@ class DownloadService:
     ) -> Dict[str, Any]:
         """複数シンボルの一括ダウンロード
         
+        まず一括取得 API でまとめて取得し、失敗したシンボルのみ個別にダウンロードし直す。
+        
         Args:
             symbols: シンボルのリスト
             provider_name: 使用するプロバイダー名
@@ -213,14 +320,28 @@ class DownloadService:
             "failed_count": 0
         }
         
+        bulk = self.download_many(symbols, provider_name, start_date=start_date, end_date=end_date, **kwargs)
+        
+        # 一括取得で失敗したシンボルのみ個別に再取得（プロバイダーの同時実行数の範囲でスレッド並行）
+        retry = [s for s in dict.fromkeys(symbols) if not bulk[s]["success"]]
+        if retry:
+            provider = self._providers.get(provider_name)
+            workers = min(provider.max_concurrent_requests if provider else 1, len(retry))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                retried = executor.map(
+                    lambda symbol: self.download_stock_data(
+                        symbol=symbol,
+                        provider_name=provider_name,
+                        start_date=start_date,
+                        end_date=end_date,
+                        **kwargs
+                    ),
+                    retry,
+                )
+                bulk.update(zip(retry, retried))
+        
         for symbol in symbols:
-            result = self.download_stock_data(
-                symbol=symbol,
-                provider_name=provider_name,
-                start_date=start_date,
-                end_date=end_date,
-                **kwargs
-            )
+            result = bulk[symbol]
             
             if result["success"]:
                 results["success"].append({
@@ -238,16 +359,16 @@ class DownloadService:
         
         return results
     
-    def _save_to_csv(self, data: List[Dict[str, Any]], file_path: str, symbol: str) -> None:
+    def _save_to_csv(self, data: pd.DataFrame, file_path: str, symbol: str) -> None:
         """データをCSVファイルとして保存
         
         Args:
-            data: 保存するデータ
+            data: 保存するデータ（プロバイダーが返す "data" の DataFrame）
             file_path: 保存先ファイルパス
             symbol: シンボル名
         """
-        # データフレームの作成
-        df = pd.DataFrame(data)
+        # データフレームの作成（行リストを返すプロバイダーにも対応）
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
         
         # ヘッダー行の追加（既存のCSV形式に合わせる）
         header_rows = [
@@ -262,9 +383,11 @@ class DownloadService:
             for header_row in header_rows:
                 f.write(','.join(header_row) + '\n')
             
-            # データ行を書き込み
-            for _, row in df.iterrows():
-                f.write(f"{row['Date']}, {row['Open']}, {row['High']}, {row['Low']}, {row['Close']}, {row['Volume']}\n")
+            # データ行を書き込み（行毎の Series を作らず列を zip して書き出す）
+            f.writelines(
+                f"{d}, {o}, {h}, {l}, {c}, {v}\n"
+                for d, o, h, l, c, v in zip(df['Date'], df['Open'], df['High'], df['Low'], df['Close'], df['Volume'])
+            )
         
         logging.info(f"Data saved to: {file_path}")
     
@@ -323,14 +446,7 @@ class DownloadService:
                     "error": f"No files found for symbol: {symbol}"
                 }
             
-            deleted_files = []
-            failed_files = []
-            
-            for filename in matching_files:
-                if self.delete_file(filename):
-                    deleted_files.append(filename)
-                else:
-                    failed_files.append(filename)
+            deleted_files, failed_files = self._delete_files_parallel(matching_files)
             
             return {
                 "success": len(failed_files) == 0,
@@ -352,6 +468,23 @@ class DownloadService:
                 "error": f"Failed to delete files: {str(e)}"
             }
     
+    def _delete_files_parallel(self, filenames: List[str]) -> Tuple[List[str], List[str]]:
+        """複数ファイルの削除をスレッドで並行実行（ネットワークストレージでの往復待ちを重ねる）
+        
+        Returns:
+            (削除できたファイル, 削除できなかったファイル) のタプル（いずれも入力順）
+        """
+        if not filenames:
+            return [], []
+        
+        workers = min(_DELETE_MAX_WORKERS, len(filenames))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(self.delete_file, filenames))
+        
+        deleted_files = [f for f, ok in zip(filenames, results) if ok]
+        failed_files = [f for f, ok in zip(filenames, results) if not ok]
+        return deleted_files, failed_files
+    
     def delete_multiple_files(self, filenames: List[str]) -> Dict[str, Any]:
         """複数ファイルを一括削除
         
@@ -362,14 +495,7 @@ class DownloadService:
             一括削除結果辞書
         """
         try:
-            deleted_files = []
-            failed_files = []
-            
-            for filename in filenames:
-                if self.delete_file(filename):
-                    deleted_files.append(filename)
-                else:
-                    failed_files.append(filename)
+            deleted_files, failed_files = self._delete_files_parallel(filenames)
             
             return {
                 "success": len(failed_files) == 0,
@@ -405,14 +531,7 @@ class DownloadService:
                     "message": "No files to delete"
                 }
             
-            deleted_files = []
-            failed_files = []
-            
-            for filename in files:
-                if self.delete_file(filename):
-                    deleted_files.append(filename)
-                else:
-                    failed_files.append(filename)
+            deleted_files, failed_files = self._delete_files_parallel(files)
             
             return {
                 "success": len(failed_files) == 0,
@@ -443,30 +562,53 @@ class DownloadService:
         """
         try:
             file_path = os.path.join(self.data_dir, filename)
-            if not os.path.exists(file_path):
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
                 return None
             
-            stat = os.stat(file_path)
-            
-            # ファイルサイズを読みやすい形式に変換
-            size_bytes = stat.st_size
-            if size_bytes < 1024:
-                size_str = f"{size_bytes} B"
-            elif size_bytes < 1024 * 1024:
-                size_str = f"{size_bytes / 1024:.1f} KB"
-            else:
-                size_str = f"{size_bytes / (1024 * 1024):.1f} MB"
-            
-            return {
-                "filename": filename,
-                "file_path": file_path,
-                "size_bytes": size_bytes,
-                "size_readable": size_str,
-                "created_time": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                "modified_time": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                "exists": True
-            }
+            return self._build_file_info(filename, file_path, stat)
             
         except Exception as e:
             logging.error(f"Error getting file info for {filename}: {str(e)}")
             return None
+    
+    def list_files_with_info(self) -> List[Dict[str, Any]]:
+        """ダウンロード済みファイル一覧をファイル情報付きで取得
+        
+        os.scandir でディレクトリを一度だけ走査し、各ファイルの stat もその場で取得する
+        
+        Returns:
+            ファイル情報辞書のリスト（ファイル名順）
+        """
+        files_info = []
+        try:
+            with os.scandir(self.data_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.csv'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    file_path = os.path.join(self.data_dir, entry.name)
+                    files_info.append(self._build_file_info(entry.name, file_path, stat))
+        except Exception as e:
+            logging.error(f"Error listing files: {str(e)}")
+            return []
+        
+        files_info.sort(key=lambda f: f["filename"])
+        return files_info
+    
+    @staticmethod
+    def _build_file_info(filename: str, file_path: str, stat: os.stat_result) -> Dict[str, Any]:
+        """stat 結果からファイル情報辞書を構築"""
+        return {
+            "filename": filename,
+            "file_path": file_path,
+            "size_bytes": stat.st_size,
+            "size_readable": format_size(stat.st_size),
+            "created_time": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+            "modified_time": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "exists": True
+        }
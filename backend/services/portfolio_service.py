@@ -1,5 +1,5 @@
 import os
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -8,6 +8,12 @@ from plotly.subplots import make_subplots
 
 from services.chart_service import ChartService
 from services.analysis_service import AnalysisService
+from services.currency_service import CurrencyService
+from utils.cache import TTLCache, dir_signature
+
+# パース済み終値系列（キーにファイルの mtime/サイズを含む）と μ/Σ の推定結果のキャッシュ
+_close_series_cache = TTLCache(maxsize=256)
+_mu_sigma_cache = TTLCache(maxsize=64)
 
 
 class PortfolioService:
@@ -24,6 +30,7 @@ class PortfolioService:
         self.chart_service = ChartService()
         self.analysis_service = AnalysisService()
         self.data_dir = self.chart_service.data_dir
+        self._currency_service = CurrencyService()
 
     # ---------- データ読み込み ----------
     def list_csv_files(self) -> List[str]:
@@ -35,41 +42,50 @@ class PortfolioService:
     def _filename_to_ticker(self, filename: str) -> str:
         return filename.replace(".csv", "")
 
+    def _read_close_series(self, file_path: str) -> pd.Series:
+        """CSV を読み込み Date インデックスの終値系列を返す"""
+        df = pd.read_csv(file_path)
+        
+        # 特殊なCSV構造に対応（最初の2行をスキップしてDateカラムを設定）
+        if 'Date' not in df.columns and len(df.columns) >= 6:
+            df = df.iloc[2:].reset_index(drop=True)
+            df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+            
+            # 空のDate行を削除
+            df = df.dropna(subset=['Date'])
+            df = df[df['Date'] != '']
+        
+        # 数値列を数値型に変換
+        for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        
+        # 欠損値を削除
+        df = df.dropna(subset=['Open', 'High', 'Low', 'Close', 'Volume'])
+        
+        df['Date'] = pd.to_datetime(df['Date'])
+        
+        return df.set_index("Date")["Close"].astype(float)
+
     def load_close_prices(self, filenames: Optional[List[str]] = None, currency: str = "USD") -> pd.DataFrame:
         files = filenames if filenames else self.list_csv_files()
         series_list: List[pd.Series] = []
         for f in files:
             try:
                 # 通貨換算に対応したファイルパスを取得
-                from services.currency_service import CurrencyService
-                currency_service = CurrencyService()
-                file_path = currency_service.get_analysis_file_path(f, currency)
-                
-                # ファイルを読み込み
-                df = pd.read_csv(file_path)
+                file_path = self._currency_service.get_analysis_file_path(f, currency)
                 
-                # 特殊なCSV構造に対応（最初の2行をスキップしてDateカラムを設定）
-                if 'Date' not in df.columns and len(df.columns) >= 6:
-                    df = df.iloc[2:].reset_index(drop=True)
-                    df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
-                    
-                    # 空のDate行を削除
-                    df = df.dropna(subset=['Date'])
-                    df = df[df['Date'] != '']
+                # パース済みの終値系列を (パス, mtime, サイズ) をキーに再利用（ファイル更新で自動的に読み直す）
+                stat = os.stat(file_path)
+                name = self._filename_to_ticker(f)
+                key = (file_path, stat.st_mtime_ns, stat.st_size, name)
                 
-                # 数値列を数値型に変換
-                for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col], errors='coerce')
+                def _load(file_path=file_path, name=name) -> pd.Series:
+                    s = self._read_close_series(file_path)
+                    s.name = name
+                    return s
                 
-                # 欠損値を削除
-                df = df.dropna(subset=['Open', 'High', 'Low', 'Close', 'Volume'])
-                
-                df['Date'] = pd.to_datetime(df['Date'])
-                
-                s = df.set_index("Date")["Close"].astype(float)
-                s.name = self._filename_to_ticker(f)
-                series_list.append(s)
+                series_list.append(_close_series_cache.get_or_compute(key, _load))
             except Exception as e:
                 print(f"Error loading {f}: {e}")
                 continue
@@ -90,6 +106,38 @@ class PortfolioService:
         correlation_threshold: float = 0.9,
         consolidation_method: str = "mean",
         currency: str = "USD",
+    ) -> Tuple[pd.Series, pd.DataFrame]:
+        # 同じ銘柄集合/パラメータ/データ状態なら μ, Σ を再利用（/inputs → /feasible → /efficient-frontier 等）
+        key = (
+            tuple(sorted(set(filenames))) if filenames else None,
+            method, annualize, periods_per_year,
+            consolidate_correlated, correlation_threshold, consolidation_method, currency,
+            dir_signature(self._currency_service.data_dir, self._currency_service.analysis_dir),
+        )
+        mu, Sigma = _mu_sigma_cache.get_or_compute(key, lambda: self._estimate_mu_sigma(
+            filenames,
+            method=method,
+            annualize=annualize,
+            periods_per_year=periods_per_year,
+            consolidate_correlated=consolidate_correlated,
+            correlation_threshold=correlation_threshold,
+            consolidation_method=consolidation_method,
+            currency=currency,
+        ))
+        # 呼び出し側での変更がキャッシュに及ばないようコピーを返す
+        return mu.copy(), Sigma.copy()
+
+    def _estimate_mu_sigma(
+        self,
+        filenames: Optional[List[str]],
+        *,
+        method: str,
+        annualize: bool,
+        periods_per_year: int,
+        consolidate_correlated: bool,
+        correlation_threshold: float,
+        consolidation_method: str,
+        currency: str,
     ) -> Tuple[pd.Series, pd.DataFrame]:
         if consolidate_correlated:
             # 相関統合を先に実行
@@ -322,8 +370,9 @@ class PortfolioService:
         # 常に解析解を使用（ショート可/不可に関係なく）
         targets = np.linspace(target_return_min, target_return_max, num_frontier_points)
         ef = self.efficient_frontier_analytic(mu, Sigma, return_targets=targets)
-        frontier_x = ef["risks"].tolist()
-        frontier_y = ef["target_returns"].tolist()
+        # ndarray のまま図に渡す（レスポンスは orjson が配列を直接シリアライズする）
+        frontier_x = ef["risks"]
+        frontier_y = ef["target_returns"]
         ef_weights_list = ef["weights_list"]
         ef_targets_arr = ef["target_returns"]
 
@@ -376,7 +425,7 @@ class PortfolioService:
                 ret_tan = float(w_tan @ mu.values)
                 risk_tan = float(np.sqrt(max(w_tan.T @ Sigma.values @ w_tan, 0.0)))
                 slope = (ret_tan - r_f) / max(risk_tan, 1e-12)
-                x_cml = np.linspace(0.0, max(frontier_x) if len(frontier_x) else risk_tan * 1.5, 50)
+                x_cml = np.linspace(0.0, float(frontier_x.max()) if len(frontier_x) else risk_tan * 1.5, 50)
                 y_cml = r_f + slope * x_cml
                 fig.add_scatter(x=x_cml, y=y_cml, mode="lines", name="CML", line=dict(color="#4CAF50", width=2, dash="dot"), row=1, col=1)
                 fig.add_scatter(x=[risk_tan], y=[ret_tan], mode="markers", name="Tangency", marker=dict(size=10, color="#FF9800", symbol="star"), row=1, col=1)
@@ -449,7 +498,15 @@ class PortfolioService:
             "Sigma": pd.DataFrame(Sigma, index=mu.index, columns=mu.index).to_dict(),
         }
 
-    def get_feasible_set_figure(
+    def get_feasible_set_figure(self, filenames: Optional[List[str]] = None, **kwargs) -> Dict:
+        """実行可能集合の図と μ/Σ を返す（引数は iter_feasible_set_figure と同じ）"""
+        result: Dict = {}
+        for _, step_result in self.iter_feasible_set_figure(filenames, **kwargs):
+            if step_result is not None:
+                result = step_result
+        return result
+
+    def iter_feasible_set_figure(
         self,
         filenames: Optional[List[str]] = None,
         *,
@@ -468,7 +525,13 @@ class PortfolioService:
         consolidate_correlated: bool = False,
         correlation_threshold: float = 0.9,
         consolidation_method: str = "mean",
-    ) -> Dict:
+    ) -> Iterator[Tuple[int, Optional[Dict]]]:
+        """実行可能集合の計算を段階ごとに進め、(進捗%, 結果) を返すジェネレータ
+
+        途中段階の結果は None、最後の要素のみ get_feasible_set_figure と同じ結果を持つ。
+        呼び出し側は途中で close() して以降の計算を打ち切れる。
+        """
+        yield 0, None
         mu, Sigma = self.estimate_mu_sigma(
             filenames, 
             method=method, 
@@ -478,6 +541,8 @@ class PortfolioService:
             correlation_threshold=correlation_threshold,
             consolidation_method=consolidation_method
         )
+        # μ/Σ の推定が済んだ段階（以降はサンプリングとフロンティア計算）
+        yield 30, None
         fig = self.create_feasible_set_figure(
             mu, Sigma,
             r_f=r_f,
@@ -490,7 +555,7 @@ class PortfolioService:
             composition_mode=composition_mode,
             composition_target_return=composition_target_return,
         )
-        return {"mu": mu.to_dict(), "Sigma": pd.DataFrame(Sigma, index=mu.index, columns=mu.index).to_dict(), "figure": fig}
+        yield 100, {"mu": mu.to_dict(), "Sigma": pd.DataFrame(Sigma, index=mu.index, columns=mu.index).to_dict(), "figure": fig}
 
     def get_optimization_figure(
         self,
@@ -0,0 +1,103 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import Response
+
+from utils.serialization import dumps
+
+# pyarrow はオプション依存（?format=arrow を使う場合のみ必要）
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logging.warning("pyarrow not available. Arrow IPC responses will not work.")
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Arrow 列として切り出すトレースの数値配列キー
+_ARRAY_KEYS = ("x", "y", "z", "open", "high", "low", "close")
+
+
+def _to_arrow_values(value: Any) -> Optional[Tuple["pa.Array", List[int]]]:
+    """数値/日時配列を平坦化した Arrow 配列と元の shape に変換（対象外なら None）"""
+    if not isinstance(value, (list, tuple, np.ndarray)) or len(value) == 0:
+        return None
+    arr = np.asarray(value)
+    if arr.dtype.kind in "biufM":
+        return pa.array(arr.reshape(-1)), list(arr.shape)
+    if arr.dtype.kind == "O" and arr.ndim == 1:
+        # Timestamp の object 配列等
+        try:
+            values = pa.array(arr, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return None
+        t = values.type
+        if pa.types.is_timestamp(t) or pa.types.is_date(t) or pa.types.is_integer(t) or pa.types.is_floating(t):
+            return values, list(arr.shape)
+    return None
+
+
+def encode_figures(figures: Dict[str, Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> bytes:
+    """Plotly 図の数値配列を Arrow IPC ストリームに、残り（layout 等）を JSON メタデータにまとめる
+
+    各配列は 1 行の list 列 "<図名>.<トレース番号>.<キー>" として格納し、
+    図 JSON 側の該当箇所は {"arrow_column": 列名, "shape": [...]} に置き換える。
+    図 JSON は schema メタデータ "figures"、その他の付帯情報は "meta" に入る。
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required for Arrow IPC responses")
+
+    names: List[str] = []
+    columns: List["pa.Array"] = []
+    stripped: Dict[str, Dict[str, Any]] = {}
+    for fig_name, fig in figures.items():
+        traces = []
+        for i, trace in enumerate(fig.get("data", [])):
+            trace = dict(trace)
+            for key in _ARRAY_KEYS:
+                converted = _to_arrow_values(trace.get(key))
+                if converted is None:
+                    continue
+                values, shape = converted
+                col = f"{fig_name}.{i}.{key}"
+                names.append(col)
+                columns.append(pa.ListArray.from_arrays(pa.array([0, len(values)], pa.int32()), values))
+                trace[key] = {"arrow_column": col, "shape": shape}
+            traces.append(trace)
+        stripped[fig_name] = {**fig, "data": traces}
+
+    metadata = {b"figures": dumps(stripped), b"meta": dumps(meta or {})}
+    table = pa.Table.from_arrays(columns, names=names).replace_schema_metadata(metadata)
+    return _write_stream(table)
+
+
+def encode_frame(df: pd.DataFrame, meta: Optional[Dict[str, Any]] = None) -> bytes:
+    """DataFrame を列そのままの Arrow IPC ストリームに変換（付帯情報は schema メタデータ "meta"）"""
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required for Arrow IPC responses")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), b"meta": dumps(meta or {})}
+    return _write_stream(table.replace_schema_metadata(metadata))
+
+
+def _write_stream(table: "pa.Table") -> bytes:
+    """テーブルを Arrow IPC ストリームのバイト列に書き出す（lz4 が使えれば圧縮）"""
+    compression = "lz4" if pa.Codec.is_available("lz4") else None
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=compression)) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_response(figures: Dict[str, Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> Response:
+    """encode_figures の結果を Arrow IPC ストリームとして返す"""
+    return Response(content=encode_figures(figures, meta), media_type=ARROW_MEDIA_TYPE)
+
+
+def frame_response(df: pd.DataFrame, meta: Optional[Dict[str, Any]] = None) -> Response:
+    """encode_frame の結果を Arrow IPC ストリームとして返す"""
+    return Response(content=encode_frame(df, meta), media_type=ARROW_MEDIA_TYPE)
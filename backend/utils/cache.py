@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """スレッドセーフな LRU キャッシュ（ttl を指定した場合は有効期限付き）"""
+
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 計算中のキー → 結果を待つ Future
+        self._inflight: Dict[Hashable, Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            stored_at, value = item
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """キャッシュにあればそれを返し、なければ compute() の結果を保存して返す
+
+        同じキーの計算が実行中なら、重複して計算せずその結果を待って共有する
+        （同一パラメータのリクエストが同時に来ても計算は 1 回）。例外も待機側に伝わる。
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット/ミス回数と現在の件数"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def dir_signature(*dirs: str, suffix: str = ".csv") -> Tuple:
+    """ディレクトリ内ファイルの (ディレクトリ, 名前, 更新時刻, サイズ) 一覧
+
+    キャッシュキーに含めることで、CSV の追加・更新・削除時に自動で無効化される。
+    """
+    entries = []
+    for d in dirs:
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.name.endswith(suffix):
+                        st = entry.stat()
+                        entries.append((d, entry.name, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            continue
+    return tuple(sorted(entries))
+
+
+def file_signature(*paths: str) -> Tuple:
+    """指定ファイルの (パス, 更新時刻, サイズ) 一覧（存在しないファイルは None として含める）
+
+    特定のファイルだけに依存する結果のキャッシュキー用。無関係なファイルの更新では無効化されない。
+    """
+    entries = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            entries.append((path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            entries.append((path, None, None))
+    return tuple(entries)
+
+
+def make_etag(state: Any) -> str:
+    """状態（ファイル名/更新時刻/サイズ等の組）から弱い ETag を生成"""
+    digest = hashlib.blake2b(repr(state).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match ヘッダが etag に一致するか（カンマ区切りの複数指定と * に対応、弱い比較）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
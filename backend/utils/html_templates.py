@@ -0,0 +1,188 @@
+from functools import lru_cache
+from html import escape
+from typing import Any, Dict, Iterator, List, Union
+
+from fastapi.responses import StreamingResponse
+
+from utils.serialization import dumps
+
+# Plotly 図を埋め込む HTML ページのテンプレート（import 時に bytes として一度だけ構築）
+# リクエスト毎には図の JSON（orjson の bytes）とタイトル等を差し込むだけにする
+# プレースホルダ位置で分割した断片を順に返すことで、ページ全体をメモリ上で連結せずにストリーミングできる
+FIGURE_PAGE_TEMPLATE = """<!doctype html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>{{TITLE}}</title>
+    <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
+    <style>html, body { height: 100%; margin: 0; } #chart { width: 100%; height: 100vh; }</style>
+  </head>
+  <body>
+    <div id="chart"></div>
+    <script>
+      const fig = {{FIG_JSON}};
+      Plotly.newPlot('chart', fig.data, fig.layout, {responsive: true, displaylogo: false});
+    </script>
+  </body>
+</html>
+""".encode("utf-8")
+
+# 統合前後のヒートマップと統合情報パネルを並べるページのテンプレート
+CONSOLIDATED_PAGE_TEMPLATE = """<!doctype html>
+<html lang="ja">
+  <head>
+    <meta charset="utf-8" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <title>統合相関分析</title>
+    <script src="https://cdn.plot.ly/plotly-2.30.0.min.js"></script>
+    <style>
+      html, body { height: 100%; margin: 0; }
+      .container { display: flex; height: 100vh; }
+      .chart { flex: 1; }
+      .info { width: 300px; padding: 20px; background: #f5f5f5; overflow-y: auto; }
+      .info h3 { margin-top: 0; }
+    </style>
+  </head>
+  <body>
+    <div class="container">
+      <div class="chart">
+        <div id="original-chart" style="height: 50%;"></div>
+        <div id="consolidated-chart" style="height: 50%;"></div>
+      </div>
+      <div class="info">{{INFO_HTML}}</div>
+    </div>
+    <script>
+      const originalFig = {{ORIGINAL_FIG_JSON}};
+      const consolidatedFig = {{CONSOLIDATED_FIG_JSON}};
+      Plotly.newPlot('original-chart', originalFig.data, originalFig.layout, {responsive: true, displaylogo: false});
+      Plotly.newPlot('consolidated-chart', consolidatedFig.data, consolidatedFig.layout, {responsive: true, displaylogo: false});
+    </script>
+  </body>
+</html>
+""".encode("utf-8")
+
+
+def _split(template: bytes, *markers: bytes) -> List[bytes]:
+    """テンプレートをプレースホルダ位置で分割（import 時に一度だけ実行）"""
+    parts = []
+    rest = template
+    for marker in markers:
+        head, rest = rest.split(marker, 1)
+        parts.append(head)
+    parts.append(rest)
+    return parts
+
+
+_FIGURE_PAGE_PARTS = _split(FIGURE_PAGE_TEMPLATE, b"{{TITLE}}", b"{{FIG_JSON}}")
+_CONSOLIDATED_PAGE_PARTS = _split(
+    CONSOLIDATED_PAGE_TEMPLATE, b"{{INFO_HTML}}", b"{{ORIGINAL_FIG_JSON}}", b"{{CONSOLIDATED_FIG_JSON}}"
+)
+
+
+# Plotly 図の最上位キー（"data": / "layout": 等）
+_KEY_PREFIXES = {key: dumps(key) + b":" for key in ("data", "layout", "frames")}
+
+
+def _iter_figure_json(fig: Dict[str, Any]) -> Iterator[bytes]:
+    """図 dict をトレース単位でシリアライズ（図全体を一つのバイト列にまとめない）"""
+    yield b"{"
+    for i, (key, value) in enumerate(fig.items()):
+        if i:
+            yield b","
+        yield _KEY_PREFIXES.get(key) or dumps(key) + b":"
+        if key == "data" and isinstance(value, (list, tuple)):
+            yield b"["
+            for j, trace in enumerate(value):
+                yield (b"," if j else b"") + dumps(trace)
+            yield b"]"
+        else:
+            yield dumps(value)
+    yield b"}"
+
+
+@lru_cache(maxsize=64)
+def _figure_page_head(title: str) -> bytes:
+    """タイトル込みの図 JSON 直前までの断片（タイトルは各エンドポイントで固定のためキャッシュする）"""
+    head, middle, _ = _FIGURE_PAGE_PARTS
+    return head + escape(title).encode("utf-8") + middle
+
+
+def iter_figure_page(fig: Union[Dict[str, Any], bytes], title: str) -> Iterator[bytes]:
+    """Plotly 図 1 枚を表示する HTML ページを断片ごとに生成（fig はシリアライズ済みの JSON バイト列でもよい）"""
+    yield _figure_page_head(title)
+    if isinstance(fig, bytes):
+        yield fig
+    else:
+        yield from _iter_figure_json(fig)
+    yield _FIGURE_PAGE_PARTS[-1]
+
+
+def render_figure_page(fig: Union[Dict[str, Any], bytes], title: str) -> bytes:
+    """Plotly 図 1 枚を表示する HTML ページを生成"""
+    return b"".join(iter_figure_page(fig, title))
+
+
+def figure_page_response(fig: Union[Dict[str, Any], bytes], title: str) -> StreamingResponse:
+    """図のページを StreamingResponse で返す（シリアライズと送信を重ねる）"""
+    return StreamingResponse(iter_figure_page(fig, title), media_type="text/html")
+
+
+# 統合情報パネルの固定ラベル（UTF-8 エンコード済み）
+_INFO_THRESHOLD = "<h3>統合情報</h3><p><strong>閾値:</strong> ".encode("utf-8")
+_INFO_METHOD = "</p><p><strong>統合方法:</strong> ".encode("utf-8")
+_INFO_ORIGINAL = "</p><p><strong>元の資産数:</strong> ".encode("utf-8")
+_INFO_CONSOLIDATED = "</p><p><strong>統合後資産数:</strong> ".encode("utf-8")
+_INFO_GROUPS = "</p><h3>相関グループ</h3>".encode("utf-8")
+_GROUP_HEAD = "<p><strong>グループ".encode("utf-8")
+_GROUP_SEP = ":</strong> ".encode("utf-8")
+_GROUP_MORE = "個の資産</p>".encode("utf-8")
+
+
+def _consolidation_info_html(
+    correlation_threshold: float,
+    consolidation_method: str,
+    consolidation_info: Dict[str, Any],
+    groups: List[List[str]],
+) -> bytes:
+    """統合情報パネルの HTML（可変部分のみリクエスト毎にエンコード）"""
+    parts = [
+        _INFO_THRESHOLD, str(correlation_threshold).encode(),
+        _INFO_METHOD, escape(str(consolidation_method)).encode("utf-8"),
+        _INFO_ORIGINAL, str(consolidation_info['original_assets']).encode(),
+        _INFO_CONSOLIDATED, str(consolidation_info['consolidated_assets']).encode(),
+        _INFO_GROUPS,
+    ]
+    for i, group in enumerate(groups, 1):
+        parts += [_GROUP_HEAD, str(i).encode(), _GROUP_SEP]
+        if len(group) <= 3:
+            parts += [escape(' + '.join(group)).encode("utf-8"), b"</p>"]
+        else:
+            parts += [escape(group[0]).encode("utf-8"), b" + ", str(len(group) - 1).encode(), _GROUP_MORE]
+    return b"".join(parts)
+
+
+def iter_consolidated_page(result: Dict[str, Any], correlation_threshold: float, consolidation_method: str) -> Iterator[bytes]:
+    """統合相関分析の結果（get_consolidated_correlation の戻り値）から HTML ページを断片ごとに生成"""
+    head, before_original, before_consolidated, tail = _CONSOLIDATED_PAGE_PARTS
+    yield head
+    yield _consolidation_info_html(
+        correlation_threshold, consolidation_method, result["consolidation_info"], result["groups"]
+    )
+    yield before_original
+    yield from _iter_figure_json(result["original_heatmap"])
+    yield before_consolidated
+    yield from _iter_figure_json(result["consolidated_heatmap"])
+    yield tail
+
+
+def render_consolidated_page(result: Dict[str, Any], correlation_threshold: float, consolidation_method: str) -> bytes:
+    """統合相関分析の HTML ページを生成"""
+    return b"".join(iter_consolidated_page(result, correlation_threshold, consolidation_method))
+
+
+def consolidated_page_response(result: Dict[str, Any], correlation_threshold: float, consolidation_method: str) -> StreamingResponse:
+    """統合相関分析のページを StreamingResponse で返す"""
+    return StreamingResponse(
+        iter_consolidated_page(result, correlation_threshold, consolidation_method), media_type="text/html"
+    )
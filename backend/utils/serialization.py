@@ -0,0 +1,40 @@
+from datetime import date
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# numpy 配列/スカラー、datetime、非文字列キー（相関行列の dict 等）をそのまま扱う
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """orjson がネイティブに扱えない型の変換（pandas オブジェクト等）"""
+    # pd.Timestamp 等の datetime サブクラスは ISO 8601 文字列に（Plotly/JS の Date がそのまま解釈できる）
+    if isinstance(obj, date):
+        return obj.isoformat()
+    # object dtype の ndarray / Series / Index はリストに展開（要素は再度この関数で変換される）
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """オブジェクトを JSON バイト列にシリアライズする"""
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+def json_fragment(raw: bytes) -> "orjson.Fragment":
+    """シリアライズ済みの JSON バイト列を dumps の入力に埋め込む（再シリアライズせずそのまま出力される）"""
+    return orjson.Fragment(raw)
+
+
+class ORJSONResponse(JSONResponse):
+    """orjson でシリアライズする JSONResponse
+
+    fastapi.responses.ORJSONResponse と異なり、pandas の Timestamp 等も
+    `_default` で変換するため `json.dumps(..., default=str)` の代替として使える。
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)